@@ -0,0 +1,158 @@
+import argparse
+import importlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT))
+from scripts.bench import synthetic
+from scripts.run_pipeline import STAGES, resolve
+
+TZ = "Europe/Zurich"
+
+#Synthetic inputs live under data/bench/<years>y_<freq>_s<seed>/data/raw and are reused across
+#runs (--regenerate rebuilds them). Each target runs in a fresh interpreter with the instrument
+#layer on, so wall/CPU time and peak RSS belong to that target alone. Every measurement is
+#appended to results/bench/history.jsonl with the commit it ran on, which is what the
+#comparison column is computed from.
+DATA_DIR = ROOT / "data" / "bench"
+HISTORY = ROOT / "results" / "bench" / "history.jsonl"
+
+#feature builders in dependency order, then the QA stage that reads the master (per-zone ones for CH)
+TARGETS = ["calendar", "price", "price_only", "res", "hydro", "load", "fuels", "reservoir", "outages",
+           "borders", "master", "store", "aggregate", "end_to_end"]
+METRICS = ["wall_s", "cpu_s", "cpu_children_s", "peak_rss_mb", "peak_rss_children_mb", "rows_in", "rows_out"]
+
+def _git(*args):
+    try:
+        return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+def _calendar_range(start, years, freq):
+    #the calendar is the only builder with a fixed date range; match it to the synthetic data.
+    #end is the last delivery slot (inclusive), one MTU before the end of the span
+    end = pd.Timestamp(start) + pd.DateOffset(years=years) - pd.Timedelta(pd.tseries.frequencies.to_offset(freq))
+    return {"start": str(pd.Timestamp(start)), "end": str(end)}
+
+def _params(target, start, years, freq="h"):
+    #the calendar builder directly, or the calendar stage inside the end-to-end run
+    if target == "calendar":
+        return _calendar_range(start, years, freq)
+    if target == "end_to_end":
+        return {"calendar": _calendar_range(start, years, freq)}
+    return {}
+
+def _child(target, params):
+    #runs inside the benchmark subprocess, cwd = the synthetic data root
+    from scripts.utils import instrument
+    from scripts.run_pipeline import run_pipeline
+
+    with instrument.stage(f"bench:{target}"):
+        if target == "end_to_end":
+            run_pipeline(groups=("features",), force=True, params=params, zones=["CH"])
+        else:
+            stage = STAGES[resolve([target], ["CH"])[0]]
+            module = importlib.import_module(stage["script"].removesuffix(".py").replace("/", "."))
+            getattr(module, stage["func"])(**{**stage.get("params", {}), **params})
+
+def measure(workdir, target, params, freq="h", verbose=False):
+    """Run one target in a fresh interpreter, building at MTU=freq, and return its metrics record"""
+    log = Path(workdir) / "bench_metrics.jsonl"
+    log.unlink(missing_ok=True)
+    env = dict(os.environ, METRICS_LOG=str(log), METRICS="1", MTU=freq)
+    cmd = [sys.executable, str(Path(__file__).resolve()), "--child", target, "--params", json.dumps(params)]
+    proc = subprocess.run(cmd, cwd=workdir, env=env, capture_output=not verbose, text=True)
+    records = [json.loads(line) for line in log.read_text().splitlines()] if log.exists() else []
+    records = [r for r in records if r["stage"] == f"bench:{target}"]
+    if proc.returncode != 0 or not records:
+        tail = "" if verbose else (proc.stderr or proc.stdout)[-500:]
+        return {"status": "error", "error": tail}
+    return records[-1]
+
+def _compare(df, history, commit):
+    #latest earlier measurement per (config, target) from another commit
+    if history.empty:
+        return df.assign(prev_commit="", wall_change_pct=None, rss_change_pct=None)
+    prev = history[history["commit"] != commit].sort_values("ts")
+    prev = prev.drop_duplicates(["years", "freq", "target"], keep="last")
+    prev = prev[["years", "freq", "target", "commit", "wall_s", "peak_rss_mb"]].rename(
+        columns={"commit": "prev_commit", "wall_s": "prev_wall_s", "peak_rss_mb": "prev_rss_mb"}
+    )
+    out = df.merge(prev, on=["years", "freq", "target"], how="left")
+    out["wall_change_pct"] = (100 * (out["wall_s"] / out["prev_wall_s"] - 1)).round(1)
+    out["rss_change_pct"] = (100 * (out["peak_rss_mb"] / out["prev_rss_mb"] - 1)).round(1)
+    return out.drop(columns=["prev_wall_s", "prev_rss_mb"])
+
+def run_benchmarks(years=(1,), freqs=("h",), targets=TARGETS, repeat=1, start="2021-01-01", seed=0,
+                   regenerate=False, verbose=False):
+    commit = _git("rev-parse", "--short", "HEAD")
+    dirty = bool(_git("status", "--porcelain", "--untracked-files=no"))
+    rows = []
+
+    for y in years:
+        for freq in freqs:
+            workdir = DATA_DIR / f"{y}y_{freq}_s{seed}"
+            if regenerate and workdir.exists():
+                shutil.rmtree(workdir)
+            if not (workdir / "data" / "raw").exists():
+                synthetic.generate(workdir, y, freq, start, seed)
+            shutil.rmtree(workdir / "data" / "processed", ignore_errors=True)
+
+            for target in targets:
+                params = _params(target, start, y, freq)
+                runs = [measure(workdir, target, params, freq, verbose) for _ in range(repeat)]
+                ok = [r for r in runs if r.get("status") == "ok"]
+                if not ok:
+                    print(f"[fail] {y}y {freq} {target}: {runs[-1].get('error', '')}")
+                    continue
+                #best of N: the least disturbed run is the most comparable across commits
+                best = min(ok, key=lambda r: r["wall_s"])
+                row = {"ts": pd.Timestamp.now(tz=TZ).isoformat(), "commit": commit, "dirty": dirty,
+                       "years": y, "freq": freq, "target": target, "repeat": len(ok),
+                       **{m: best.get(m) for m in METRICS}}
+                rows.append(row)
+                print(f"[ok] {y}y {freq} {target}: {row['wall_s']:.2f}s, {row['peak_rss_mb']:.0f} MB")
+
+    if not rows:
+        return pd.DataFrame()
+
+    history = pd.read_json(HISTORY, lines=True) if HISTORY.exists() else pd.DataFrame()
+    if not history.empty:
+        history["commit"] = history["commit"].astype(str)
+    HISTORY.parent.mkdir(parents=True, exist_ok=True)
+    with open(HISTORY, "a") as f:
+        for row in rows:
+            f.write(json.dumps(row) + "\n")
+
+    df = _compare(pd.DataFrame(rows), history, commit)
+    print(f"\n[info] commit {commit}{' (dirty)' if dirty else ''} -> {HISTORY}")
+    print(df[["years", "freq", "target", "wall_s", "cpu_s", "peak_rss_mb", "rows_out",
+              "prev_commit", "wall_change_pct", "rss_change_pct"]].fillna("").to_string(index=False))
+    return df
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time every builder and the end-to-end build on synthetic data")
+    parser.add_argument("--years", type=int, nargs="+", default=[1], help="history lengths to generate (1-20)")
+    parser.add_argument("--freq", nargs="+", default=["h"], choices=["h", "15min"])
+    parser.add_argument("--targets", nargs="+", default=TARGETS, choices=TARGETS)
+    parser.add_argument("--repeat", type=int, default=1, help="runs per target; the fastest is kept")
+    parser.add_argument("--start", default="2021-01-01")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--regenerate", action="store_true", help="rebuild the synthetic inputs")
+    parser.add_argument("--verbose", action="store_true", help="show the builders' own output")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--params", default="{}", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.child, json.loads(args.params))
+    else:
+        run_benchmarks(args.years, args.freq, args.targets, args.repeat, args.start, args.seed,
+                       args.regenerate, args.verbose)
@@ -0,0 +1,232 @@
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from scripts.utils import storage
+from scripts.utils import topology
+
+TZ = "Europe/Zurich"
+
+#Synthetic raw inputs in the same layout the fetchers write (time-partitioned datasets under
+#data/raw, Bloomberg-style CSVs for fuels, the BFE CSV of reservoir levels), so every builder runs unchanged on them. The values
+#only need realistic shapes (daily/weekly cycles, DST days, gaps, spikes, outage revisions) to
+#exercise the same code paths; they are not a market model.
+ZONES = list(topology.ZONES)
+LINKS = topology.BORDERS
+PSR_TYPES = [
+    "Hydro Run-of-river and poundage", "Hydro Water Reservoir", "Hydro Pumped Storage",
+    "Nuclear", "Fossil Gas", "Solar"
+]
+OUTAGES_PER_YEAR = 1500
+
+def time_grid(start, years, freq="h"):
+    """Delivery stamps over [start, start + years) in local time; built in UTC so DST days get 23/25 hours"""
+    start = pd.Timestamp(start, tz=TZ)
+    end = start + pd.DateOffset(years=years)
+    return pd.date_range(start.tz_convert("UTC"), end.tz_convert("UTC"), freq=freq, inclusive="left").tz_convert(TZ)
+
+def _cycles(times):
+    wall = times.tz_localize(None)
+    hour = wall.hour.to_numpy() + wall.minute.to_numpy() / 60
+    doy = wall.dayofyear.to_numpy()
+    weekend = (wall.dayofweek.to_numpy() >= 5).astype(float)
+    daily = np.sin((hour - 6) / 24 * 2 * np.pi)
+    yearly = np.cos((doy - 15) / 365.25 * 2 * np.pi)
+    return hour, doy, weekend, daily, yearly
+
+def _ar1(rng, n, phi=0.98, scale=1.0):
+    #persistent noise (weather regimes, fuel moves) without a Python loop
+    shocks = rng.normal(0, scale, n)
+    weights = phi ** np.arange(min(n, 400))
+    return np.convolve(shocks, weights)[:n] * np.sqrt(1 - phi ** 2)
+
+def _with_gaps(rng, df, share=0.002):
+    #fetchers leave holes where a window failed; drop short runs of rows
+    n = len(df)
+    starts = rng.choice(n, size=max(1, int(n * share / 6)), replace=False)
+    drop = np.unique(np.clip(starts[:, None] + np.arange(6), 0, n - 1))
+    return df.drop(index=df.index[drop]).reset_index(drop=True)
+
+def prices(rng, times):
+    _, _, weekend, daily, yearly = _cycles(times)
+    out = {}
+    for i, zone in enumerate(ZONES):
+        base = 80 + 10 * i + 30 * yearly + _ar1(rng, len(times), scale=25)
+        p = base + 20 * daily - 15 * weekend + rng.normal(0, 8, len(times))
+        spikes = rng.random(len(times)) < 0.002
+        p[spikes] += rng.exponential(300, spikes.sum())
+        #midday solar dips below zero now and then
+        p[(daily > 0.9) & (rng.random(len(times)) < 0.01)] -= 120
+        out[zone] = pd.DataFrame({"time": times, "0": p.round(2)})
+    return out
+
+def load(rng, times):
+    _, _, weekend, daily, yearly = _cycles(times)
+    scale = {"CH": 7000, "DE_LU": 55000, "FR": 50000, "IT_NORD": 20000}
+    out = {}
+    for zone in ZONES:
+        x = scale.get(zone, 20000) * (1 + 0.12 * daily + 0.15 * yearly - 0.1 * weekend + 0.02 * _ar1(rng, len(times)))
+        out[zone] = pd.DataFrame({"time": times, "load_forecast_mw": x.round(1)})
+    return out
+
+def flows_and_ntc(rng, times):
+    _, _, _, daily, yearly = _cycles(times)
+    day, _ = pd.factorize(times.tz_localize(None).normalize())
+    flows, ntc = {}, {}
+    for a, b in LINKS:
+        cap = 1500 + 1000 * rng.random()
+        for src, dst in [(a, b), (b, a)]:
+            #capacity changes in daily steps
+            ntc_v = cap * rng.choice([0.7, 0.85, 1.0], size=day.max() + 1)[day]
+            net = 0.5 + 0.3 * daily + 0.2 * yearly + 0.3 * _ar1(rng, len(times))
+            flow = np.clip(net, 0, 1.1) * ntc_v
+            name = f"{src.lower()}_{dst.lower()}"
+            flows[name] = _with_gaps(rng, pd.DataFrame({"time": times, "flow_mw": flow.round(1)}))
+            ntc[name] = pd.DataFrame({"time": times, "ntc_mw": ntc_v.round(0)})
+    return flows, ntc
+
+def weather(rng, times):
+    hour, doy, _, _, _ = _cycles(times)
+    #clear-sky shortwave from a crude solar elevation; clouds from an AR(1) regime
+    declination = 23.44 * np.sin((doy - 81) / 365 * 2 * np.pi)
+    elevation = np.sin(np.radians(47)) * np.sin(np.radians(declination)) + \
+        np.cos(np.radians(47)) * np.cos(np.radians(declination)) * np.cos((hour - 13) / 24 * 2 * np.pi)
+    out = {}
+    for zone in ZONES:
+        cloud = np.clip(50 + 40 * _ar1(rng, len(times)), 0, 100)
+        ghi = np.clip(1000 * elevation, 0, None) * (1 - 0.7 * cloud / 100)
+        wind = rng.weibull(2.0, len(times)) * (6 + 3 * np.abs(_ar1(rng, len(times))))
+        df = pd.DataFrame({
+            "time": times, "zone": zone,
+            "shortwave_radiation": ghi.round(1),
+            "direct_radiation": (0.7 * ghi).round(1),
+            "diffuse_radiation": (0.3 * ghi).round(1),
+            "wind_speed_80m": (3.6 * wind).round(1),
+            "wind_speed_120m": (3.6 * wind * 1.08).round(1),
+            "cloud_cover": cloud.round(0),
+        })
+        out[zone] = _with_gaps(rng, df)
+    return out
+
+def hydro(rng, times):
+    _, _, _, daily, yearly = _cycles(times)
+    snowmelt = np.clip(-yearly, 0, None)
+    return pd.DataFrame({
+        "time": times,
+        "hydro_ror_mw": (1500 + 1500 * snowmelt + 50 * rng.normal(size=len(times))).round(1),
+        "hydro_reservoir_mw": np.clip(2000 + 1500 * daily + 300 * _ar1(rng, len(times)), 0, None).round(1),
+        "hydro_pumped_mw": np.clip(500 * daily + 200 * rng.normal(size=len(times)), -1500, 1500).round(1),
+    })
+
+def outages(rng, start, years):
+    """Unavailability records with revisions (mrid, revision, created_doc_time, docstatus)"""
+    n = OUTAGES_PER_YEAR * years
+    t0 = pd.Timestamp(start, tz=TZ).tz_convert("UTC")
+    span_h = years * 8766
+    begin = t0 + pd.to_timedelta(rng.uniform(0, span_h, n), unit="h")
+    duration = pd.to_timedelta(np.clip(rng.lognormal(3.5, 1.2, n), 1, 24 * 120), unit="h")
+    published = begin - pd.to_timedelta(rng.uniform(0, 60 * 24, n), unit="h")
+    unit = rng.integers(0, 80, n)
+    psr = np.array(PSR_TYPES)[unit % len(PSR_TYPES)]
+    nominal = 50 + (unit * 37 % 950)
+
+    rows = []
+    n_rev = rng.choice([1, 2, 3], size=n, p=[0.6, 0.3, 0.1])
+    for rev in range(1, 4):
+        keep = n_rev >= rev
+        shift = pd.to_timedelta(rng.normal(0, 12 * (rev - 1), n), unit="h")
+        last = n_rev == rev
+        rows.append(pd.DataFrame({
+            "start": (begin + shift)[keep],
+            "end": (begin + shift + duration * (1 + 0.3 * (rev - 1)))[keep],
+            "nominal_power": nominal[keep].astype(float),
+            "avail_qty": np.where(rng.random(n) < 0.7, 0.0, nominal * rng.uniform(0.2, 0.8, n))[keep].round(1),
+            "production_resource_psr_name": psr[keep],
+            "production_resource_name": [f"Plant {u}" for u in unit[keep]],
+            "production_resource_id": unit[keep],
+            "mrid": np.arange(n)[keep],
+            "revision": rev,
+            "created_doc_time": (published + pd.to_timedelta(rng.uniform(0, 24 * 20 * (rev - 1), n), unit="h"))[keep],
+            "docstatus": np.where(last & (rng.random(n) < 0.05), "Cancelled", "Active")[keep],
+        }))
+    df = pd.concat(rows, ignore_index=True)
+    for c in ["start", "end", "created_doc_time"]:
+        df[c] = pd.DatetimeIndex(df[c]).tz_convert(TZ)
+    return df.sort_values(["start", "mrid", "revision"]).reset_index(drop=True)
+
+def fuels(rng, start, years):
+    """Daily settlement prices on business days, as in the Bloomberg exports (';', day-first dates)"""
+    days = pd.bdate_range(pd.Timestamp(start), pd.Timestamp(start) + pd.DateOffset(years=years), inclusive="left")
+    out = {}
+    for name, level, vol in [("gas_bloomberg", 40.0, 0.03), ("carbon_bloomberg", 70.0, 0.02)]:
+        price = level * np.exp(np.cumsum(rng.normal(0, vol, len(days))))
+        out[name] = pd.DataFrame({"Date": days.strftime("%d.%m.%Y"), "Price": price.round(2)})
+    return out
+
+def reservoir(rng, start, years):
+    """Weekly Swiss reservoir readings (Mondays) in the BFE layout: stored energy and capacity per region, GWh"""
+    days = pd.date_range(pd.Timestamp(start), pd.Timestamp(start) + pd.DateOffset(years=years),
+                         freq="W-MON", inclusive="left")
+    season = np.cos(2 * np.pi * (days.dayofyear.to_numpy() - 270) / 365)
+    out = {"Datum": days.strftime("%Y-%m-%d")}
+    regions = {"Wallis": 3900.0, "Graubuenden": 2500.0, "Tessin": 1200.0, "UebrigCH": 1200.0}
+    for region, cap in regions.items():
+        fill = np.clip(0.5 + 0.4 * season + 0.03 * rng.normal(size=len(days)), 0.05, 1.0)
+        out[f"{region}_speicherinhalt_gwh"] = (cap * fill).round(0)
+    out["TotalCH_speicherinhalt_gwh"] = sum(out[f"{r}_speicherinhalt_gwh"] for r in regions)
+    for region, cap in regions.items():
+        out[f"{region}_max_speicherinhalt_gwh"] = np.full(len(days), cap)
+    out["TotalCH_max_speicherinhalt_gwh"] = np.full(len(days), sum(regions.values()))
+    return pd.DataFrame(out)
+
+def generate(root, years=1, freq="h", start="2021-01-01", seed=0):
+    """Write every raw input under <root>/data/raw; returns the number of rows written"""
+    rng = np.random.default_rng(seed)
+    rawdir = Path(root) / "data" / "raw"
+    rawdir.mkdir(parents=True, exist_ok=True)
+    times = time_grid(start, years, freq)
+    written = 0
+
+    def save(df, name, time_col="time"):
+        nonlocal written
+        storage.write_table(df, rawdir / name, time_col=time_col, csv=False)
+        written += len(df)
+
+    for zone, df in prices(rng, times).items():
+        save(df, f"{zone.lower()}_day_ahead_prices")
+    for zone, df in load(rng, times).items():
+        save(df, f"{zone.lower()}_load_forecast")
+    flows, ntc = flows_and_ntc(rng, times)
+    for name, df in flows.items():
+        save(df, f"flow_{name}")
+    for name, df in ntc.items():
+        save(df, f"ntc_{name}")
+    #Open-Meteo only serves hourly data, whatever the market resolution
+    for zone, df in weather(rng, time_grid(start, years, "h")).items():
+        save(df, f"{zone.lower()}_weather_openmeteo")
+    for zone in ZONES:
+        save(hydro(rng, times), f"{zone.lower()}_hydro_generation_entsoe")
+        save(outages(rng, start, years), f"{zone.lower()}_outages", time_col="start")
+    for name, df in fuels(rng, start, years).items():
+        df.to_csv(rawdir / f"{name}.csv", sep=";", index=False)
+        written += len(df)
+    df = reservoir(rng, start, years)
+    df.to_csv(rawdir / "ch_reservoir_levels_weekly.csv", index=False)
+    written += len(df)
+
+    print(f"[ok] synthetic raw data: {years}y at {freq} from {start} -> {rawdir} ({written} rows)")
+    return written
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write synthetic raw market data for benchmarks")
+    parser.add_argument("root", help="output root; files go to <root>/data/raw")
+    parser.add_argument("--years", type=int, default=1)
+    parser.add_argument("--freq", default="h", choices=["h", "15min"])
+    parser.add_argument("--start", default="2021-01-01")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    generate(args.root, args.years, args.freq, args.start, args.seed)
@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from scripts.utils import storage
+from scripts.utils import time_axis
+from scripts.utils import topology
+from scripts.utils.lag_engine import apply_spec
+from scripts.utils.instrument import instrumented
+
+TZ = "Europe/Zurich"
+
+# Utilisation (flow / NTC, same direction) counted as congested
+CONGESTED = 0.95
+# congestion_ratio is the utilisation clipped to avoid extreme spikes (NTC close to 0)
+RATIO_CLIP = 1.5
+# trailing windows of the congestion frequency (share of congested MTUs, current one included)
+FREQ_WINDOWS = ["24h", "168h"]
+
+def _read(path, name):
+    # raw border series: time + one value column -> MTU grid
+    df = storage.read_table(path, time_col="time")
+    vcol = df.columns[1] if len(df.columns) > 1 else name
+    df = df[["time", vcol]].rename(columns={"time": "delivery_start_local", vcol: name})
+    return time_axis.resample(df, "delivery_start_local")
+
+def _trim(df, cols):
+    # rows from the first to the last MTU where any of cols has a value
+    known = np.flatnonzero(df[cols].notna().any(axis=1).to_numpy())
+    return df.iloc[known[0]:known[-1] + 1].reset_index(drop=True) if len(known) else df.iloc[:0]
+
+def _float32(df):
+    # every value column as float32 (apply_spec appends its lags as float64)
+    return df.astype({c: np.float32 for c in df.columns if c != "delivery_start_local"})
+
+def _frequency(flags, w):
+    # share of congested MTUs in each trailing window of w rows, over the known ones (2-D prefix sums)
+    known = ~np.isnan(flags)
+    zero = np.zeros((1, flags.shape[1]), dtype=np.int32)
+    hits = np.concatenate([zero, np.cumsum(np.where(known, flags, 0), axis=0, dtype=np.int32)])
+    seen = np.concatenate([zero, np.cumsum(known, axis=0, dtype=np.int32)])
+    end = np.arange(1, len(flags) + 1)
+    start = np.maximum(end - w, 0)
+    n = seen[end] - seen[start]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out = ((hits[end] - hits[start]) / n).astype(np.float32)
+    out[(n == 0) | (end < w)[:, None]] = np.nan
+    return out
+
+@instrumented
+def build_border_features(rawdir="data/raw", outdir="data/processed"):
+    rawdir, outdir = Path(rawdir), Path(outdir)
+    outdir.mkdir(parents=True, exist_ok=True)
+
+    # === Read every raw border file once: one column per direction, e.g. flow_ch_de_lu_mw (CH->DE_LU) ===
+    blocks = {}
+    for c1, c2 in topology.BORDERS:
+        names = [topology.direction_name(c1, c2), topology.direction_name(c2, c1)]
+        for kind in ["flow", "ntc"]:
+            found = {}
+            for (src, dst), name in zip([(c1, c2), (c2, c1)], names):
+                path = rawdir / f"{kind}_{name}"
+                if not storage.exists(path):
+                    print(f"[skip] {kind}_{name} not found")
+                    continue
+                try:
+                    found[name] = _read(path, f"{kind}_{name}_mw")
+                    print(f"[ok] {kind} {src}->{dst}: {len(found[name])} rows")
+                except Exception as e:
+                    print(f"[fail] {kind} {src}->{dst}: {e}")
+
+            # NTC published for one direction only -> the same capacity both ways
+            if kind == "ntc" and len(found) == 1:
+                (have, df), = found.items()
+                other = names[1 - names.index(have)]
+                found[other] = df.rename(columns={f"ntc_{have}_mw": f"ntc_{other}_mw"})
+                print(f"[dup] ntc {have} used for {other}")
+            blocks.update({f"{kind}_{name}": df for name, df in found.items()})
+
+    if not blocks:
+        print("[fail] No border data processed")
+        return
+
+    # === One row per MTU for every border series (float32), then all metrics as (MTU x direction) arrays ===
+    grid = _float32(time_axis.join(blocks))
+    directions = [topology.direction_name(*d) for d in topology.directions()]
+    flow_cols = [f"flow_{d}_mw" for d in directions if f"flow_{d}_mw" in grid.columns]
+    ntc_cols = [f"ntc_{d}_mw" for d in directions if f"ntc_{d}_mw" in grid.columns]
+
+    # Flows and NTCs with their ex-ante lag (24h) per direction, plus the net flow per border
+    # (a->b minus b->a, for (a, b) as listed in topology.BORDERS)
+    net = {}
+    for a, b in topology.BORDERS:
+        fwd, rev = f"flow_{topology.direction_name(a, b)}_mw", f"flow_{topology.direction_name(b, a)}_mw"
+        if fwd in grid.columns and rev in grid.columns:
+            net[f"net_flow_{topology.direction_name(a, b)}_mw"] = grid[fwd].to_numpy() - grid[rev].to_numpy()
+    if flow_cols:
+        flows = grid[["delivery_start_local", *flow_cols]].assign(**net)
+        flows = _float32(apply_spec(_trim(flows, flow_cols), {c: {"lags": ["24h"]} for c in [*flow_cols, *net]}))
+        out = storage.write_table(flows, outdir / "flow_features_all")
+        print(f"[ok] Saved all flows -> {out} ({len(flows)} rows, {len(flow_cols)} directions, {len(net)} borders)")
+    if ntc_cols:
+        ntc = _float32(apply_spec(_trim(grid[["delivery_start_local", *ntc_cols]], ntc_cols), {c: {"lags": ["24h"]} for c in ntc_cols}))
+        out = storage.write_table(ntc, outdir / "ntc_features_all")
+        print(f"[ok] Saved all NTC -> {out} ({len(ntc)} rows, {len(ntc_cols)} directions)")
+
+    # Congestion for every direction with both a flow and an NTC, in one float32 pass
+    both = [d for d in directions if f"flow_{d}_mw" in grid.columns and f"ntc_{d}_mw" in grid.columns]
+    if not both:
+        print("[fail] No direction has both flow and NTC data")
+        return
+    F = grid[[f"flow_{d}_mw" for d in both]].to_numpy(dtype=np.float32)
+    N = grid[[f"ntc_{d}_mw" for d in both]].to_numpy(dtype=np.float32)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        util = np.where(N > 0, F / N, np.nan).astype(np.float32)
+    flags = np.where(np.isnan(util), np.nan, util >= CONGESTED).astype(np.float32)
+
+    metrics = {
+        "congestion_ratio_{}": np.clip(util, -RATIO_CLIP, RATIO_CLIP),
+        "utilisation_{}": util,
+        "congestion_flag_{}": flags,
+    }
+    for w in FREQ_WINDOWS:
+        hours = f"{pd.Timedelta(w) / time_axis.HOUR:g}"
+        metrics[f"congestion_freq_{{}}_{hours}h"] = _frequency(flags, time_axis.slots(w))
+
+    congestion = pd.DataFrame({"delivery_start_local": grid["delivery_start_local"]})
+    congestion = pd.concat([congestion, pd.DataFrame(
+        {name.format(d): values[:, i] for name, values in metrics.items() for i, d in enumerate(both)}
+    )], axis=1)
+
+    out = storage.write_table(congestion, outdir / "congestion_features_all")
+    print(f"[ok] Saved congestion features -> {out} ({len(congestion)} rows, {len(both)} directions)")
+
+if __name__ == "__main__":
+    build_border_features()
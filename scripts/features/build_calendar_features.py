@@ -1,40 +1,44 @@
 import pandas as pd
+import sys
 from pathlib import Path
-import holidays
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from scripts.utils import storage
+from scripts.utils import time_axis
+from scripts.utils import topology
+from scripts.utils.instrument import instrumented
 
 TZ = "Europe/Zurich"
 
-def build_calendar_features(start="2021-03-22", end="2024-12-31", outdir="data/processed"):
+@instrumented
+def build_calendar_features(start="2021-03-22", end="2024-12-31", outdir="data/processed", zone="CH"):
     outdir = Path(outdir)
     outdir.mkdir(parents=True, exist_ok=True)
 
-    # Build hourly timeline
-    hours = pd.date_range(start, end, freq="h", tz=TZ)
-    df = pd.DataFrame({"delivery_start_local": hours})
+    # MTU timeline on the shared UTC slot axis, start..end (inclusive) local
+    s0 = time_axis.to_slots([pd.Timestamp(start, tz=TZ)])[0]
+    s1 = time_axis.to_slots([pd.Timestamp(end, tz=TZ)])[0] + 1
+    attrs = time_axis.local_attributes(s0, s1)
 
-    # Calendar basics
-    df["hour"] = df["delivery_start_local"].dt.hour
-    df["dayofweek"] = df["delivery_start_local"].dt.dayofweek  # 0=Mon, 6=Sun
+    # Calendar basics (local wall clock, DST resolved once in time_axis); minute of the hour at sub-hourly MTU
+    cols = ["delivery_start_local", "hour"] + (["minute"] if time_axis.MTU < time_axis.HOUR else []) + ["dayofweek"]
+    df = attrs[cols].reset_index(drop=True)
     df["is_weekend"] = df["dayofweek"].isin([5, 6]).astype(int)
-    df["month"] = df["delivery_start_local"].dt.month
+    df["month"] = attrs["month"].to_numpy()
     df["season"] = ((df["month"] % 12 + 3) // 3)  # 1=Winter, 2=Spring, 3=Summer, 4=Autumn
 
-    # DST: check offset difference against UTC
-    df["is_dst"] = (
-        df["delivery_start_local"].dt.tz_convert("UTC").dt.hour
-        != df["delivery_start_local"].dt.hour
-    ).astype(int)
+    # DST: local offset is UTC+2
+    df["is_dst"] = attrs["is_dst"].to_numpy()
 
-    # Swiss holidays
-    ch_holidays = holidays.Switzerland(years=range(2021, 2025))
-    df["date_only"] = df["delivery_start_local"].dt.normalize()
-    df["is_holiday"] = df["date_only"].isin(ch_holidays).astype(int)
-    df = df.drop(columns=["date_only"])
+    # National holidays of the zone
+    local_day = attrs["local_day"]
+    zone_holidays = topology.holiday_calendar(zone, range(local_day.dt.year.min(), local_day.dt.year.max() + 1))
+    df["is_holiday"] = local_day.dt.date.isin(zone_holidays).astype(int).to_numpy()
 
     # Save
-    outpath = outdir / "calendar_features.csv"
-    df.to_csv(outpath, index=False)
-    print(f"[ok] Calendar features saved -> {outpath} ({len(df)} rows)")
+    outpath = storage.write_table(df, outdir / topology.table("calendar_features", zone))
+    print(f"[ok] {zone} calendar features saved -> {outpath} ({len(df)} rows)")
 
 if __name__ == "__main__":
-    build_calendar_features()
+    for zone in topology.TARGET_ZONES:
+        build_calendar_features(zone=zone)
@@ -0,0 +1,61 @@
+import sys
+from functools import partial
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from scripts.utils import storage
+from scripts.utils import topology
+from scripts.utils import feature_store as fs
+from scripts.utils.instrument import instrumented
+
+TZ = "Europe/Zurich"
+
+# Processed tables of a zone and when each of their columns becomes available. A lag captured
+# by a pattern shifts the rule back in time: flow_ch_fr_mw_lag24 at t is the flow at t-24h,
+# published an hour after that hour. First match wins.
+SOURCES = {
+    "calendar": ("{z}_calendar_features", [(r".*", fs.known)]),
+    "price_only": ("{z}_price_only_features", [
+        (r"lag_(\d+)h", fs.day_ahead),
+        # windows end one hour back (window_shift)
+        (r"rolling_\w+", partial(fs.day_ahead, "1h")),
+        (r".*", fs.day_ahead),
+    ]),
+    "res": ("{z}_res_features_exante", [(r".*", fs.column)]),
+    "hydro": ("{z}_hydro_features", [(r".*_lag(\d+)", fs.measured), (r".*", fs.measured)]),
+    "load": ("{z}_load_features_exante", [(r".*_lag(\d+)", fs.gate), (r".*", fs.column)]),
+    # as known at gate closure, publication lag included (time_axis.asof)
+    "fuels": ("fuels_features", [(r".*", fs.column)]),
+    "reservoir": ("{z}_reservoir_features", [(r".*", fs.column)]),
+    # as-of snapshots at gate closure (the latest revisions are a separate diagnostics table)
+    "outages": ("{z}_outage_features", [(r".*_exante", fs.column), (r".*", fs.measured)]),
+    "flows": ("flow_features_all", [(r".*_lag(\d+)", fs.measured), (r".*", fs.measured)]),
+    # NTCs are published D-1 before gate closure
+    "ntc": ("ntc_features_all", [(r".*_lag(\d+)", fs.gate), (r".*", fs.gate)]),
+    "congestion": ("congestion_features_all", [(r".*", fs.measured)]),
+}
+BORDER_TABLES = {"flows", "ntc", "congestion"}
+
+@instrumented
+def build_feature_store(zone="CH", processed_dir="data/processed", store_dir="data/store"):
+    processed_dir = Path(processed_dir)
+    store = fs.FeatureStore(store_dir, zone)
+
+    for name, (template, spec) in SOURCES.items():
+        fpath = processed_dir / template.format(z=topology.slug(zone))
+        if not storage.exists(fpath):
+            print(f"[skip] {name}: {fpath.name} not found")
+            continue
+
+        columns = None
+        if name in BORDER_TABLES:
+            columns = ["delivery_start_local"] + topology.border_columns(storage.schema(fpath), zone)
+        df = storage.read_table(fpath, columns=columns)
+        rules = fs.rules_for([c for c in df.columns if c != "delivery_start_local"], spec)
+
+        path = store.write(name, df, rules)
+        print(f"[ok] {zone} {name}: {len(df)} rows, {df.shape[1] - 1} cols -> {path}")
+
+if __name__ == "__main__":
+    for zone in topology.TARGET_ZONES:
+        build_feature_store(zone)
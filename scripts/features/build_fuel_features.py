@@ -1,8 +1,23 @@
 import pandas as pd
+import sys
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from scripts.utils import storage
+from scripts.utils import time_axis
+from scripts.utils import topology
+from scripts.utils.instrument import instrumented
+
 TZ = "Europe/Zurich"
 
+# Settlement prices are published after the close; a day's price is used from 08:00 the next day
+PUBLICATION_LAG = "1D8h"
+# fuels are shared by every zone, so they are taken as of the earliest gate closure
+GATE_CLOSURE = min(topology.gate_closure_hour(z) for z in topology.ZONES)
+# a price older than this (long exchange holidays at most) is treated as missing
+MAX_AGE = "7D"
+
+@instrumented
 def build_fuel_features(rawdir="data/raw", outdir="data/processed"):
     rawdir, outdir = Path(rawdir), Path(outdir)
     outdir.mkdir(parents=True, exist_ok=True)
@@ -37,43 +52,33 @@ def build_fuel_features(rawdir="data/raw", outdir="data/processed"):
 
             # Parse dates
             df["date"] = pd.to_datetime(df["date"], errors="coerce", dayfirst=True)
+            df["price"] = pd.to_numeric(df["price"], errors="coerce")
             df = df.dropna(subset=["date", "price"]).sort_values("date")
 
-            # Forward fill missing days (weekends, holidays)
-            full_days = pd.date_range(df["date"].min(), df["date"].max(), freq="D")
-            df = df.set_index("date").reindex(full_days).rename_axis("date").reset_index()
-            df["price"] = df["price"].ffill()
-
-            # Expand to hourly granularity
-            # Expand to hourly granularity
-            df = df.loc[df.index.repeat(24)].reset_index(drop=True)
-            df["delivery_start_local"] = pd.date_range(
-                start=df["date"].min(),
-                periods=len(df),
-                freq="h",
-                tz=TZ
-)
-
+            # One row per settlement; days without one (weekends, holidays) keep the last
+            # published price in the as-of lookup below
+            df = df.groupby("date", as_index=False)["price"].last()
 
             # Keep tidy
             colname = f"{name}_eur"
-            df = df[["delivery_start_local", "price"]].rename(columns={"price": colname})
+            df = df[["date", "price"]].rename(columns={"price": colname})
             all_features.append(df)
 
-            print(f"[ok] {name}: {len(df)} rows processed")
+            print(f"[ok] {name}: {len(df)} daily prices")
 
         except Exception as e:
             print(f"[fail] {name}: {e}")
 
     if all_features:
-        out_df = all_features[0]
+        daily = all_features[0]
         for df in all_features[1:]:
-            out_df = pd.merge(out_df, df, on="delivery_start_local", how="outer")
+            daily = pd.merge(daily, df, on="date", how="outer")
 
-        out_df = out_df.sort_values("delivery_start_local")
+        # MTU grid as known at gate closure: a settlement is visible from the next morning, so
+        # delivery day D sees the price of D-2 (or the last business day before it)
+        out_df = time_axis.asof(daily, "date", lag=PUBLICATION_LAG, cutoff_hour=GATE_CLOSURE, max_age=MAX_AGE)
 
-        out = outdir / "fuels_features.csv"
-        out_df.to_csv(out, index=False)
+        out = storage.write_table(out_df, outdir / "fuels_features")
         print(f"[ok] Saved fuels features -> {out} ({len(out_df)} rows)")
     else:
         print("[fail] No fuels processed")
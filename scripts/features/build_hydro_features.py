@@ -1,33 +1,43 @@
-import pandas as pd
+import sys
 from pathlib import Path
 
-def build_hydro_features(infile="data/raw/ch_hydro_generation_entsoe.csv", outdir="data/processed"):
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from scripts.utils import storage
+from scripts.utils import time_axis
+from scripts.utils import topology
+from scripts.utils.lag_engine import apply_spec
+from scripts.utils.instrument import instrumented
+
+@instrumented
+def build_hydro_features(zone="CH", rawdir="data/raw", outdir="data/processed"):
     outdir = Path(outdir)
     outdir.mkdir(parents=True, exist_ok=True)
+    infile = Path(rawdir) / f"{topology.slug(zone)}_hydro_generation_entsoe"
 
     try:
-        df = pd.read_csv(infile, parse_dates=["index"])
+        df = storage.read_table(infile, time_col="time")
     except Exception as e:
         print(f"[fail] Could not read {infile}: {e}")
         return
 
     if df.empty:
-        print("[warn] Hydro generation file is empty")
+        print(f"[warn] {zone} hydro generation file is empty")
         return
 
-    df = df.rename(columns={"index": "delivery_start_local"})
+    df = df.rename(columns={"time": "delivery_start_local"})
     df = df.set_index("delivery_start_local").sort_index()
 
+    # Full MTU grid, so a 24h lag is 24h back even across gaps
+    df = time_axis.resample(df)
+
     # Add lags
-    for col in df.columns:
-        df[f"{col}_lag24"] = df[col].shift(24)
-        df[f"{col}_lag168"] = df[col].shift(168)
+    df = apply_spec(df, {col: {"lags": ["24h", "168h"]} for col in df.columns})
 
     df = df.reset_index()
 
-    outpath = outdir / "ch_hydro_features.csv"
-    df.to_csv(outpath, index=False)
-    print(f"[ok] Hydro features saved -> {outpath} ({len(df)} rows)")
+    outpath = storage.write_table(df, outdir / topology.table("hydro_features", zone))
+    print(f"[ok] {zone} hydro features saved -> {outpath} ({len(df)} rows)")
 
 if __name__ == "__main__":
-    build_hydro_features()
+    for zone in topology.TARGET_ZONES:
+        build_hydro_features(zone)
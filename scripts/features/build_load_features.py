@@ -1,48 +1,43 @@
-import pandas as pd
+import sys
 from pathlib import Path
 
-TZ = "Europe/Zurich"
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from scripts.utils import storage
+from scripts.utils import time_axis
+from scripts.utils import topology
+from scripts.utils.lag_engine import apply_spec
+from scripts.utils.instrument import instrumented
 
-def _to_local(ts):
-    # Force UTC parsing, then convert to Swiss time
-    s = pd.to_datetime(ts, errors="coerce", utc=True)
-    return s.dt.tz_convert(TZ)
+TZ = "Europe/Zurich"
 
 def _gct_asof(delivery_ts, zone="CH"):
-    # For load forecasts, assume DA auction cutoff: D-1 11:00 local (CH) or 12:00 default
-    cutoff = {"CH": 11, "default": 12}
-    h = cutoff.get(zone, cutoff["default"])
-    dminus1 = (delivery_ts.dt.tz_convert(TZ).dt.normalize() - pd.Timedelta(days=1))
-    return dminus1 + pd.Timedelta(hours=h)
+    # For load forecasts, assume the zone's DA auction cutoff: D-1 11:00 local (CH) or 12:00 (SDAC)
+    return time_axis.gate_closure(delivery_ts, topology.gate_closure_hour(zone))
 
-def build_load_features(rawdir="data/raw", outdir="data/processed"):
+@instrumented
+def build_load_features(zone="CH", rawdir="data/raw", outdir="data/processed"):
     rawdir, outdir = Path(rawdir), Path(outdir)
     outdir.mkdir(parents=True, exist_ok=True)
 
     try:
-        infile = rawdir / "ch_load_forecast.csv"
-        df = pd.read_csv(infile)
+        infile = rawdir / f"{topology.slug(zone)}_load_forecast"
+        df = storage.read_table(infile, time_col="time")
 
-        # Expect first col = datetime, second = forecast
-        tcol = df.columns[0]
+        # Expect time + one forecast column
         vcol = df.columns[1] if len(df.columns) > 1 else "forecast_load"
-        df = df.rename(columns={tcol: "time", vcol: "forecast_load"})
-
-        df["time"] = _to_local(df["time"])
+        df = df.rename(columns={vcol: "forecast_load"})
         df = df.set_index("time").sort_index()
 
-        # Reindex to full hourly grid
-        full_hours = pd.date_range(df.index.min(), df.index.max(), freq="h", tz=TZ)
-        df = df.reindex(full_hours)
+        # Place on the full MTU grid (positions on the shared UTC slot axis)
+        df = time_axis.resample(df)
 
         # Ex-ante feature: lag 24h and lag 168h
-        df["forecast_load_lag24"] = df["forecast_load"].shift(24)
-        df["forecast_load_lag168"] = df["forecast_load"].shift(168)
+        df = apply_spec(df, {"forecast_load": {"lags": ["24h", "168h"]}})
 
         # Add audit columns
         df.index.name = "delivery_start_local"
         df = df.reset_index()
-        df["asof_local"] = _gct_asof(df["delivery_start_local"], "CH")
+        df["asof_local"] = _gct_asof(df["delivery_start_local"], zone)
 
         # Keep tidy output
         keep = [
@@ -51,12 +46,12 @@ def build_load_features(rawdir="data/raw", outdir="data/processed"):
         ]
         df = df[keep].sort_values("delivery_start_local")
 
-        out = outdir / "load_features_exante.csv"
-        df.to_csv(out, index=False)
-        print(f"[ok] Load: {len(df)} rows -> {out}")
+        out = storage.write_table(df, outdir / topology.table("load_features_exante", zone))
+        print(f"[ok] {zone} load: {len(df)} rows -> {out}")
 
     except Exception as e:
-        print(f"[fail] Load features: {e}")
+        print(f"[fail] {zone} load features: {e}")
 
 if __name__ == "__main__":
-    build_load_features()
+    for zone in topology.TARGET_ZONES:
+        build_load_features(zone)
@@ -1,69 +1,140 @@
-import pandas as pd
+import os
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from functools import reduce
+
+import pandas as pd
+import pyarrow as pa
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from scripts.utils import storage
+from scripts.utils import time_axis
+from scripts.utils import topology
+from scripts.utils import instrument
+from scripts.utils.instrument import instrumented
 
 TZ = "Europe/Zurich"
 
-def build_master_dataset(processed_dir="data/processed", outdir="data/final"):
+# Define files to merge ({z}: the target zone, e.g. ch_price_only_features)
+FILES = {
+    "calendar": "{z}_calendar_features",
+    "price_only": "{z}_price_only_features",
+    "res": "{z}_res_features_exante",
+    "hydro": "{z}_hydro_features",
+    "load": "{z}_load_features_exante",
+    "fuels": "fuels_features",
+    "reservoir": "{z}_reservoir_features",
+    "outages": "{z}_outage_features",
+    "flows": "flow_features_all",
+    "ntc": "ntc_features_all",
+    "congestion": "congestion_features_all"
+}
+# Tables shared by every zone with one column group per border direction; a zone keeps its own
+BORDER_TABLES = {"flows", "ntc", "congestion"}
+
+def _empty(path):
+    #typed, zero-row frame with the table's columns, read from the schema alone
+    fields = storage.schema(path)
+    if None in fields.values():
+        return pd.DataFrame(columns=list(fields))
+    return pa.schema(list(fields.items())).empty_table().to_pandas()
+
+def _build_month(inputs, columns, empties, year, month, out_path, zone="CH"):
+    """Join one UTC month of every input and write it as that month's partition"""
+    with instrument.stage("build_master_month", month=f"{year}-{month:02d}", zone=zone):
+        return _join_month(inputs, columns, empties, year, month, out_path)
+
+def _join_month(inputs, columns, empties, year, month, out_path):
+    start, end = storage.month_bounds(year, month)
+    blocks = {}
+    for name, path in inputs.items():
+        #delivery_start_local comes back tz-aware (Europe/Zurich)
+        df = storage.read_table(path, columns=columns.get(name), start=start, end=end)
+        if df["delivery_start_local"].duplicated().any():
+            print(f"[skip] {name} {year}-{month:02d}: several rows per hour (old long layout?), rebuild it")
+            df = empties[name]
+        # An input without this month still takes part (empty), so every month gets the same
+        # columns, types and _<name> suffixes
+        blocks[name] = df if not df.empty else empties[name]
+
+    # Every block has one row per hour, so the month is aligned by position on the shared hour axis
+    master = time_axis.join(blocks)
+
+    # Drop rows where the zone's price (target) is missing
+    if "price" in master.columns:
+        master = master.dropna(subset=["price"])
+    if master.empty:
+        return year, month, 0
+
+    storage.write_table(master, out_path, mode="partitions", csv=False)
+    return year, month, len(master)
+
+@instrumented
+def build_master_dataset(zone="CH", processed_dir="data/processed", outdir="data/processed", workers=None):
     processed_dir, outdir = Path(processed_dir), Path(outdir)
     outdir.mkdir(parents=True, exist_ok=True)
 
-    # Define files to merge
-    files = {
-        "calendar": "calendar_features.csv",
-        "price_only": "price_only_features.csv",
-        "res": "ch_res_features_exante.csv",
-        "hydro": "ch_hydro_features.csv",
-        "load": "load_features_exante.csv",
-        "fuels_gas": "ttf_gas_features.csv",
-        "fuels_co2": "eua_co2_features.csv",
-        "outages": "ch_outage_features.csv",
-        "flows": "flow_features_all.csv",
-        "ntc": "ntc_features_all.csv",
-        "congestion": "congestion_features_all.csv"
-    }
-
-    dfs = []
-    for name, fname in files.items():
+    inputs, columns = {}, {}
+    for name, template in FILES.items():
+        fname = template.format(z=topology.slug(zone))
         fpath = processed_dir / fname
-        if not fpath.exists():
+        if not storage.exists(fpath):
             print(f"[skip] {name}: {fname} not found")
             continue
+        if name in BORDER_TABLES:
+            columns[name] = topology.border_columns(storage.schema(fpath), zone)
+            if not columns[name]:
+                print(f"[skip] {name}: no {zone} borders in {fname}")
+                continue
+        inputs[name] = fpath
 
-        try:
-            df = pd.read_csv(fpath)
-
-            # --- Force datetime ---
-            if "delivery_start_local" in df.columns:
-                df["delivery_start_local"] = pd.to_datetime(
-                    df["delivery_start_local"], errors="coerce", utc=True
-                ).dt.tz_convert(TZ)
-
-            dfs.append(df)
-            print(f"[ok] {name}: {len(df)} rows loaded")
-        except Exception as e:
-            print(f"[fail] {name}: {e}")
+    if not inputs:
+        print("[fail] No datasets found, aborting.")
+        return
 
-    if not dfs:
-        print("[fail] No datasets loaded, aborting.")
+    # Months are independent: each reads only its own partition of every input,
+    # so peak memory is one month of the master however many years or columns there are
+    months = sorted({m for path in inputs.values() for m in storage.months(path)})
+    if not months:
+        print(f"[fail] {zone}: no month partitions in the inputs, nothing to build")
         return
+    empties = {
+        name: _empty(path)[["delivery_start_local"] + columns[name]] if name in columns else _empty(path)
+        for name, path in inputs.items()
+    }
+    n_cols = time_axis.join(empties).shape[1]
+    print(f"[info] {zone}: {len(inputs)} inputs, {len(months)} months, {n_cols} cols")
 
-    # Merge everything on delivery_start_local
-    master = reduce(
-        lambda left, right: pd.merge(left, right, on="delivery_start_local", how="outer"),
-        dfs
-    )
+    out_path = storage.dataset_path(outdir / topology.table("master_dataset", zone))
+    if out_path.exists():
+        shutil.rmtree(out_path)
 
-    # Sort and clean
-    master = master.sort_values("delivery_start_local").reset_index(drop=True)
+    rows = 0
+    workers = workers or min(len(months), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            (y, m): pool.submit(instrument.run_collected, _build_month, inputs, columns, empties, y, m, out_path, zone)
+            for y, m in months
+        }
+        for (year, month), future in futures.items():
+            try:
+                (_, _, n), counts = future.result()
+            except Exception as e:
+                print(f"[fail] {year}-{month:02d}: {e}")
+                continue
+            #rows read and written by the worker count towards this stage
+            instrument.merge(counts)
+            rows += n
+            print(f"[ok] {zone} {year}-{month:02d}: {n} rows")
 
-    # Drop rows where Swiss price (target) is missing
-    if "price" in master.columns:
-        master = master.dropna(subset=["price"])
+    #the CSV export is written once at the end, streaming the finished partitions in order
+    if storage.EXPORT_CSV:
+        for i, part in enumerate(storage.iter_partitions(out_path)):
+            part.to_csv(storage.csv_path(out_path), mode="w" if i == 0 else "a", header=i == 0, index=False)
 
-    out = outdir / "master_dataset.csv"
-    master.to_csv(out, index=False)
-    print(f"[ok] Master dataset saved -> {out} ({master.shape[0]} rows, {master.shape[1]} cols)")
+    print(f"[ok] {zone} master dataset saved -> {out_path} ({rows} rows, {n_cols} cols)")
 
 if __name__ == "__main__":
-    build_master_dataset()
+    for zone in topology.TARGET_ZONES:
+        build_master_dataset(zone)
@@ -1,59 +1,93 @@
+import numpy as np
 import pandas as pd
+import re
+import sys
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from scripts.utils import storage
+from scripts.utils import topology
+from scripts.utils.outage_index import OutageIndex
+from scripts.utils.time_axis import MTU, gate_closure
+from scripts.utils.instrument import instrumented
+
 TZ = "Europe/Zurich"
 
-def build_outage_features(infile="data/raw/ch_outages.csv", outdir="data/processed"):
+def _slug(name):
+    return re.sub(r"[^0-9a-z]+", "_", str(name).lower()).strip("_") or "unknown"
+
+@instrumented
+def build_outage_features(zone="CH", rawdir="data/raw", outdir="data/processed"):
     outdir = Path(outdir)
     outdir.mkdir(parents=True, exist_ok=True)
+    z = topology.slug(zone)
+    infile = Path(rawdir) / f"{z}_outages"
 
     try:
-        df = pd.read_csv(infile, parse_dates=["start", "end"])
+        df = storage.read_table(infile, time_col="start")
     except Exception as e:
         print(f"[fail] Could not read {infile}: {e}")
         return
 
     if df.empty:
-        print("[warn] Outage file is empty")
+        print(f"[warn] {zone} outage file is empty")
         return
 
     df["start"] = pd.to_datetime(df["start"], utc=True).dt.tz_convert(TZ)
     df["end"] = pd.to_datetime(df["end"], utc=True).dt.tz_convert(TZ)
-    df["offline_mw"] = df["nominal_power"] - df["avail_qty"]
-
-    start = df["start"].min().floor("h")
-    end = df["end"].max().ceil("h")
-    hours = pd.date_range(start, end, freq="h", tz=TZ)
-
-    total_outage = pd.Series(0.0, index=hours)
-    hydro_outage = pd.Series(0.0, index=hours)
-
-    for _, row in df.iterrows():
-        s, e, val = row["start"], row["end"], row["offline_mw"]
-        is_hydro = "Hydro" in str(row["production_resource_psr_name"])
-        if pd.notna(s) and pd.notna(e) and pd.notna(val):
-            s_hour, e_hour = s.ceil("h"), e.floor("h")
-            if s_hour <= e_hour:
-                hours_range = pd.date_range(s_hour, e_hour, freq="h", tz=TZ)
-                total_outage.loc[hours_range] += val
-                if is_hydro:
-                    hydro_outage.loc[hours_range] += val
+    df = df.dropna(subset=["start", "end"]).reset_index(drop=True)
+
+    #round in UTC: local floor/ceil is ambiguous in the autumn DST hour
+    start = df["start"].min().tz_convert("UTC").floor(MTU)
+    end = df["end"].max().tz_convert("UTC").ceil(MTU)
+    hours = pd.date_range(start, end, freq=MTU).tz_convert(TZ)
+    asof = gate_closure(hours, topology.gate_closure_hour(zone))
+
+    index = OutageIndex(df)
+
+    #breakdown keys: one sweep per PSR type and per unit
+    psr_codes, psr_names = pd.factorize(df["production_resource_psr_name"].fillna("unknown"))
+    unit = df["production_resource_name"].fillna(df["production_resource_id"]).fillna("unknown")
+    unit_codes, unit_names = pd.factorize(unit)
+    n_psr, n_unit = len(psr_names), len(unit_names)
+    is_hydro = np.array(["Hydro" in str(p) for p in psr_names], dtype=bool)
+
+    #ex-post view (latest revision of every outage): audit only, never a model input
+    psr_latest = index.offline(hours, keys=psr_codes, n_keys=n_psr)
+    #ex-ante view: what had been published by gate closure (D-1 11:00 in CH) for each delivery hour
+    psr_asof = index.offline(hours, asof, keys=psr_codes, n_keys=n_psr)
+    unit_asof = index.offline(hours, asof, keys=unit_codes, n_keys=n_unit)
 
     out = pd.DataFrame({
-        "delivery_start_local": total_outage.index,
-        "ch_outage_offline_mw": total_outage.values,
-        "ch_hydro_outage_mw": hydro_outage.values
+        "delivery_start_local": hours,
+        "asof_local": asof,
+        f"{z}_outage_offline_mw_exante": psr_asof.sum(axis=1),
+        f"{z}_hydro_outage_mw_exante": psr_asof[:, is_hydro].sum(axis=1)
     })
 
-    # Add lags
-    out["ch_outage_offline_mw_lag24"] = out["ch_outage_offline_mw"].shift(24)
-    out["ch_outage_offline_mw_lag168"] = out["ch_outage_offline_mw"].shift(168)
-    out["ch_hydro_outage_mw_lag24"] = out["ch_hydro_outage_mw"].shift(24)
-    out["ch_hydro_outage_mw_lag168"] = out["ch_hydro_outage_mw"].shift(168)
+    # Per-PSR-type and per-unit breakdowns as known at gate closure (names sharing a slug are summed)
+    breakdown = {}
+    for j, name in enumerate(psr_names):
+        col = f"{z}_outage_psr_{_slug(name)}_mw_exante"
+        breakdown[col] = breakdown.get(col, 0) + psr_asof[:, j]
+    for j, name in enumerate(unit_names):
+        col = f"{z}_outage_unit_{_slug(name)}_mw_exante"
+        breakdown[col] = breakdown.get(col, 0) + unit_asof[:, j]
+    out = pd.concat([out, pd.DataFrame(breakdown)], axis=1)
 
-    outpath = outdir / "ch_outage_features.csv"
-    out.to_csv(outpath, index=False)
-    print(f"[ok] Outage features saved -> {outpath} ({len(out)} rows)")
+    outpath = storage.write_table(out, outdir / topology.table("outage_features", zone))
+    print(f"[ok] {zone} outage features saved -> {outpath} ({len(out)} rows, {n_psr} PSR types, {n_unit} units)")
+
+    # Latest revisions were not known at gate closure: kept apart from the features (and the master)
+    # for comparing the as-of view with what finally happened
+    latest = pd.DataFrame({
+        "delivery_start_local": hours,
+        f"{z}_outage_offline_mw": psr_latest.sum(axis=1),
+        f"{z}_hydro_outage_mw": psr_latest[:, is_hydro].sum(axis=1),
+    })
+    outpath = storage.write_table(latest, outdir / topology.table("outage_latest_diagnostics", zone))
+    print(f"[ok] {zone} latest-revision outages (diagnostics only) -> {outpath}")
 
 if __name__ == "__main__":
-    build_outage_features()
+    for zone in topology.TARGET_ZONES:
+        build_outage_features(zone)
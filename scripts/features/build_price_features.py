@@ -1,31 +1,34 @@
-import pandas as pd
+import sys
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from scripts.utils import storage
+from scripts.utils import time_axis
+from scripts.utils import topology
+from scripts.utils.instrument import instrumented
+
 TZ = "Europe/Zurich"
 
+@instrumented
 def build_price_features(rawdir="data/raw", outdir="data/processed"):
     rawdir, outdir = Path(rawdir), Path(outdir)
     outdir.mkdir(parents=True, exist_ok=True)
 
-    files = {
-        "price_ch": rawdir / "ch_day_ahead_prices.csv",
-        "price_de_lu": rawdir / "de_lu_day_ahead_prices.csv",
-        "price_fr": rawdir / "fr_day_ahead_prices.csv",
-        "price_it_nord": rawdir / "it_nord_day_ahead_prices.csv",
-    }
+    # Every zone of the topology, e.g. price_ch <- ch_day_ahead_prices
+    files = {f"price_{topology.slug(z)}": rawdir / f"{topology.slug(z)}_day_ahead_prices" for z in topology.ZONES}
 
     all_dfs = []
 
     for colname, path in files.items():
-        if not path.exists():
+        if not storage.exists(path):
             print(f"[skip] {colname}: {path} not found")
             continue
 
         try:
-            df = pd.read_csv(path, parse_dates=[0])  # first col = datetime
+            df = storage.read_table(path, time_col="time")  # time + price
             df.columns = ["delivery_start_local", colname]
-            df["delivery_start_local"] = pd.to_datetime(df["delivery_start_local"], utc=True).dt.tz_convert(TZ)
-            all_dfs.append(df)
+            # On the MTU grid: 15-min auction results average to hours at MTU=60min
+            all_dfs.append(time_axis.resample(df, "delivery_start_local"))
             print(f"[ok] {colname}: {len(df)} rows loaded")
 
         except Exception as e:
@@ -35,16 +38,11 @@ def build_price_features(rawdir="data/raw", outdir="data/processed"):
         print("[fail] No price files processed")
         return
 
-    # Merge all price series on delivery_start_local
-    prices = all_dfs[0]
-    for df in all_dfs[1:]:
-        prices = pd.merge(prices, df, on="delivery_start_local", how="outer")
-
-    prices = prices.sort_values("delivery_start_local")
+    # Align all price series by position on the shared MTU axis
+    prices = time_axis.join({df.columns[1]: df for df in all_dfs})
 
     # Save consolidated prices
-    out = outdir / "day_ahead_prices.csv"
-    prices.to_csv(out, index=False)
+    out = storage.write_table(prices, outdir / "day_ahead_prices")
     print(f"[ok] Saved consolidated prices -> {out} ({prices.shape[0]} rows, {prices.shape[1]} cols)")
 
 if __name__ == "__main__":
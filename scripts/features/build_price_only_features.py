@@ -1,33 +1,39 @@
-import pandas as pd
+import sys
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from scripts.utils import storage
+from scripts.utils import time_axis
+from scripts.utils import topology
+from scripts.utils.lag_engine import apply_spec
+from scripts.utils.instrument import instrumented
+
 TZ = "Europe/Zurich"
 
-def build_price_only_features(
-    infile="data/raw/ch_day_ahead_prices.csv",
-    outdir="data/processed"
-):
-    outdir = Path(outdir)
+# Autoregressive lags (short, daily, weekly) and rolling mean & volatility of past prices
+LAGS = {
+    "price": {
+        "lags": ["1h", "24h", "48h", "168h"],
+        "windows": ["24h", "168h"], "stats": ["mean", "std"], "window_shift": "1h",
+        "lag_name": "lag_{lag}h", "window_name": "rolling_{stat}_{window}h"
+    }
+}
+
+@instrumented
+def build_price_only_features(zone="CH", rawdir="data/raw", outdir="data/processed"):
+    rawdir, outdir = Path(rawdir), Path(outdir)
     outdir.mkdir(parents=True, exist_ok=True)
 
-    # Load Swiss day-ahead prices
-    df = pd.read_csv(infile, parse_dates=[0])
+    # Load the zone's day-ahead prices (the forecasting target)
+    df = storage.read_table(rawdir / f"{topology.slug(zone)}_day_ahead_prices", time_col="time")
     df.columns = ["delivery_start_local", "price"]
 
-    # Ensure timezone-aware & sorted
-    df["delivery_start_local"] = pd.to_datetime(df["delivery_start_local"], utc=True).dt.tz_convert(TZ)
-    df = df.sort_values("delivery_start_local")
-
-    # Build autoregressive lags (short, daily, weekly)
-    for lag in [1, 24, 48, 168]:
-        df[f"lag_{lag}h"] = df["price"].shift(lag)
-
-    # Rolling mean & volatility
-    df["rolling_mean_24h"] = df["price"].shift(1).rolling(window=24).mean()
-    df["rolling_std_24h"]  = df["price"].shift(1).rolling(window=24).std()
+    # Full MTU grid, so a 24h lag is 24h back even across gaps (hourly history averages into
+    # hours at MTU=60min and is held over its quarter-hours at MTU=15min)
+    df = time_axis.resample(df, "delivery_start_local")
 
-    df["rolling_mean_168h"] = df["price"].shift(1).rolling(window=168).mean()
-    df["rolling_std_168h"]  = df["price"].shift(1).rolling(window=168).std()
+    # Lags and rolling windows from the spec above
+    df = apply_spec(df, LAGS)
 
     # Price spreads (Δ vs. lagged values)
     df["spread_1d"] = df["price"] - df["lag_24h"]
@@ -37,9 +43,9 @@ def build_price_only_features(
     df = df.dropna()
 
     # Save processed features
-    outpath = outdir / "price_only_features.csv"
-    df.to_csv(outpath, index=False)
-    print(f"[ok] Price-only features saved -> {outpath} ({len(df)} rows, {df.shape[1]} cols)")
+    outpath = storage.write_table(df, outdir / topology.table("price_only_features", zone))
+    print(f"[ok] {zone} price-only features saved -> {outpath} ({len(df)} rows, {df.shape[1]} cols)")
 
 if __name__ == "__main__":
-    build_price_only_features()
+    for zone in topology.TARGET_ZONES:
+        build_price_only_features(zone)
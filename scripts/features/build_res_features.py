@@ -1,81 +1,91 @@
+import sys
 from pathlib import Path
 import pandas as pd
 
-TZ = "Europe/Zurich"
-
-# DA auction (local) gate-closure times
-GCT_LOCAL = {
-    "CH": "11:00",
-    "default": "12:00"
-}
-
-def _delivery_hours_for_day(d_local_date):
-    s = pd.Timestamp(d_local_date, tz=TZ)
-    e = s + pd.Timedelta(days=1)
-    # robust to 23/25-hour DST days
-    return pd.date_range(s, e, freq="h", inclusive="left")
-
-def _gct_for_zone(zone: str, delivery_day_local: pd.Timestamp) -> pd.Timestamp:
-    # as-of is D-1 at 11:00/12:00 local; we store it for audit / merging discipline
-    cutoff = GCT_LOCAL.get(zone, GCT_LOCAL["default"])
-    d_minus_1 = (delivery_day_local - pd.Timedelta(days=1)).date()
-    return pd.Timestamp(f"{d_minus_1} {cutoff}", tz=TZ)
-
-def _build_one_zone(infile: Path, outdir: Path):
-    # ✅ FIX: load "time" column instead of ts_local/ts_utc
-    df = pd.read_csv(infile, parse_dates=["time"])
-    if df.empty:
-        return
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from scripts.utils import storage
+from scripts.utils import time_axis
+from scripts.utils import topology
+from scripts.utils.instrument import instrumented
 
-    # Recreate UTC and Local timestamps
-    df["ts_utc"] = pd.to_datetime(df["time"], utc=True)
-    df["ts_local"] = df["ts_utc"].dt.tz_convert(TZ)
+TZ = "Europe/Zurich"
 
-    zone = df["zone"].iloc[0]
-    df = df.sort_values("ts_local")
+WEATHER_COLS = [
+    "shortwave_radiation","direct_radiation","diffuse_radiation",
+    "wind_speed_80m","wind_speed_120m","cloud_cover"
+]
+
+def _delivery_grid(local_times):
+    # every MTU of every local day spanned by the data; robust to 23/25-hour DST days
+    days = local_times.dt.tz_localize(None).dt.normalize()
+    start = days.min().tz_localize(TZ)
+    end = (days.max() + pd.Timedelta(days=1)).tz_localize(TZ)
+    return pd.date_range(start, end, freq=time_axis.MTU, inclusive="left")
+
+def _gct_for_zones(zones, delivery_local):
+    # as-of is D-1 at the zone's gate closure (11:00/12:00 local wall clock); stored for audit / merging discipline
+    # (weather zones outside the topology get the SDAC 12:00)
+    gct = {z: info.get("gct", 12) for z, info in topology.ZONES.items()}
+    cutoff = zones.map(gct).fillna(12).astype(float)
+    return time_axis.gate_closure(delivery_local, cutoff).to_numpy()
+
+def load_weather(infiles):
+    """All zones' raw weather in one frame, indexed by (zone, ts_local)"""
+    frames = []
+    for infile in infiles:
+        # ✅ FIX: load "time" column instead of ts_local/ts_utc
+        df = storage.read_table(infile, time_col="time")
+        if not df.empty:
+            frames.append(df)
+    if not frames:
+        return pd.DataFrame()
+
+    df = pd.concat(frames, ignore_index=True)
+    df["ts_local"] = pd.to_datetime(df["time"], utc=True).dt.tz_convert(TZ)
 
     # Ensure expected columns exist
-    needed = [
-        "shortwave_radiation","direct_radiation","diffuse_radiation",
-        "wind_speed_80m","wind_speed_120m","cloud_cover"
-    ]
-    for c in needed:
+    for c in WEATHER_COLS:
         if c not in df.columns:
             df[c] = pd.NA
+    df = df.drop_duplicates(["zone", "ts_local"], keep="last")
+
+    # Open-Meteo is hourly-only: spread each zone onto the MTU grid, interpolating the
+    # instantaneous wind speeds and holding the hourly radiation/cloud values
+    how = {c: "linear" for c in ("wind_speed_80m", "wind_speed_120m")}
+    df = pd.concat([
+        time_axis.resample(g[["ts_local"] + WEATHER_COLS], "ts_local", how=how).assign(zone=zone)
+        for zone, g in df.groupby("zone", sort=False)
+    ], ignore_index=True)
+    return df.set_index(["zone", "ts_local"])
+
+def build_res_features(weather):
+    """Delivery-day rows, as-of tags and proxies for all zones in one pass"""
+    # One delivery grid per zone (covering whole local days), joined with a single reindex
+    zones = weather.index.get_level_values("zone").unique()
+    grids = [
+        pd.MultiIndex.from_product([[z], _delivery_grid(weather.loc[z].index.to_series())],
+                                   names=["zone", "delivery_start_local"])
+        for z in zones
+    ]
+    grid = grids[0].append(grids[1:])
+    out = weather[WEATHER_COLS].reindex(grid).reset_index()
 
-    # Build per-day delivery rows with ex-ante as-of tag
-    start_day = df["ts_local"].dt.normalize().min()
-    end_day   = (df["ts_local"].dt.normalize().max() + pd.Timedelta(days=1)).normalize()
-    days = pd.date_range(start_day, end_day, freq="D", inclusive="left")
-
-    blocks = []
-    for d0 in days:
-        delivery_hours = _delivery_hours_for_day(d0.date())
-        # join weather (already hour-aligned by ts_local)
-        take = df.set_index("ts_local").reindex(delivery_hours).reset_index()
-        take.rename(columns={"index":"delivery_start_local"}, inplace=True)
-        # Tag as-of (D-1 11:00/12:00 local) for audit & merges
-        take["asof_local"] = _gct_for_zone(zone, d0)
-        take["zone"] = zone
-        blocks.append(take)
-
-    out = pd.concat(blocks, ignore_index=True)
+    # Tag as-of (D-1 11:00/12:00 local) for audit & merges
+    out["asof_local"] = _gct_for_zones(out["zone"], out["delivery_start_local"])
 
     # === Proxies (no extra model) ===
     # PV proxy: clip GHI at 0
-    out["pv_proxy_wm2"] = out["shortwave_radiation"].clip(lower=0)
+    out["pv_proxy_wm2"] = pd.to_numeric(out["shortwave_radiation"], errors="coerce").clip(lower=0)
 
     # Wind proxy: v^3 using 120m if available else 80m; safe clip at 0; per-day normalization
     v = out["wind_speed_120m"].fillna(out["wind_speed_80m"])
     v = pd.to_numeric(v, errors="coerce").clip(lower=0)
-    raw = v ** 3
-    out["wind_proxy_raw"] = raw
-
-    # Normalize by 99th percentile *within the same local day* to reduce storm/spike leverage
-    out["date"] = out["delivery_start_local"].dt.date
-    denom = out.groupby("date")["wind_proxy_raw"].transform(
-        lambda s: s.quantile(0.99) if s.notna().any() else pd.NA
-    )
+    out["wind_proxy_raw"] = v ** 3
+
+    # Normalize by 99th percentile *within the same local day and zone* to reduce storm/spike leverage
+    # (all-NaN days give NaN; one grouped quantile instead of a Python lambda per group)
+    date = out["delivery_start_local"].dt.tz_localize(None).dt.normalize()
+    denom = out.groupby([out["zone"], date])["wind_proxy_raw"].transform("quantile", 0.99)
     out["wind_proxy_unit"] = (out["wind_proxy_raw"] / denom).clip(upper=1.5)
 
     # Keep tidy columns for downstream merges (raw + proxies + audit)
@@ -85,20 +95,29 @@ def _build_one_zone(infile: Path, outdir: Path):
         "wind_speed_80m","wind_speed_120m","cloud_cover",
         "pv_proxy_wm2","wind_proxy_unit"
     ]
-    out = out[keep].sort_values(["delivery_start_local","zone"])
-
-    outdir.mkdir(parents=True, exist_ok=True)
-    out_path = outdir / f"{zone.lower()}_res_features_exante.csv"
-    out.to_csv(out_path, index=False)
-    print(f"[ok] {zone}: wrote {len(out)} rows -> {out_path}")
+    return out[keep].sort_values(["delivery_start_local","zone"], kind="stable")
 
+@instrumented(name="build_res_features")
 def main(rawdir="data/raw", outdir="data/processed"):
     rawdir = Path(rawdir); outdir = Path(outdir)
-    for infile in sorted(rawdir.glob("*_weather_openmeteo.csv")):
-        try:
-            _build_one_zone(infile, outdir)
-        except Exception as e:
-            print(f"[fail] {infile.name}: {e}")
+    outdir.mkdir(parents=True, exist_ok=True)
+
+    #one dataset per zone, whether already Parquet or still a pre-Parquet CSV
+    infiles = sorted({storage.dataset_path(p) for p in rawdir.glob("*_weather_openmeteo*")})
+    try:
+        weather = load_weather(infiles)
+        if weather.empty:
+            print("[fail] No weather data found")
+            return
+        out = build_res_features(weather)
+    except Exception as e:
+        print(f"[fail] RES features: {e}")
+        return
+
+    # One output per zone, as the master dataset expects
+    for zone, block in out.groupby("zone", sort=False):
+        out_path = storage.write_table(block, outdir / f"{zone.lower()}_res_features_exante")
+        print(f"[ok] {zone}: wrote {len(block)} rows -> {out_path}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,62 @@
+import pandas as pd
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from scripts.utils import storage
+from scripts.utils import time_axis
+from scripts.utils import topology
+from scripts.utils.instrument import instrumented
+
+TZ = "Europe/Zurich"
+
+# Weekly reservoir readings (BFE, CH only: fetch_ch_reservoir_levels.py). A reading is dated
+# on its Monday and published later in the week; it is used from Thursday noon on
+PUBLICATION_LAG = "3D12h"
+# a reading older than this (a missed publication or two) is treated as missing
+MAX_AGE = "21D"
+REGIONS = {"wallis": "wallis", "graubuenden": "graubuenden", "tessin": "tessin",
+           "uebrigch": "other", "totalch": "total"}
+
+@instrumented
+def build_reservoir_features(zone="CH", rawdir="data/raw", outdir="data/processed"):
+    outdir = Path(outdir)
+    outdir.mkdir(parents=True, exist_ok=True)
+    infile = Path(rawdir) / f"{topology.slug(zone)}_reservoir_levels_weekly.csv"
+
+    if not infile.exists():
+        print(f"[skip] {zone} reservoir levels: {infile} not found")
+        return
+
+    df = pd.read_csv(infile, sep=None, engine="python")
+    df.columns = [c.strip().lower() for c in df.columns]
+    date_col = "datum" if "datum" in df.columns else df.columns[0]
+    df["date"] = pd.to_datetime(df[date_col], errors="coerce")
+
+    # Stored energy (GWh) and fill ratio per region, e.g. reservoir_total_gwh, reservoir_total_fill
+    features = pd.DataFrame({"date": df["date"]})
+    for col in df.columns:
+        if not col.endswith("_speicherinhalt_gwh") or "_max_" in col:
+            continue
+        region = col.removesuffix("_speicherinhalt_gwh")
+        name = REGIONS.get(region, region)
+        content = pd.to_numeric(df[col], errors="coerce")
+        features[f"reservoir_{name}_gwh"] = content
+        max_col = f"{region}_max_speicherinhalt_gwh"
+        if max_col in df.columns:
+            features[f"reservoir_{name}_fill"] = content / pd.to_numeric(df[max_col], errors="coerce")
+
+    if features.shape[1] == 1:
+        print(f"[fail] {zone} reservoir levels: no *_speicherinhalt_gwh columns in {infile}")
+        return
+
+    # Each MTU slot takes the latest reading published before its gate closure
+    out_df = time_axis.asof(features.dropna(subset=["date"]), "date", lag=PUBLICATION_LAG,
+                            cutoff_hour=topology.gate_closure_hour(zone), max_age=MAX_AGE)
+
+    outpath = storage.write_table(out_df, outdir / topology.table("reservoir_features", zone))
+    print(f"[ok] {zone} reservoir features saved -> {outpath} ({len(out_df)} rows, {features.shape[1] - 1} cols)")
+
+if __name__ == "__main__":
+    for zone in topology.TARGET_ZONES:
+        build_reservoir_features(zone)
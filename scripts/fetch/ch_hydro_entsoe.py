@@ -1,16 +1,22 @@
-from entsoe import EntsoePandasClient
 import pandas as pd
-import os
-from dotenv import load_dotenv
+import sys
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from scripts.utils.fetch_engine import fetch_many, make_client
+from scripts.utils import watermarks as wm
+from scripts.utils import topology
+from scripts.utils import instrument
+
+instrument.script("fetch_hydro")
+
 #setup
-load_dotenv()
-api_key = os.getenv("ENTSOE_API_KEY")
-client = EntsoePandasClient(api_key=api_key)
+client = make_client()
 
+#start only applies on the first fetch; afterwards each zone's PSR code resumes from its watermark
 start = pd.Timestamp("2021-03-22", tz="Europe/Zurich")
-end = pd.Timestamp("2025-01-01", tz="Europe/Zurich")
+end = wm.default_end()
+manifest = wm.load_manifest()
 
 #output folder
 outdir= Path("data/raw")
@@ -28,24 +34,38 @@ psr_codes={
     "B06": "hydro_pumped_mw"
 }
     
-all_df=[]
+#one job per (target zone, PSR code), monthly windows on a shared worker pool
+zones = topology.TARGET_ZONES
+jobs = {
+    (zone, psr): (lambda s, e, z=zone, p=psr: client.query_generation(country_code=z, start=s, end=e, psr_type=p))
+    for zone in zones for psr in psr_codes
+}
+outs = {zone: outdir / f"{topology.slug(zone)}_hydro_generation_entsoe" for zone in zones}
+starts = {(zone, psr): wm.tail_start(manifest, f"hydro/{zone}/{psr}", outs[zone], start) for zone, psr in jobs}
+print(f"Fetching hydro generation for {', '.join(zones)} ({', '.join(psr_codes)})")
+frames, failed = fetch_many(jobs, start, end, starts=starts)
 
-for psr, colname in psr_codes.items():
-    print("Fetching Swiss generation for {colname} ({psr})")
-    try:
-        g = client.query_generation(country_code="CH", start=start, end=end, psr_type=psr)
+for zone in zones:
+    all_df=[]
+
+    for psr, colname in psr_codes.items():
+        g = frames[(zone, psr)]
+        if g is None:
+            print(f"No new data for {zone} {psr} since {starts[(zone, psr)]}")
+            continue
+        if failed[(zone, psr)]:
+            print(f"[warn] {zone} {colname}: {len(failed[(zone, psr)])} monthly windows failed")
         g = g.rename(columns={g.columns[0]: colname}) if hasattr(g, "columns") else g.to_frame(colname)
         all_df.append(g)
-    except Exception as e:
-        print("Failed for {psr}: {e}")
-    
-if all_df:
-    mix = pd.concat(all_df, axis=1).sort_index()
-    out= outdir / "ch_hydro_generation_entsoe.csv"
-    mix.to_csv(out)
-    print ("Succeeded")
-
-else:
-    print("No entsoe data retrieved")
 
+    if all_df:
+        mix = pd.concat(all_df, axis=1).sort_index()
+        mix = wm.append_tail(outs[zone], mix)
+        for psr, colname in psr_codes.items():
+            if frames[(zone, psr)] is not None:
+                wm.record(manifest, f"hydro/{zone}/{psr}", outs[zone], mix[colname].dropna(), failed=failed[(zone, psr)])
+        wm.save_manifest(manifest)
+        print(f"Succeeded for {zone}")
 
+    else:
+        print(f"No entsoe data retrieved for {zone}")
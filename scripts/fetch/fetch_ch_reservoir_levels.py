@@ -1,7 +1,12 @@
-import pandas as pd
-import requests
+import sys
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from scripts.utils.http_cache import CachedSession
+from scripts.utils import instrument
+
+instrument.script("fetch_reservoir")
+
 #Direct link to the CSV data from opendata.swiss
 URL = "https://www.uvek-gis.admin.ch/BFE/ogd/17/ogd17_fuellungsgrad_speicherseen.csv"
 
@@ -11,7 +16,7 @@ outdir.mkdir(parents=True, exist_ok=True)
 outfile = outdir / "ch_reservoir_levels_weekly.csv"
 
 print("Fetching weekly Swiss reservoir levels")
-r = requests.get(URL)
+r = CachedSession().get(URL, timeout=60)
 r.raise_for_status()  #error if failed
 
 with open(outfile, "wb") as f:
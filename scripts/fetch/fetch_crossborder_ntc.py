@@ -1,48 +1,61 @@
-from entsoe import EntsoePandasClient
 import pandas as pd
-import os
-from dotenv import load_dotenv
+import sys
+from pathlib import Path
 
-#getting the api key
-load_dotenv()
-api_key = os.getenv("ENTSOE_API_KEY")
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from scripts.utils.fetch_engine import fetch_many, make_client
+from scripts.utils import watermarks as wm
+from scripts.utils import topology
+from scripts.utils import instrument
 
-#creating the client & defining time range
-client = EntsoePandasClient(api_key=api_key)
+instrument.script("fetch_ntc")
 
+#shared client (api key from .env) & defining time range
+client = make_client()
+
+#start only applies to series fetched for the first time; afterwards each series
+#resumes from its watermark in data/raw/fetch_manifest.json
 start = pd.Timestamp("2021-03-22", tz="Europe/Zurich")
-end = pd.Timestamp("2025-01-01", tz="Europe/Zurich")
+end = wm.default_end()
+manifest = wm.load_manifest()
 
 #creating loop for the different bidding zones
-#cross-border connections (always CH on one side)
+#cross-border connections: every border of the topology (build_border_features mirrors a missing direction)
 crossborder_links = {
-    ("CH", "DE_LU"): "Switzerland ↔ Germany-Luxembourg",
-    ("CH", "FR"): "Switzerland ↔ France",
-    ("CH", "IT_NORD"): "Switzerland ↔ Italy North"
+    (a, b): f"{topology.ZONES[a]['name']} ↔ {topology.ZONES[b]['name']}" for a, b in topology.BORDERS
 }
 
-#fetch loop
-for country_from, country_to in crossborder_links.keys():
-    description = crossborder_links[(country_from, country_to)]
-    print(f"Fetching NTC for {description} ({country_from} <-> {country_to})...")
-
-    try:
-        #query ENTSO-E Transmission Capacities (Document A09)
-        df = client.query_net_transfer_capacity_dayahead(
-            country_code_from=country_from,
-            country_code_to=country_to,
-            start=start,
-            end=end
+#query ENTSO-E Transmission Capacities (Document A09), monthly windows on a shared pool
+jobs = {
+    (country_from, country_to): (
+        lambda s, e, a=country_from, b=country_to: client.query_net_transfer_capacity_dayahead(
+            country_code_from=a, country_code_to=b, start=s, end=e
         )
-
-        #convert to DataFrame if Series
-        if isinstance(df, pd.Series):
-            df = df.to_frame(name="ntc_mw")
-
-        #save to CSV
-        output_path = f"data/raw/ntc_{country_from.lower()}_{country_to.lower()}.csv"
-        df.to_csv(output_path)
-        print(f"Saved NTC {description} to {output_path}")
-
-    except Exception as e:
-        print(f"Failed to fetch NTC {description}: {e}")
\ No newline at end of file
+    )
+    for country_from, country_to in crossborder_links
+}
+paths = {(a, b): f"data/raw/ntc_{a.lower()}_{b.lower()}" for a, b in crossborder_links}
+starts = {(a, b): wm.tail_start(manifest, f"ntc/{a}-{b}", paths[(a, b)], start) for a, b in crossborder_links}
+print(f"Fetching NTC for {len(jobs)} links...")
+frames, failed = fetch_many(jobs, start, end, starts=starts)
+
+for (country_from, country_to), description in crossborder_links.items():
+    df = frames[(country_from, country_to)]
+    if df is None:
+        print(f"No new NTC {description} since {starts[(country_from, country_to)]}")
+        continue
+    if failed[(country_from, country_to)]:
+        print(f"[warn] {description}: {len(failed[(country_from, country_to)])} monthly windows failed, saved with gaps")
+
+    #convert to DataFrame if Series
+    if isinstance(df, pd.Series):
+        df = df.to_frame(name="ntc_mw")
+
+    #append the new tail to the CSV and move the watermark
+    output_path = paths[(country_from, country_to)]
+    out = wm.append_tail(output_path, df)
+    wm.record(manifest, f"ntc/{country_from}-{country_to}", output_path, out,
+              failed=failed[(country_from, country_to)])
+    print(f"Saved NTC {description} to {output_path} (+{len(df)} rows)")
+
+wm.save_manifest(manifest)
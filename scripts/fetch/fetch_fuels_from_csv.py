@@ -1,6 +1,13 @@
 import pandas as pd
+import sys
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from scripts.utils import storage
+from scripts.utils import instrument
+
+instrument.script("fetch_fuels_csv")
+
 #get files
 files = {
     "ttf_gas": "data/raw/gas_bloomberg.csv",
@@ -33,9 +40,8 @@ for name, infile in files.items():
         df = df.dropna(subset=["date", "price"])
         df = df[["date", "price"]]
 
-        #save standardized CSV
-        outpath = outdir / f"{name}_daily.csv"
-        df.to_csv(outpath, index=False)
+        #save standardized dataset
+        outpath = storage.write_table(df, outdir / f"{name}_daily", time_col="date")
         print(f"[ok] {name}: {len(df)} rows -> {outpath}")
 
     except Exception as e:
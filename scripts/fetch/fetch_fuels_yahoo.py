@@ -1,7 +1,14 @@
 import pandas as pd
+import sys
 import yfinance as yf
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from scripts.utils import storage
+from scripts.utils import instrument
+
+instrument.script("fetch_fuels_yahoo")
+
 # ---------------- Setup ----------------
 symbols = {
     "ttf_gas": "TTF=F",   # Dutch TTF Gas Front-Month
@@ -37,8 +44,7 @@ for name, ticker in symbols.items():
         df["date"] = pd.to_datetime(df["date"]).dt.tz_localize("UTC").dt.tz_convert("Europe/Zurich")
 
         df = df[["date", "price"]]
-        outpath = outdir / f"{name}_daily_yahoo.csv"
-        df.to_csv(outpath, index=False)
+        outpath = storage.write_table(df, outdir / f"{name}_daily_yahoo", time_col="date")
         print(f"[ok] {name}: {len(df)} rows -> {outpath}")
 
     except Exception as e:
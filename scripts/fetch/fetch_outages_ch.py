@@ -1,13 +1,18 @@
-from entsoe import EntsoePandasClient
 import pandas as pd
-import os
-from dotenv import load_dotenv
 from pathlib import Path
+import sys
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from scripts.utils import storage
+from scripts.utils import topology
+from scripts.utils.fetch_engine import call_with_retry, make_client, redact
+from scripts.utils import instrument
+
+instrument.script("fetch_outages")
 
 # ---------------- Setup ----------------
-load_dotenv()
-api_key = os.getenv("ENTSOE_API_KEY")
-client = EntsoePandasClient(api_key=api_key)
+# shared client: cached session (HTTP_CACHE_MODE=replay runs offline), retries per call
+client = make_client()
 
 start = pd.Timestamp("2021-03-22", tz="Europe/Zurich")
 end   = pd.Timestamp("2025-01-01", tz="Europe/Zurich")
@@ -16,30 +21,32 @@ outdir = Path("data/raw")
 outdir.mkdir(parents=True, exist_ok=True)
 
 # ---------------- Fetch ----------------
-print("Fetching planned generation outages for Switzerland (CH)...")
-
-try:
-    # ENTSO-E API call: unavailability of generation units
-    outages = client.query_unavailability_of_generation_units(
-        country_code="CH",
-        start=start,
-        end=end
-    )
-
-    if outages.empty:
-        print("[warn] No outage data returned")
-    else:
-        # Reset index for tidy format
-        outages = outages.reset_index()
-
-        # Filter to "Planned" outages only (ex-ante valid)
-        if "type" in outages.columns:
-            outages = outages[outages["type"].str.contains("Planned", case=False, na=False)]
-
-        # Save
-        outpath = outdir / "ch_outages.csv"
-        outages.to_csv(outpath, index=False)
-        print(f"[ok] Saved {len(outages)} rows -> {outpath}")
-
-except Exception as e:
-    print(f"[fail] Could not fetch outages: {e}")
+for zone in topology.TARGET_ZONES:
+    print(f"Fetching planned generation outages for {topology.ZONES[zone]['name']} ({zone})...")
+
+    try:
+        # ENTSO-E API call: unavailability of generation units
+        outages = call_with_retry(
+            client.query_unavailability_of_generation_units,
+            country_code=zone,
+            start=start,
+            end=end,
+            label=f"outages {zone}"
+        )
+
+        if outages is None or outages.empty:
+            print(f"[warn] No outage data returned for {zone}")
+        else:
+            # Reset index for tidy format (keeps created_doc_time)
+            outages = outages.reset_index()
+
+            # Keep planned and forced outages and every revision (mrid, revision, created_doc_time,
+            # docstatus): build_outage_features decides what was known at gate closure
+            print(f"[info] {outages['mrid'].nunique()} outages, {len(outages)} rows incl. revisions")
+
+            # Save (partitioned on the outage start)
+            outpath = storage.write_table(outages, outdir / f"{topology.slug(zone)}_outages", time_col="start")
+            print(f"[ok] Saved {len(outages)} rows -> {outpath}")
+
+    except Exception as e:
+        print(f"[fail] Could not fetch outages for {zone}: {redact(e)}")
@@ -1,33 +1,49 @@
-from entsoe import EntsoePandasClient
 import pandas as pd
-import os
-from dotenv import load_dotenv
+import sys
+from pathlib import Path
 
-#getting the api key
-load_dotenv()
-api_key = os.getenv("ENTSOE_API_KEY")
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from scripts.utils.fetch_engine import fetch_many, make_client
+from scripts.utils import watermarks as wm
+from scripts.utils import topology
+from scripts.utils import instrument
 
-#creating the client & defining time range
-client = EntsoePandasClient(api_key=api_key)
+instrument.script("fetch_prices")
 
+#shared client (api key from .env) & defining time range
+client = make_client()
+
+#start only applies to series fetched for the first time; afterwards each series
+#resumes from its watermark in data/raw/fetch_manifest.json
 start = pd.Timestamp("2021-03-22", tz="Europe/Zurich")
-end = pd.Timestamp("2025-01-01", tz="Europe/Zurich")
-
-#creating loop for the different bidding zones
-bidding_zones = {
-    "CH": "Switzerland",
-    "DE_LU": "Germany",
-    "FR": "France",
-    "IT_NORD": "Italy North"
+end = wm.default_end()
+manifest = wm.load_manifest()
+
+#creating loop for the different bidding zones (every zone of the topology)
+bidding_zones = {zone: info["name"] for zone, info in topology.ZONES.items()}
+
+#one query per zone, split into monthly windows and run on a shared worker pool
+jobs = {
+    zone_code: (lambda s, e, z=zone_code: client.query_day_ahead_prices(country_code=z, start=s, end=e))
+    for zone_code in bidding_zones
 }
+paths = {z: f"data/raw/{z.lower()}_day_ahead_prices" for z in bidding_zones}
+starts = {z: wm.tail_start(manifest, f"prices/{z}", paths[z], start) for z in bidding_zones}
+print(f"Fetching day-ahead prices for {', '.join(bidding_zones)}...")
+frames, failed = fetch_many(jobs, start, end, starts=starts)
 
 for zone_code, country in bidding_zones.items():
-    print(f"Fetching day-ahead prices for {country} ({zone_code})...")
-    
-    df = client.query_day_ahead_prices(country_code=zone_code,start=start,end=end)
+    df = frames[zone_code]
+    if df is None:
+        print(f"No new prices for {country} ({zone_code}) since {starts[zone_code]}")
+        continue
+    if failed[zone_code]:
+        print(f"[warn] {country}: {len(failed[zone_code])} monthly windows failed, saved with gaps")
 
-    #save to CSV
-    output_path = f"data/raw/{zone_code.lower()}_day_ahead_prices.csv"
-    df.to_csv(output_path)
-    print(f"Saved {country} prices to {output_path}")
+    #append the new tail to the CSV and move the watermark
+    output_path = paths[zone_code]
+    out = wm.append_tail(output_path, df)
+    wm.record(manifest, f"prices/{zone_code}", output_path, out, failed=failed[zone_code])
+    print(f"Saved {country} prices to {output_path} (+{len(df)} rows from {starts[zone_code]})")
 
+wm.save_manifest(manifest)
@@ -1,87 +1,253 @@
+import numpy as np
 import pandas as pd
-import requests
-import time
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from scripts.utils import watermarks as wm
+from scripts.utils.fetch_engine import RateLimiter, call_with_retry, mount_pool
+from scripts.utils.http_cache import CacheMiss, CachedSession
+from scripts.utils.instrument import instrumented
+
 API = "https://historical-forecast-api.open-meteo.com/v1/forecast"
 TZ = "Europe/Zurich"
 
+#Each bidding zone is a grid of points weighted by installed capacity, so zone
+#weather tracks where PV and wind output actually is. Weights are rough capacity
+#shares (relative within a zone); data/external/weather_grid.csv
+#(zone,lat,lon,pv_weight,wind_weight) overrides them, e.g. with hundreds of points.
 ZONES = {
-    "CH": (46.8, 8.3),
-    "DE_LU": (51.2, 10.4),
-    "FR": (46.6, 2.2),
-    "IT_NORD": (45.5, 9.0),
+    "CH": [
+        #lat, lon, pv_weight, wind_weight
+        (47.38, 8.54, 0.20, 0.00),   # Zurich
+        (46.95, 7.45, 0.20, 0.10),   # Bern / Mittelland
+        (47.56, 7.59, 0.10, 0.00),   # Basel
+        (46.52, 6.63, 0.15, 0.10),   # Vaud
+        (47.42, 9.37, 0.10, 0.00),   # St. Gallen
+        (47.20, 7.05, 0.05, 0.50),   # Jura (Mont-Crosin)
+        (46.23, 7.36, 0.10, 0.30),   # Valais
+        (46.00, 8.95, 0.10, 0.00),   # Ticino
+    ],
+    "DE_LU": [
+        (48.50, 11.50, 0.25, 0.05),  # Bavaria
+        (48.60, 9.00, 0.15, 0.03),   # Baden-Wuerttemberg
+        (51.50, 7.50, 0.15, 0.10),   # NRW
+        (52.50, 13.00, 0.15, 0.20),  # Brandenburg
+        (53.50, 10.00, 0.10, 0.25),  # Lower Saxony / Hamburg
+        (54.30, 9.50, 0.05, 0.25),   # Schleswig-Holstein
+        (51.00, 11.50, 0.15, 0.12),  # Saxony / Thuringia
+    ],
+    "FR": [
+        (43.60, 1.40, 0.25, 0.10),   # Occitanie
+        (44.80, -0.60, 0.20, 0.05),  # Nouvelle-Aquitaine
+        (43.50, 5.40, 0.20, 0.00),   # PACA
+        (49.50, 3.50, 0.05, 0.40),   # Hauts-de-France / Grand Est
+        (47.50, -1.50, 0.10, 0.20),  # Pays de la Loire / Bretagne
+        (45.75, 4.85, 0.15, 0.05),   # Auvergne-Rhone-Alpes
+        (48.60, 6.20, 0.05, 0.20),   # Lorraine
+    ],
+    "IT_NORD": [
+        (45.50, 9.20, 0.30, 0.00),   # Lombardy
+        (45.40, 11.90, 0.25, 0.00),  # Veneto
+        (44.50, 11.30, 0.20, 0.30),  # Emilia-Romagna
+        (45.10, 7.70, 0.20, 0.30),   # Piedmont
+        (44.40, 8.90, 0.05, 0.40),   # Liguria
+    ],
 }
 
-HOURLY = ",".join([
-    "shortwave_radiation", "direct_radiation", "diffuse_radiation",
-    "wind_speed_80m", "wind_speed_120m", "cloud_cover"
-])
+GRID_FILE = Path("data/external/weather_grid.csv")
+
+PV_VARS = ["shortwave_radiation", "direct_radiation", "diffuse_radiation", "cloud_cover"]
+WIND_VARS = ["wind_speed_80m", "wind_speed_120m"]
+VARS = PV_VARS[:3] + WIND_VARS + PV_VARS[3:]
+HOURLY = ",".join(VARS)
+
+MAX_WORKERS = 4
+#points per multi-coordinate request (keeps the URL well below server limits)
+BATCH_POINTS = 50
+
+#Open-Meteo free tier: 600 calls/min, 5000/h, 10000/day. A request counts as
+#several calls when it asks for >10 variables or >2 weeks per location.
+LIMITER = RateLimiter({60: 600, 3600: 5000, 86400: 10000})
+
+def _call_weight(params):
+    days = (pd.Timestamp(params["end_date"]) - pd.Timestamp(params["start_date"])).days + 1
+    n_vars = len(params["hourly"].split(","))
+    n_points = len(str(params["latitude"]).split(","))
+    return n_points * max(1.0, days / 14) * max(1.0, n_vars / 10)
+
+#shared keep-alive session; responses are cached under data/external/http_cache
+#(HTTP_CACHE_MODE=replay for offline runs) and only real requests use the rate budget
+SESSION = mount_pool(
+    CachedSession(before_send=lambda method, url, params: LIMITER.acquire(_call_weight(params))),
+    MAX_WORKERS
+)
 
-def fetch_block(lat, lon, start, end):
+def load_grid(path=GRID_FILE):
+    """zone -> DataFrame(lat, lon, pv_weight, wind_weight); CSV override if present"""
+    if Path(path).exists():
+        grid = pd.read_csv(path)
+    else:
+        grid = pd.DataFrame(
+            [(z, *p) for z, pts in ZONES.items() for p in pts],
+            columns=["zone", "lat", "lon", "pv_weight", "wind_weight"]
+        )
+    return {z: g.drop(columns="zone").reset_index(drop=True) for z, g in grid.groupby("zone", sort=False)}
+
+def _request_block(params):
+    r = SESSION.get(API, params=params, timeout=60)
+    r.raise_for_status()
+    body = r.json()
+    #one location -> object, several -> list in request order
+    return body if isinstance(body, list) else [body]
+
+def fetch_block(lats, lons, start, end):
+    """One multi-coordinate request; returns (times, {var: array[points, hours]}) or None"""
     params = {
-        "latitude": lat, "longitude": lon,
+        "latitude": ",".join(f"{x:g}" for x in lats),
+        "longitude": ",".join(f"{x:g}" for x in lons),
         "hourly": HOURLY,
         "models": "best_match",
         "timezone": "UTC",
         "start_date": start, "end_date": end
     }
-    for attempt in range(3):  # retry up to 3 times
-        try:
-            r = requests.get(API, params=params, timeout=60)
-            r.raise_for_status()
-            return pd.DataFrame(r.json()["hourly"])
-        except Exception as e:
-            print(f"  [retry {attempt+1}] {e}")
-            time.sleep(5)
-    return pd.DataFrame()
-
-def fetch_zone(zone, lat, lon, start, end):
-    """Fetch weather forecasts in yearly chunks and concatenate"""
+    label = f"{len(lats)} points {start}..{end}"
+    try:
+        #exponential backoff with jitter (429s and timeouts)
+        locations = call_with_retry(_request_block, params, label=label)
+    except CacheMiss as e:
+        print(f"  [miss] {e}")
+        return None
+    except Exception as e:
+        print(f"  [fail] {label}: {e}")
+        return None
+
+    times = pd.to_datetime(locations[0]["hourly"]["time"], utc=True)
+    values = {
+        v: np.array([loc["hourly"].get(v, [np.nan] * len(times)) for loc in locations], dtype=float)
+        for v in VARS
+    }
+    return times, values
+
+def weighted_zone_mean(values, grid):
+    """Capacity-weighted mean over points, NaN-aware: {var: array[points, hours]} -> {var: array[hours]}"""
+    out = {}
+    for v, x in values.items():
+        w = grid["wind_weight" if v in WIND_VARS else "pv_weight"].to_numpy(dtype=float)
+        if w.sum() == 0:
+            w = np.ones_like(w)
+        valid = ~np.isnan(x)
+        num = w @ np.where(valid, x, 0.0)
+        den = w @ valid
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out[v] = np.where(den > 0, num / den, np.nan)
+    return out
+
+def year_blocks(start, end):
+    """Split [start, end] (dates, inclusive) into calendar-year blocks"""
     start_date = pd.to_datetime(start)
     end_date = pd.to_datetime(end)
 
-    all_df = []
+    blocks = []
     for year in range(start_date.year, end_date.year + 1):
-        chunk_start = pd.Timestamp(f"{year}-01-01")
-        chunk_end = pd.Timestamp(f"{year}-12-31")
-
         # clip to requested start/end
-        if chunk_start < start_date:
-            chunk_start = start_date
-        if chunk_end > end_date:
-            chunk_end = end_date
-
-        if chunk_start > chunk_end:
-            continue  # skip invalid ranges
-
-        print(f"  fetching {zone} {chunk_start.date()}..{chunk_end.date()}")
-        df = fetch_block(
-            lat,
-            lon,
-            chunk_start.date().isoformat(),
-            chunk_end.date().isoformat()
-        )
+        chunk_start = max(pd.Timestamp(f"{year}-01-01"), start_date)
+        chunk_end = min(pd.Timestamp(f"{year}-12-31"), end_date)
+        if chunk_start <= chunk_end:
+            blocks.append((chunk_start.date().isoformat(), chunk_end.date().isoformat()))
+    return blocks
+
+def _batches(grid):
+    return [grid.iloc[i:i + BATCH_POINTS] for i in range(0, len(grid), BATCH_POINTS)]
+
+def _reduce_zone(zone, grid, parts):
+    """
+    parts: [((block_start, block_end), batch_no, result)] -> (tidy zone frame (time, zone, vars),
+    [(start, end)] of the blocks left out, as UTC timestamps for the watermark)
+    """
+    frames, failed = [], []
+    by_block = {}
+    for block, batch, res in parts:
+        by_block.setdefault(block, []).append((batch, res))
+
+    for block in sorted(by_block):
+        results = [res for _, res in sorted(by_block[block], key=lambda b: b[0])]
+        if any(res is None for res in results):
+            print(f"  [warn] {zone} block {block[0]}..{block[1]}: incomplete batches, skipped")
+            #dates are UTC days (timezone=UTC in the request), end inclusive
+            failed.append((pd.Timestamp(block[0], tz="UTC"), pd.Timestamp(block[1], tz="UTC") + pd.Timedelta(days=1)))
+            continue
+        times = results[0][0]
+        #stack all batches along the point axis, then one weighted reduction per variable
+        values = {v: np.vstack([res[1][v] for res in results]) for v in VARS}
+        means = weighted_zone_mean(values, grid)
+        df = pd.DataFrame({"time": times.tz_convert(TZ), "zone": zone, **means})
+        frames.append(df)
 
-        if not df.empty:
-            df["time"] = pd.to_datetime(df["time"], utc=True).dt.tz_convert(TZ)
-            df.insert(1, "zone", zone)
-            all_df.append(df)
+    return (pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()), failed
 
-    return pd.concat(all_df, ignore_index=True) if all_df else pd.DataFrame()
+def fetch_zone(zone, grid, start, end):
+    """Fetch one zone's grid in yearly chunks and reduce to the weighted zone series"""
+    parts = []
+    for chunk_start, chunk_end in year_blocks(start, end):
+        print(f"  fetching {zone} {chunk_start}..{chunk_end} ({len(grid)} points)")
+        for i, batch in enumerate(_batches(grid)):
+            parts.append(((chunk_start, chunk_end), i, fetch_block(batch["lat"], batch["lon"], chunk_start, chunk_end)))
+    return _reduce_zone(zone, grid, parts)[0]
 
-def main(start="2021-03-22", end="2025-01-01", outdir="data/raw"):
+def _save_zone(zone, grid, parts, out, manifest):
+    df, failed = _reduce_zone(zone, grid, parts)
+    if df.empty:
+        print(f"[fail] {zone}: no data retrieved")
+        return
+    merged = wm.append_tail(out, df, time_col="time")
+    #blocks with a failed or missing batch hold the watermark back, so they are fetched again
+    wm.record(manifest, f"weather/{zone}", out, merged, failed=failed)
+    wm.save_manifest(manifest)
+    print(f"[ok] {zone}: +{len(df)} rows from {len(grid)} points -> {out}")
+
+@instrumented(name="fetch_weather")
+def main(start="2021-03-22", end=None, outdir="data/raw", max_workers=MAX_WORKERS):
     outdir = Path(outdir); outdir.mkdir(parents=True, exist_ok=True)
-    for zone, (lat, lon) in ZONES.items():
-        print(f"[fetch] {zone} {start}..{end}")
-        df = fetch_zone(zone, lat, lon, start, end)
-        if not df.empty:
-            out = outdir / f"{zone.lower()}_weather_openmeteo.csv"
-            df.to_csv(out, index=False)
-            print(f"[ok] {zone}: {len(df)} rows saved to {out}")
-        else:
-            print(f"[fail] {zone}: no data retrieved")
+    #the historical-forecast archive lags real time, so default to yesterday
+    end = end or (pd.Timestamp.now(tz=TZ).normalize() - pd.Timedelta(days=1)).date().isoformat()
+    manifest = wm.load_manifest()
+    grids = load_grid()
+
+    #plan zone x year-block x point-batch work, resuming each zone from its watermark
+    plan = {}
+    for zone, grid in grids.items():
+        out = outdir / f"{zone.lower()}_weather_openmeteo"
+        tail = wm.tail_start(manifest, f"weather/{zone}", out, start, time_col="time")
+        tail_date = tail.normalize().date().isoformat()
+        blocks = year_blocks(tail_date, end)
+        if not blocks:
+            print(f"[skip] {zone}: up to date ({tail_date})")
+            continue
+        print(f"[fetch] {zone} {tail_date}..{end} ({len(blocks)} blocks, {len(grid)} points)")
+        plan[zone] = (out, blocks)
+
+    #all requests on one pool; a zone is reduced and written as soon as its last request lands
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {}
+        for zone, (_, blocks) in plan.items():
+            for s, e in blocks:
+                for i, batch in enumerate(_batches(grids[zone])):
+                    fut = pool.submit(fetch_block, batch["lat"].tolist(), batch["lon"].tolist(), s, e)
+                    futures[fut] = (zone, (s, e), i)
+
+        pending = {zone: 0 for zone in plan}
+        for zone, _, _ in futures.values():
+            pending[zone] += 1
+        done = {zone: [] for zone in plan}
+
+        for fut in as_completed(futures):
+            zone, block, i = futures[fut]
+            done[zone].append((block, i, fut.result()))
+            pending[zone] -= 1
+            if pending[zone] == 0:
+                _save_zone(zone, grids[zone], done.pop(zone), plan[zone][0], manifest)
 
 if __name__ == "__main__":
     main()
-
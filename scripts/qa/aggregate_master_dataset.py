@@ -1,67 +1,133 @@
+import os
 import pandas as pd
-import numpy as np
+import pyarrow as pa
+import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-import holidays
 
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from scripts.utils import instrument
+from scripts.utils import storage
+from scripts.utils import topology
+from scripts.utils.instrument import instrumented
+
+#hourly means are kept as running sums and non-missing counts per UTC hour (every CH hour is one
+#UTC hour), so they are exact whatever the partitioning; months are accumulated in parallel and
+#merged by adding their accumulators
+HOUR_NS = 3_600_000_000_000
+#share of a text column's sampled values that must parse as numbers for it to be averaged
+NUMERIC_TEXT_SHARE = 0.95
+
+def _helper(col):
+    #asof_local* audit stamps only, not features whose name merely contains "asof"
+    return "border" in col or "direction" in col or col.startswith("asof_local")
+
+def _numeric_text(s):
+    #comma-decimal text ('18,73') -> float; anything else becomes NaN
+    return pd.to_numeric(s.astype(str).str.replace(",", ".", regex=False), errors="coerce")
+
+def _plan(infile):
+    """Numeric columns and text columns holding numbers ('18,73'), decided once from the schema"""
+    fields = storage.schema(infile)
+    if None in fields.values():
+        #CSV: no stored types, take them from its first rows
+        sample = pd.read_csv(storage.csv_path(infile), nrows=10_000)
+        kinds = {c: "num" if pd.api.types.is_numeric_dtype(sample[c]) else
+                 "text" if sample[c].dtype == "object" else None for c in sample.columns}
+    else:
+        kinds = {c: "num" if pa.types.is_integer(t) or pa.types.is_floating(t) or pa.types.is_boolean(t) else
+                 "text" if pa.types.is_string(t) or pa.types.is_large_string(t) else None for c, t in fields.items()}
+        text = [c for c, k in kinds.items() if k == "text"]
+        sample = next(storage.iter_partitions(infile, columns=text), pd.DataFrame(columns=text)) if text else None
+    #timestamps are not averaged, helper columns are dropped from the result anyway (step 7)
+    kinds = {c: k for c, k in kinds.items() if k and c != "delivery_start_local" and not _helper(c)}
+
+    #text columns are averaged only when they hold numbers; true categoricals (zone, ...) have no mean
+    categorical = []
+    for c in [c for c, k in kinds.items() if k == "text"]:
+        present = sample[c].dropna()
+        if not len(present) or _numeric_text(present).notna().mean() < NUMERIC_TEXT_SHARE:
+            categorical.append(c)
+    if categorical:
+        print(f"[info] not aggregating categorical columns: {categorical}")
+    return {c: k for c, k in kinds.items() if c not in categorical}
+
+def _sums(chunk, plan):
+    """(sums, counts) per UTC hour of one block of rows"""
+    #comma-decimal text -> float
+    values = {}
+    for c, kind in plan.items():
+        if kind == "text":
+            values[c] = _numeric_text(chunk[c])
+        else:
+            values[c] = pd.to_numeric(chunk[c], errors="coerce").astype(float)
+    values = pd.DataFrame(values, index=chunk.index)
+
+    hour = pd.DatetimeIndex(chunk["delivery_start_local"]).as_unit("ns").asi8 // HOUR_NS * HOUR_NS
+    groups = values.groupby(hour)
+    return groups.sum(min_count=0), groups.count()
+
+def _accumulate(infile, plan, year, month, zone="CH"):
+    """(sums, counts) per UTC hour of one month"""
+    with instrument.stage("aggregate_month", month=f"{year}-{month:02d}", zone=zone):
+        start, end = storage.month_bounds(year, month)
+        return _sums(storage.read_table(infile, columns=list(plan), start=start, end=end), plan)
+
+@instrumented
 def aggregate_master_dataset(
-    infile="data/processed/master_dataset.csv",
-    outfile="data/processed/master_dataset_agg.csv",
-    chunksize=500_000
+    infile="data/processed/ch_master_dataset",
+    outfile="data/processed/ch_master_dataset_agg",
+    zone="CH",
+    workers=None
 ):
     #paths
     infile, outfile = Path(infile), Path(outfile)
     print(f"[info] streaming dataset from {infile}...")
 
-    #swiss holidays (extend years as needed)
-    ch_holidays = holidays.Switzerland(years=range(2020, 2030))
-
-    #we will store per-chunk hourly aggregates here
-    results = []
-
-    #read large CSV in chunks to avoid OOM
-    for i, chunk in enumerate(pd.read_csv(infile, chunksize=chunksize, low_memory=False)):
-        print(f"[info] processing chunk {i+1}")
-
-        #--- 1) ensure timestamp is timezone-aware Europe/Zurich ---
-        #convert parsed strings to datetime with UTC, then convert to CH local time
-        chunk["delivery_start_local"] = pd.to_datetime(
-            chunk["delivery_start_local"], errors="coerce", utc=True
-        ).dt.tz_convert("Europe/Zurich")
-
-        #--- 2) coerce numeric-like object columns (e.g. '18,73') to floats ---
-        obj_cols = [c for c in chunk.columns if chunk[c].dtype == "object" and c != "delivery_start_local"]
-        for c in obj_cols:
-            #replace comma-decimal with dot, then try numeric; keep NaN on failure
-            #this preserves true categoricals (they remain NaN after coercion and will be "first" in agg)
-            chunk[c] = pd.to_numeric(
-                chunk[c].astype(str).str.replace(",", ".", regex=False),
-                errors="coerce"
-            )
-
-        #--- 3) choose aggregation per column: numeric -> mean, otherwise -> first ---
-        agg_spec = {}
-        for c in chunk.columns:
-            if c == "delivery_start_local":
-                continue
-            if pd.api.types.is_numeric_dtype(chunk[c]):
-                agg_spec[c] = "mean"
-            else:
-                agg_spec[c] = "first"
-
-        #--- 4) aggregate to 1 row per hour for this chunk ---
-        agg = chunk.groupby("delivery_start_local").agg(agg_spec).reset_index()
-        results.append(agg)
-
-    #--- 5) concatenate chunk aggregates & re-aggregate (in case hours spanned multiple chunks) ---
-    df = pd.concat(results, ignore_index=True)
-    df = df.groupby("delivery_start_local").mean(numeric_only=True).reset_index()
+    #the zone's national holidays (extend years as needed)
+    zone_holidays = topology.holiday_calendar(zone, range(2020, 2030))
+
+    #--- 1) aggregation plan once from the schema ---
+    plan = _plan(infile)
+
+    #--- 2) sums and counts per hour, one month per task ---
+    sums, counts = [], []
+    if storage.dataset_path(infile).is_dir():
+        months = storage.months(infile)
+        workers = workers or min(len(months), os.cpu_count() or 1) or 1
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {(y, m): pool.submit(instrument.run_collected, _accumulate, infile, plan, y, m, zone)
+                       for y, m in months}
+            for (year, month), future in futures.items():
+                (s, n), io = future.result()
+                instrument.merge(io)
+                sums.append(s)
+                counts.append(n)
+                print(f"[info] accumulated {year}-{month:02d} ({len(s)} hours)")
+    else:
+        #a master still held as CSV is read once, in blocks (no month pushdown to parallelise on)
+        for i, chunk in enumerate(storage.iter_partitions(infile, columns=list(plan))):
+            s, n = _sums(chunk, plan)
+            sums.append(s)
+            counts.append(n)
+            print(f"[info] accumulated block {i} ({len(s)} hours)")
+    if not sums:
+        print(f"[fail] {infile} holds no rows")
+        return
+
+    #--- 3) merge the accumulators (adding is exact, also for hours split across partitions) ---
+    total = pd.concat(sums).groupby(level=0).sum()
+    n = pd.concat(counts).groupby(level=0).sum()
+    df = (total / n.where(n > 0)).sort_index()
+    df.insert(0, "delivery_start_local", pd.to_datetime(df.index, utc=True))
+    df = df.reset_index(drop=True)
 
     print("[info] finished numeric aggregation, recomputing calendar features...")
 
-    #--- 6) ensure datetime dtype & CH timezone again (safe guard) ---
+    #--- 4) ensure datetime dtype & CH timezone again (safe guard) ---
     df["delivery_start_local"] = pd.to_datetime(df["delivery_start_local"], utc=True).dt.tz_convert("Europe/Zurich")
 
-    #--- 7) rebuild calendar features deterministically from timestamp ---
+    #--- 5) rebuild calendar features deterministically from timestamp ---
     #hour-of-day, weekday, weekend, month, season
     df["hour"] = df["delivery_start_local"].dt.hour
     df["dayofweek"] = df["delivery_start_local"].dt.dayofweek
@@ -72,27 +138,29 @@ def aggregate_master_dataset(
     #dst robustly: label is 'CEST' in DST, 'CET' otherwise
     df["is_dst"] = df["delivery_start_local"].dt.strftime("%Z").eq("CEST").astype(int)
 
-    #holidays (Switzerland)
+    #holidays (national, of the zone)
     df["date_only"] = df["delivery_start_local"].dt.date
-    df["is_holiday"] = df["date_only"].isin(ch_holidays).astype(int)
+    df["is_holiday"] = df["date_only"].isin(zone_holidays).astype(int)
     df = df.drop(columns=["date_only"])
 
-    #--- 8) forward-fill daily fundamentals across 24h (avoid sparse daily stamps) ---
-    for var in ["ttf_gas_price", "eua_co2_price"]:
+    #--- 6) forward-fill daily fundamentals across 24h (avoid sparse daily stamps) ---
+    for var in ["ttf_gas_eur", "eua_co2_eur"]:
         if var in df.columns:
             df[var] = df[var].ffill()
 
-    #--- 9) optional cleanup: drop meaningless leftover helper columns if any slipped through ---
-    #we aggregated numerics, so border/direction/asof columns should not be here; safeguard anyway:
-    drop_like = [c for c in df.columns if "border" in c or "direction" in c or "asof" in c]
+    #--- 7) optional cleanup: drop meaningless leftover helper columns if any slipped through ---
+    #we aggregated numerics, so border/direction/asof_local columns should not be here; safeguard anyway:
+    drop_like = [c for c in df.columns if _helper(c)]
     if drop_like:
         df = df.drop(columns=drop_like)
 
-    #--- 10) final sort + save ---
+    #--- 8) final sort + save ---
     df = df.sort_values("delivery_start_local")
     Path(outfile).parent.mkdir(parents=True, exist_ok=True)
-    df.to_csv(outfile, index=False)
+    storage.write_table(df, outfile)
     print(f"[ok] saved aggregated dataset -> {outfile} ({len(df)} rows, {len(df.columns)} cols)")
 
 if __name__ == "__main__":
-    aggregate_master_dataset()
+    for zone in topology.TARGET_ZONES:
+        z = topology.slug(zone)
+        aggregate_master_dataset(f"data/processed/{z}_master_dataset", f"data/processed/{z}_master_dataset_agg", zone)
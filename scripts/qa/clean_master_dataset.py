@@ -1,66 +1,167 @@
 # scripts/qa/clean_master_dataset.py
 
+import numpy as np
 import pandas as pd
+import shutil
+import sys
 from pathlib import Path
 
-def clean_master_dataset(
-    infile="data/processed/master_dataset.csv",
-    outfile="data/processed/master_dataset_clean.csv"
-):
-    print(f"[info] Loading dataset from {infile}...")
-    df = pd.read_csv(infile, low_memory=False)
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from scripts.utils import storage
+from scripts.utils import topology
+from scripts.utils.instrument import instrumented
+
+TZ = "Europe/Zurich"
+
+# Fuels (ffill + bfill), the daily settlements as build_fuel_features names them
+FUEL_COLS = ["ttf_gas_eur", "eua_co2_eur"]
+# Weather (interpolate linearly)
+WEATHER_COLS = ["shortwave_radiation", "direct_radiation", "diffuse_radiation",
+                "wind_speed_80m", "wind_speed_120m", "cloud_cover",
+                "pv_proxy_wm2", "wind_proxy_unit"]
+# Calendar (drop rows if missing, should be rare)
+CALENDAR_COLS = ["hour", "dayofweek", "is_weekend", "month", "season", "is_holiday"]
+CAT_COLS = ["border", "direction", "zone"]
+# Lags: leave NaNs (normal for first days), but drop the first week
+WARMUP = pd.Timedelta(days=7)
+# Standard (winter) UTC offset of the zone: rows ahead of it are in DST
+STD_OFFSET = min(pd.Timestamp(f"2001-{m:02d}-01", tz=TZ).utcoffset() for m in (1, 7))
+
+# The dataset is cleaned one partition (UTC month) at a time, in time order, so memory is one month
+# however long the table. What crosses month boundaries is known before the first month is cleaned,
+# from a survey of the few columns involved (rows per month, first/last value of every filled
+# column, first complete calendar row), and carried along as the months are written:
+#   ffill    last value seen so far; before the first one, the first value of the table (bfill)
+#   interp   last value seen (position, value) and first value after the month, so a gap across
+#            a boundary is filled along the same line as over the whole table (positions are rows
+#            of the whole table, as interpolate() counts them)
+#   warm-up  the first complete calendar row of the table
+# The output is the same as cleaning the whole table in memory.
+
+def _ends(s, offset):
+    #(row of the table, value) of the first and last value of s, or None
+    known = np.flatnonzero(s.notna().to_numpy())
+    if not len(known):
+        return None, None
+    values = s.to_numpy()
+    return (offset + known[0], values[known[0]]), (offset + known[-1], values[known[-1]])
+
+def _survey(infile, fill_cols, calendar_cols):
+    """Per partition: (rows, first complete calendar time, {col: first (row, value)}, {col: last})"""
+    parts, offset = [], 0
+    for part in storage.iter_partitions(infile, columns=[*calendar_cols, *fill_cols]):
+        first, last = {}, {}
+        for col in fill_cols:
+            first[col], last[col] = _ends(part[col], offset)
+        complete = part["delivery_start_local"][part[calendar_cols].notna().all(axis=1)]
+        parts.append((len(part), complete.min() if len(complete) else None, first, last))
+        offset += len(part)
+    return parts
+
+def _is_dst(times):
+    #UTC offset of every row (wall clock - UTC) against the zone's standard offset, no per-row dst()
+    times = pd.DatetimeIndex(times)
+    offset = times.tz_localize(None) - times.tz_convert("UTC").tz_localize(None)
+    return (offset > STD_OFFSET).astype(int)
 
-    # Ensure delivery_start_local is datetime with timezone
-    df["delivery_start_local"] = pd.to_datetime(df["delivery_start_local"], errors="coerce", utc=True)
-    df["delivery_start_local"] = df["delivery_start_local"].dt.tz_convert("Europe/Zurich")
+def _interpolate(s, offset, before, after):
+    # Linear over table rows with the known values around the month as extra knots; np.interp holds
+    # the end values beyond the first/last knot, as interpolate(limit_direction="both")
+    x = s.to_numpy(dtype=float)
+    known = ~np.isnan(x)
+    rows = offset + np.arange(len(x))
+    knots = [k for k in [before] if k is not None] + list(zip(rows[known], x[known])) + \
+            [k for k in [after] if k is not None]
+    if not knots:
+        return s
+    kr, kv = (np.array(v) for v in zip(*knots))
+    x[~known] = np.interp(rows[~known], kr.astype(float), kv.astype(float))
+    return pd.Series(x, index=s.index, name=s.name)
 
+@instrumented
+def clean_master_dataset(
+    infile="data/processed/ch_master_dataset",
+    outfile="data/processed/ch_master_dataset_clean"
+):
+    fields = storage.schema(infile)
     # === 1) Drop duplicate or irrelevant columns ===
-    drop_cols = [c for c in df.columns if c.startswith("asof_local")]
+    drop_cols = [c for c in fields if c.startswith("asof_local")]
     if drop_cols:
         print(f"[info] Dropping duplicate cols: {drop_cols}")
-        df = df.drop(columns=drop_cols)
+    fuel_cols = [c for c in FUEL_COLS if c in fields]
+    weather_cols = [c for c in WEATHER_COLS if c in fields]
+    calendar_cols = [c for c in CALENDAR_COLS if c in fields]
+
+    print(f"[info] Surveying {infile}...")
+    parts = _survey(infile, fuel_cols + weather_cols, calendar_cols)
+    if not parts:
+        print("[fail] Empty dataset, aborting.")
+        return
+    starts = [t for _, t, _, _ in parts if t is not None]
+    cutoff = min(starts) + WARMUP if starts else None
 
-    # === 2) Fix DST indicator ===
-    print("[info] Recomputing is_dst...")
-    df["is_dst"] = df["delivery_start_local"].apply(lambda x: 1 if x.dst() != pd.Timedelta(0) else 0)
+    # first value after each partition, per column (scanning back from the end); what is left
+    # at the end is the first value of the whole table
+    after, head = [], {c: None for c in fuel_cols + weather_cols}
+    for _, _, first, _ in reversed(parts):
+        after.append(dict(head))
+        head.update({c: v for c, v in first.items() if v is not None})
+    after.reverse()
+    carry = {c: None for c in fuel_cols + weather_cols}
+
+    out_path = storage.dataset_path(outfile)
+    if out_path.exists():
+        shutil.rmtree(out_path)
+
+    print("[info] Cleaning month by month (is_dst, missing values, warm-up week)...")
+    offset, rows, n_cols = 0, 0, None
+    chunks = storage.iter_partitions(infile)
+    for (n, _, _, last), nxt, df in zip(parts, after, chunks):
+        df = df.drop(columns=drop_cols)
 
-    # === 3) Handle missing values ===
-    print("[info] Handling missing values...")
+        # === 2) Fix DST indicator ===
+        df["is_dst"] = _is_dst(df["delivery_start_local"])
 
-    # Fuels (ffill + bfill)
-    for col in ["ttf_gas_price", "ttf_gas_lag24", "ttf_gas_lag168",
-                "eua_co2_price", "eua_co2_lag24", "eua_co2_lag168"]:
-        if col in df.columns:
-            df[col] = df[col].ffill().bfill()
+        # === 3) Handle missing values ===
+        for col in fuel_cols:
+            if df[col].isna().any():
+                # ffill, then the first value of the table for rows before any (bfill)
+                fill = carry[col] if carry[col] is not None else head[col]
+                df[col] = df[col].ffill()
+                if fill is not None:
+                    df[col] = df[col].fillna(fill[1])
+        for col in weather_cols:
+            if df[col].isna().any():
+                df[col] = _interpolate(df[col], offset, carry[col], nxt[col])
+        for col in fuel_cols + weather_cols:
+            if last[col] is not None:
+                carry[col] = last[col]
+        offset += n
 
-    # Weather (interpolate linearly)
-    weather_cols = ["shortwave_radiation", "direct_radiation", "diffuse_radiation",
-                    "wind_speed_80m", "wind_speed_120m", "cloud_cover",
-                    "pv_proxy_wm2", "wind_proxy_unit"]
-    for col in weather_cols:
-        if col in df.columns:
-            df[col] = df[col].interpolate(limit_direction="both")
+        df = df.dropna(subset=calendar_cols)
+        if cutoff is not None:
+            df = df[df["delivery_start_local"] >= cutoff]
 
-    # Calendar (drop rows if missing, should be rare)
-    calendar_cols = ["hour", "dayofweek", "is_weekend", "month", "season", "is_holiday"]
-    df = df.dropna(subset=calendar_cols)
+        # === 4) Categorical encoding preparation ===
+        for col in CAT_COLS:
+            if col in df.columns:
+                df[col] = df[col].astype("category")
 
-    # Lags: leave NaNs (normal for first days), or drop first week if you prefer
-    min_time = df["delivery_start_local"].min()
-    df = df[df["delivery_start_local"] >= (min_time + pd.Timedelta(days=7))]
+        if df.empty:
+            continue
+        storage.write_table(df, out_path, mode="partitions", csv=False)
+        rows += len(df)
+        n_cols = df.shape[1]
 
-    # === 4) Categorical encoding preparation ===
-    cat_cols = ["border", "direction", "zone"]
-    for col in cat_cols:
-        if col in df.columns:
-            df[col] = df[col].astype("category")
+    #the CSV export is written once at the end, streaming the finished partitions in order
+    if storage.EXPORT_CSV:
+        for i, part in enumerate(storage.iter_partitions(out_path)):
+            part.to_csv(storage.csv_path(out_path), mode="w" if i == 0 else "a", header=i == 0, index=False)
 
-    # === Save cleaned dataset ===
-    out = Path(outfile)
-    out.parent.mkdir(parents=True, exist_ok=True)
-    df.to_csv(out, index=False)
-    print(f"[ok] Saved cleaned dataset -> {out} ({len(df)} rows, {df.shape[1]} cols)")
+    print(f"[ok] Saved cleaned dataset -> {out_path} ({rows} rows, {n_cols} cols)")
 
 
 if __name__ == "__main__":
-    clean_master_dataset()
+    for zone in topology.TARGET_ZONES:
+        z = topology.slug(zone)
+        clean_master_dataset(f"data/processed/{z}_master_dataset", f"data/processed/{z}_master_dataset_clean")
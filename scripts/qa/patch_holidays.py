@@ -1,36 +1,39 @@
-import pandas as pd
-import holidays
+import sys
 from pathlib import Path
 
-def patch_holidays(infile="data/processed/master_dataset_clean.csv",
-                   outfile="data/processed/master_dataset_patched.csv"):
-    #load dataset
-    df = pd.read_csv(infile, low_memory=False)
-    print(f"[info] loaded dataset: {df.shape}")
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from scripts.utils import storage
+from scripts.utils import topology
+from scripts.utils.instrument import instrumented
 
-    #force convert delivery_start_local to datetime
-    df["delivery_start_local"] = pd.to_datetime(df["delivery_start_local"], errors="coerce", utc=True)
-    df["delivery_start_local"] = df["delivery_start_local"].dt.tz_convert("Europe/Zurich")
+@instrumented
+def patch_holidays(infile="data/processed/ch_master_dataset_clean",
+                   outfile="data/processed/ch_master_dataset_patched", zone="CH"):
+    #load dataset (delivery_start_local already tz-aware)
+    df = storage.read_table(infile)
+    print(f"[info] loaded dataset: {df.shape}")
 
-    #create swiss holidays list for all years in dataset
+    #create the zone's national holidays for all years in dataset
     years = range(df["delivery_start_local"].dt.year.min(), df["delivery_start_local"].dt.year.max() + 1)
-    ch_holidays = holidays.Switzerland(years=years)
+    zone_holidays = topology.holiday_calendar(zone, years)
 
     #extract date only (drop time part)
     df["date_only"] = df["delivery_start_local"].dt.date
 
-    #check if the date is a swiss holiday
-    df["is_holiday"] = df["date_only"].isin(ch_holidays).astype(int)
+    #check if the date is a holiday
+    df["is_holiday"] = df["date_only"].isin(zone_holidays).astype(int)
 
     #drop helper column
     df = df.drop(columns=["date_only"])
 
     #save patched dataset
-    df.to_csv(outfile, index=False)
+    storage.write_table(df, outfile)
     print(f"[ok] patched holidays saved -> {outfile}")
 
     #quick sanity check: how many holidays
     print(df["is_holiday"].value_counts())
 
 if __name__ == "__main__":
-    patch_holidays()
+    for zone in topology.TARGET_ZONES:
+        z = topology.slug(zone)
+        patch_holidays(f"data/processed/{z}_master_dataset_clean", f"data/processed/{z}_master_dataset_patched", zone)
@@ -1,48 +1,52 @@
-import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
 import os
+import sys
+from pathlib import Path
 
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from scripts.utils import missingness
+from scripts.utils import stream_stats
+from scripts.utils import topology
+from scripts.utils.instrument import instrumented
+
+@instrumented
 def validate_master_agg(
-    infile="data/processed/master_dataset_agg.csv",
-    report_dir="reports/qa_agg"
+    infile="data/processed/ch_master_dataset_agg",
+    report_dir="reports/qa_agg/ch"
 ):
     #make reports dir
     os.makedirs(report_dir, exist_ok=True)
 
-    print(f"[info] loading aggregated dataset from {infile}...")
-    df = pd.read_csv(infile, parse_dates=["delivery_start_local"])
-    print(f"[info] shape: {df.shape}")
+    #one streaming pass over the monthly partitions
+    print(f"[info] scanning aggregated dataset {infile}...")
+    stats = stream_stats.scan(infile)
+    print(f"[info] shape: {(stats.rows, len(stats.columns) + 1)}")
 
     #basic info
     print("\n=== columns ===")
-    print(list(df.columns))
+    print(["delivery_start_local"] + stats.columns)
 
     print("\n=== top-20 missing ===")
-    print(df.isna().sum().sort_values(ascending=False).head(20))
+    print(stats.isna().sort_values(ascending=False).head(20))
+    stats.missing_by_month().to_csv(os.path.join(report_dir, "missing_by_month_agg.csv"))
 
-    #monotonic time & duplicates
-    is_mono = df["delivery_start_local"].is_monotonic_increasing
-    n_dups = df["delivery_start_local"].duplicated().sum()
-    print(f"\n[info] time monotonic: {is_mono}, duplicate timestamps: {n_dups}")
+    #monotonic time & duplicates (within and across partitions)
+    print(f"\n[info] time monotonic: {stats.monotonic}, duplicate timestamps: {stats.duplicates}")
 
     #numeric-only describe
-    desc = df.select_dtypes(include="number").describe().T
+    desc = stats.describe()
     desc.to_csv(os.path.join(report_dir, "describe_numeric.csv"))
     print(f"[ok] numeric describe saved -> {report_dir}/describe_numeric.csv")
 
-    #missing heatmap
-    plt.figure(figsize=(12, 6))
-    sns.heatmap(df.isna(), cbar=False)
-    plt.title("missing values heatmap (aggregated)")
-    plt.tight_layout()
-    plt.savefig(os.path.join(report_dir, "missing_heatmap_agg.png"))
-    plt.close()
+    #missing raster: share missing per time bucket and column
+    freq = missingness.bucket_for(len(stats.day_rows))
+    missingness.render(stats.missing_by(freq), os.path.join(report_dir, "missing_heatmap_agg.png"),
+                       f"missing values (aggregated, share per {missingness.FREQ_NAMES[freq]})")
     print(f"[ok] saved -> {report_dir}/missing_heatmap_agg.png")
 
     #correlation heatmap (numeric only)
-    num = df.select_dtypes(include="number")
-    corr = num.corr()
+    corr = stats.corr()
     corr.to_csv(os.path.join(report_dir, "correlation_matrix_agg.csv"))
     plt.figure(figsize=(12, 10))
     sns.heatmap(corr, cmap="coolwarm", center=0)
@@ -53,4 +57,6 @@ def validate_master_agg(
     print(f"[ok] saved -> {report_dir}/correlation_heatmap_agg.png")
 
 if __name__ == "__main__":
-    validate_master_agg()
+    for zone in topology.TARGET_ZONES:
+        z = topology.slug(zone)
+        validate_master_agg(f"data/processed/{z}_master_dataset_agg", f"reports/qa_agg/{z}")
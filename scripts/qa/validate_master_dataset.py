@@ -1,58 +1,63 @@
-import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
 import os
+import sys
+from pathlib import Path
 
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from scripts.utils import missingness
+from scripts.utils import stream_stats
+from scripts.utils import topology
+from scripts.utils.instrument import instrumented
+
+@instrumented
 def validate_master_dataset(
-    infile="data/processed/master_dataset.csv",
-    report_dir="reports/qa",
-    sample_frac=0.02
+    infile="data/processed/ch_master_dataset",
+    report_dir="reports/qa/ch"
 ):
     # make sure report directory exists
     os.makedirs(report_dir, exist_ok=True)
 
-    print(f"[info] loading dataset from {infile}...")
-    df = pd.read_csv(infile, parse_dates=["delivery_start_local"], low_memory=False)
-    print(f"[info] validating dataset: {df.shape}")
+    # one streaming pass over the monthly partitions: statistics of the full data
+    print(f"[info] scanning dataset {infile}...")
+    stats = stream_stats.scan(infile)
+    shape = (stats.rows, len(stats.columns) + 1)
+    print(f"[info] validating dataset: {shape}")
 
     # === basic info ===
     print("\n=== Basic Info ===")
-    print(f"Shape: {df.shape}")
-    print(f"Columns: {list(df.columns)}")
+    print(f"Shape: {shape}")
+    print(f"Columns: {['delivery_start_local'] + stats.columns}")
 
     # === missing values ===
     print("\n=== Missing Values (Top 20) ===")
-    print(df.isna().sum().sort_values(ascending=False).head(20))
+    print(stats.isna().sort_values(ascending=False).head(20))
+    by_month = stats.missing_by_month()
+    by_month.to_csv(os.path.join(report_dir, "missing_by_month.csv"))
+    print(f"[ok] missing values by month saved -> {report_dir}/missing_by_month.csv")
 
-    # === summary stats for numeric cols ===
+    # === summary stats for numeric cols (quantiles from a bounded sample, exact up to its size) ===
     print("\n=== Summary Stats (numeric) ===")
-    print(df.describe().transpose().head(15))
+    summary = stats.describe()
+    print(summary.head(15))
+    summary.to_csv(os.path.join(report_dir, "summary_stats.csv"))
 
-    # save numeric correlation matrix to csv
-    numeric_cols = df.select_dtypes(include=["number"])
-    corr_matrix = numeric_cols.corr()
+    # save numeric correlation matrix to csv (pairwise-complete, all rows)
+    corr_matrix = stats.corr()
     corr_out = os.path.join(report_dir, "correlation_matrix.csv")
     corr_matrix.to_csv(corr_out)
     print(f"[ok] correlation matrix saved -> {corr_out}")
 
-    # === plots (on sample for speed) ===
-    print(f"[info] sampling {sample_frac*100:.1f}% for visuals...")
-    sample = df.sample(frac=sample_frac, random_state=42)
-
-    # missing values heatmap
-    plt.figure(figsize=(12, 6))
-    sns.heatmap(sample.isna(), cbar=False)
-    plt.title("Missing Values Heatmap (sample)")
-    plt.tight_layout()
-    plt.savefig(os.path.join(report_dir, "missing_heatmap.png"))
-    plt.close()
+    # missing values raster: share missing per time bucket and column, all rows
+    freq = missingness.bucket_for(len(stats.day_rows))
+    missingness.render(stats.missing_by(freq), os.path.join(report_dir, "missing_heatmap.png"),
+                       f"Missing Values (share per {missingness.FREQ_NAMES[freq]})")
     print(f"[ok] saved missing values heatmap -> {report_dir}/missing_heatmap.png")
 
     # correlation heatmap (numeric only)
     plt.figure(figsize=(12, 10))
-    numeric_sample = sample.select_dtypes(include=["number"])  # only numeric columns
-    sns.heatmap(numeric_sample.corr(), cmap="coolwarm", center=0)
-    plt.title("Correlation Heatmap (numeric only, sample)")
+    sns.heatmap(corr_matrix, cmap="coolwarm", center=0)
+    plt.title("Correlation Heatmap (numeric only)")
     plt.tight_layout()
     plt.savefig(os.path.join(report_dir, "correlation_heatmap.png"))
     plt.close()
@@ -60,4 +65,6 @@ def validate_master_dataset(
 
 
 if __name__ == "__main__":
-    validate_master_dataset()
+    for zone in topology.TARGET_ZONES:
+        z = topology.slug(zone)
+        validate_master_dataset(f"data/processed/{z}_master_dataset", f"reports/qa/{z}")
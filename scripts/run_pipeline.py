@@ -0,0 +1,433 @@
+import argparse
+import fnmatch
+import hashlib
+import importlib
+import json
+import os
+import re
+import runpy
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+from scripts.utils import instrument
+from scripts.utils import storage
+from scripts.utils import topology
+
+TZ = "Europe/Zurich"
+
+LOG_DIR = Path("results/logs")
+STATE_FILE = LOG_DIR / "pipeline_state.json"
+
+#environment switches that change what a stage writes; part of every stage's hash
+PARAM_ENV = ["EXPORT_CSV", "FETCH_FULL", "FETCH_LOOKBACK_DAYS", "MTU"]
+
+#Every stage declares what it reads and writes (dataset paths without suffix, files, or globs).
+#A stage depends on every stage whose outputs match one of its inputs. "func" is called with
+#"params" after importing the script; without it the script runs as __main__ (fetchers).
+#Fetch stages read an external API, so they are never skipped and only run with --fetch.
+#STAGES hold the stages whose inputs are shared by every zone (read once); ZONE_STAGES are
+#templates instantiated per zone of the topology as "<stage>:<zone>" ({z}: ch, {Z}: CH).
+STAGES = {
+    # === fetch ===
+    "fetch_prices": {
+        "group": "fetch", "script": "scripts/fetch/fetch_prices_entsoe.py",
+        "inputs": [], "outputs": ["data/raw/*_day_ahead_prices"],
+    },
+    "fetch_load": {
+        "group": "fetch", "script": "scripts/fetch/fetch_load_forecasts.py",
+        "inputs": [], "outputs": ["data/raw/*_load_forecast"],
+    },
+    "fetch_flows": {
+        "group": "fetch", "script": "scripts/fetch/fetch_crossborder_flows.py",
+        "inputs": [], "outputs": ["data/raw/flow_*"],
+    },
+    "fetch_ntc": {
+        "group": "fetch", "script": "scripts/fetch/fetch_crossborder_ntc.py",
+        "inputs": [], "outputs": ["data/raw/ntc_*"],
+    },
+    #the two below fetch the target zones (TARGET_ZONES, set from --zones)
+    "fetch_hydro": {
+        "group": "fetch", "script": "scripts/fetch/ch_hydro_entsoe.py",
+        "inputs": [], "outputs": ["data/raw/*_hydro_generation_entsoe"],
+    },
+    "fetch_outages": {
+        "group": "fetch", "script": "scripts/fetch/fetch_outages_ch.py",
+        "inputs": [], "outputs": ["data/raw/*_outages"],
+    },
+    "fetch_reservoir": {
+        "group": "fetch", "script": "scripts/fetch/fetch_ch_reservoir_levels.py",
+        "inputs": [], "outputs": ["data/raw/ch_reservoir_levels_weekly.csv"],
+    },
+    "fetch_weather": {
+        "group": "fetch", "script": "scripts/fetch/fetch_weather.py", "func": "main",
+        "inputs": ["data/external/weather_grid.csv"], "outputs": ["data/raw/*_weather_openmeteo"],
+    },
+    # === features (independent of each other unless an input says otherwise) ===
+    "price": {
+        "group": "features", "script": "scripts/features/build_price_features.py",
+        "func": "build_price_features",
+        "inputs": ["data/raw/*_day_ahead_prices"], "outputs": ["data/processed/day_ahead_prices"],
+    },
+    "res": {
+        "group": "features", "script": "scripts/features/build_res_features.py", "func": "main",
+        "inputs": ["data/raw/*_weather_openmeteo"],
+        "outputs": [f"data/processed/{topology.slug(z)}_res_features_exante" for z in topology.ZONES],
+    },
+    "fuels": {
+        "group": "features", "script": "scripts/features/build_fuel_features.py",
+        "func": "build_fuel_features",
+        "inputs": ["data/raw/gas_bloomberg.csv", "data/raw/carbon_bloomberg.csv"],
+        "outputs": ["data/processed/fuels_features"],
+    },
+    "borders": {
+        "group": "features", "script": "scripts/features/build_border_features.py",
+        "func": "build_border_features",
+        "inputs": ["data/raw/flow_*", "data/raw/ntc_*"],
+        "outputs": ["data/processed/flow_features_all", "data/processed/ntc_features_all",
+                    "data/processed/congestion_features_all"],
+    },
+}
+
+ZONE_STAGES = {
+    "calendar": {
+        "group": "features", "script": "scripts/features/build_calendar_features.py",
+        "func": "build_calendar_features", "params": {"zone": "{Z}"},
+        "inputs": [], "outputs": ["data/processed/{z}_calendar_features"],
+    },
+    "price_only": {
+        "group": "features", "script": "scripts/features/build_price_only_features.py",
+        "func": "build_price_only_features", "params": {"zone": "{Z}"},
+        "inputs": ["data/raw/{z}_day_ahead_prices"], "outputs": ["data/processed/{z}_price_only_features"],
+    },
+    "hydro": {
+        "group": "features", "script": "scripts/features/build_hydro_features.py",
+        "func": "build_hydro_features", "params": {"zone": "{Z}"},
+        "inputs": ["data/raw/{z}_hydro_generation_entsoe"], "outputs": ["data/processed/{z}_hydro_features"],
+    },
+    "load": {
+        "group": "features", "script": "scripts/features/build_load_features.py",
+        "func": "build_load_features", "params": {"zone": "{Z}"},
+        "inputs": ["data/raw/{z}_load_forecast"], "outputs": ["data/processed/{z}_load_features_exante"],
+    },
+    "reservoir": {
+        "group": "features", "script": "scripts/features/build_reservoir_features.py",
+        "func": "build_reservoir_features", "params": {"zone": "{Z}"},
+        "inputs": ["data/raw/{z}_reservoir_levels_weekly.csv"], "outputs": ["data/processed/{z}_reservoir_features"],
+    },
+    "outages": {
+        "group": "features", "script": "scripts/features/build_outage_features.py",
+        "func": "build_outage_features", "params": {"zone": "{Z}"},
+        "inputs": ["data/raw/{z}_outages"],
+        "outputs": ["data/processed/{z}_outage_features", "data/processed/{z}_outage_latest_diagnostics"],
+    },
+    "master": {
+        "group": "features", "script": "scripts/features/build_master_dataset.py",
+        "func": "build_master_dataset", "params": {"zone": "{Z}"},
+        "inputs": [
+            "data/processed/{z}_calendar_features", "data/processed/{z}_price_only_features",
+            "data/processed/{z}_res_features_exante", "data/processed/{z}_hydro_features",
+            "data/processed/{z}_load_features_exante", "data/processed/fuels_features",
+            "data/processed/{z}_outage_features", "data/processed/{z}_reservoir_features",
+            "data/processed/flow_features_all",
+            "data/processed/ntc_features_all", "data/processed/congestion_features_all",
+        ],
+        "outputs": ["data/processed/{z}_master_dataset"],
+    },
+    "store": {
+        "group": "features", "script": "scripts/features/build_feature_store.py",
+        "func": "build_feature_store", "params": {"zone": "{Z}"},
+        "inputs": [
+            "data/processed/{z}_calendar_features", "data/processed/{z}_price_only_features",
+            "data/processed/{z}_res_features_exante", "data/processed/{z}_hydro_features",
+            "data/processed/{z}_load_features_exante", "data/processed/fuels_features",
+            "data/processed/{z}_outage_features", "data/processed/{z}_reservoir_features",
+            "data/processed/flow_features_all",
+            "data/processed/ntc_features_all", "data/processed/congestion_features_all",
+        ],
+        "outputs": ["data/store/{z}"],
+    },
+    # === qa ===
+    "clean": {
+        "group": "qa", "script": "scripts/qa/clean_master_dataset.py", "func": "clean_master_dataset",
+        "params": {"infile": "data/processed/{z}_master_dataset", "outfile": "data/processed/{z}_master_dataset_clean"},
+        "inputs": ["data/processed/{z}_master_dataset"], "outputs": ["data/processed/{z}_master_dataset_clean"],
+    },
+    "patch_holidays": {
+        "group": "qa", "script": "scripts/qa/patch_holidays.py", "func": "patch_holidays",
+        "params": {"infile": "data/processed/{z}_master_dataset_clean",
+                   "outfile": "data/processed/{z}_master_dataset_patched", "zone": "{Z}"},
+        "inputs": ["data/processed/{z}_master_dataset_clean"], "outputs": ["data/processed/{z}_master_dataset_patched"],
+    },
+    "aggregate": {
+        "group": "qa", "script": "scripts/qa/aggregate_master_dataset.py", "func": "aggregate_master_dataset",
+        "params": {"infile": "data/processed/{z}_master_dataset",
+                   "outfile": "data/processed/{z}_master_dataset_agg", "zone": "{Z}"},
+        "inputs": ["data/processed/{z}_master_dataset"], "outputs": ["data/processed/{z}_master_dataset_agg"],
+    },
+    "validate": {
+        "group": "qa", "script": "scripts/qa/validate_master_dataset.py", "func": "validate_master_dataset",
+        "params": {"infile": "data/processed/{z}_master_dataset", "report_dir": "reports/qa/{z}"},
+        "inputs": ["data/processed/{z}_master_dataset"], "outputs": ["reports/qa/{z}"],
+    },
+    "validate_agg": {
+        "group": "qa", "script": "scripts/qa/validate_master_agg.py", "func": "validate_master_agg",
+        "params": {"infile": "data/processed/{z}_master_dataset_agg", "report_dir": "reports/qa_agg/{z}"},
+        "inputs": ["data/processed/{z}_master_dataset_agg"], "outputs": ["reports/qa_agg/{z}"],
+    },
+}
+
+def _for_zone(template, zone):
+    z, Z = topology.slug(zone), topology.check(zone)
+    fill = lambda v: v.format(z=z, Z=Z) if isinstance(v, str) else v
+    return {
+        **template,
+        "zone": Z,
+        "inputs": [fill(p) for p in template["inputs"]],
+        "outputs": [fill(p) for p in template["outputs"]],
+        "params": {k: fill(v) for k, v in template.get("params", {}).items()},
+    }
+
+STAGES.update({
+    f"{name}:{topology.slug(zone)}": _for_zone(template, zone)
+    for zone in topology.ZONES for name, template in ZONE_STAGES.items()
+})
+
+def resolve(names, zones):
+    """Stage names for the CLI/API: a per-zone stage without ":<zone>" means that stage for every zone in zones"""
+    out = []
+    for name in names:
+        if name in ZONE_STAGES:
+            out += [f"{name}:{topology.slug(z)}" for z in zones]
+        elif name in STAGES:
+            out.append(name)
+        else:
+            raise KeyError(name)
+    return out
+
+# === hashing ===
+
+def _hash_file(h, path):
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+
+def _expand(pattern):
+    #a dataset is its directory (or legacy CSV); globs may match either form
+    if any(ch in pattern for ch in "*?["):
+        matches = list(Path(".").glob(pattern)) + list(Path(".").glob(pattern + ".csv"))
+        return sorted({storage.dataset_path(p) for p in matches})
+    return [Path(pattern)]
+
+def hash_inputs(patterns):
+    """Content hash of every file behind the declared inputs (missing inputs hash as missing)"""
+    h = hashlib.sha256()
+    for pattern in patterns:
+        for path in _expand(pattern):
+            root = storage.dataset_path(path)
+            if path.is_file():
+                files = [path]
+            elif root.is_dir():
+                files = sorted(f for f in root.rglob("*") if f.is_file())
+            elif storage.csv_path(path).exists():
+                files = [storage.csv_path(path)]
+            else:
+                h.update(f"missing:{path}".encode())
+                continue
+            for f in files:
+                h.update(str(f).encode())
+                _hash_file(h, f)
+    return h.hexdigest()
+
+_UTILS_IMPORT = re.compile(r"from scripts\.utils(?:\.(\w+))? import ([\w, ]+)")
+
+def code_files(script):
+    """The stage script plus every scripts/utils module it imports, transitively"""
+    files, todo = [], [ROOT / script]
+    while todo:
+        path = todo.pop()
+        if path in files or not path.exists():
+            continue
+        files.append(path)
+        for module, names in _UTILS_IMPORT.findall(path.read_text()):
+            for name in [module] if module else [n.strip() for n in names.split(",")]:
+                todo.append(ROOT / "scripts" / "utils" / f"{name}.py")
+    return sorted(files)
+
+def stage_key(stage):
+    """Hash of a stage's inputs, code and parameters; unchanged key + existing outputs = skip"""
+    h = hashlib.sha256()
+    h.update(hash_inputs(stage["inputs"]).encode())
+    for f in code_files(stage["script"]):
+        h.update(str(f.relative_to(ROOT)).encode())
+        _hash_file(h, f)
+    params = {"func": stage.get("func"), "params": stage.get("params", {}),
+              "env": {k: os.getenv(k) for k in PARAM_ENV}}
+    h.update(json.dumps(params, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+def _inputs_missing(stage):
+    #a builder whose sources were never fetched has nothing to do (e.g. no Bloomberg fuel exports)
+    paths = [p for pattern in stage["inputs"] for p in _expand(pattern)]
+    return bool(stage["inputs"]) and not any(storage.exists(p) or p.exists() for p in paths)
+
+def _outputs_exist(stage):
+    for pattern in stage["outputs"]:
+        paths = _expand(pattern)
+        if not paths or not all(storage.exists(p) or p.exists() for p in paths):
+            return False
+    return True
+
+# === scheduling ===
+
+def dependencies(stages):
+    """{stage: set of selected stages whose outputs it reads}"""
+    deps = {}
+    for name, stage in stages.items():
+        deps[name] = {
+            other for other, up in stages.items() if other != name and any(
+                fnmatch.fnmatch(out, pattern) or fnmatch.fnmatch(pattern, out)
+                for out in up["outputs"] for pattern in stage["inputs"]
+            )
+        }
+    return deps
+
+def _execute(name, stage):
+    #runs in a pool worker; data paths stay relative to the runner's cwd (the project root)
+    t0 = time.perf_counter()
+    if "func" in stage:
+        #imported as scripts.<group>.<name> so its functions can be pickled for nested pools
+        module = importlib.import_module(stage["script"].removesuffix(".py").replace("/", "."))
+        getattr(module, stage["func"])(**stage.get("params", {}))
+    else:
+        #module-level fetch scripts have no entry function to decorate; record them here
+        with instrument.stage(name):
+            runpy.run_path(str(ROOT / stage["script"]), run_name="__main__")
+    return time.perf_counter() - t0
+
+def _load_state():
+    return json.loads(STATE_FILE.read_text()) if STATE_FILE.exists() else {}
+
+def _save_state(state):
+    STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = STATE_FILE.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state, indent=2, sort_keys=True))
+    tmp.replace(STATE_FILE)
+
+def run_pipeline(names=None, groups=("features", "qa"), force=False, workers=None, params=None, zones=None):
+    """
+    Run the selected stages in dependency order; independent stages (and zones) run concurrently.
+    names: explicit stage names (default: every stage in groups). force=True ignores the hashes.
+    zones: target zones (default topology.TARGET_ZONES); shared stages run once for all of them.
+    params: {stage: kwargs} merged over the declared params (e.g. the calendar's date range);
+    a per-zone stage takes both params["calendar"] and params["calendar:ch"].
+    Returns the run manifest, which is also written to results/logs/run_<timestamp>.json.
+    """
+    params = params or {}
+    zones = [topology.check(z) for z in (zones or topology.TARGET_ZONES)]
+    #the per-zone fetchers read their targets from here (forked workers inherit both)
+    topology.TARGET_ZONES = zones
+    os.environ["TARGET_ZONES"] = ",".join(zones)
+
+    names = resolve(names, zones) if names else [
+        n for n, s in STAGES.items() if s["group"] in groups and s.get("zone", zones[0]) in zones
+    ]
+    selected = {
+        n: {**STAGES[n], "params": {**STAGES[n].get("params", {}), **params.get(n.split(":")[0], {}), **params.get(n, {})}}
+        for n in names
+    }
+    deps = dependencies(selected)
+    state = _load_state()
+
+    started = pd.Timestamp.now(tz=TZ)
+    t0 = time.perf_counter()
+    results = {}
+    pending, running = set(selected), {}
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while pending or running:
+            for name in sorted(pending):
+                if not deps[name] <= set(results):
+                    continue
+                pending.discard(name)
+                stage = selected[name]
+
+                if any(results[d]["status"] in ("failed", "blocked") for d in deps[name]):
+                    results[name] = {"status": "blocked", "seconds": 0.0}
+                    print(f"[skip] {name}: upstream stage failed")
+                    continue
+
+                if _inputs_missing(stage):
+                    results[name] = {"status": "no_input", "seconds": 0.0}
+                    print(f"[skip] {name}: none of {stage['inputs']} exist")
+                    continue
+
+                key = stage_key(stage)
+                fresh = stage["group"] == "fetch" or force
+                if not fresh and state.get(name) == key and _outputs_exist(stage):
+                    results[name] = {"status": "skipped", "seconds": 0.0, "key": key}
+                    print(f"[skip] {name}: inputs, code and params unchanged")
+                    continue
+
+                print(f"[info] {name}: started")
+                running[pool.submit(instrument.run_collected, _execute, name, stage)] = (name, key)
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, key = running.pop(future)
+                try:
+                    seconds, counts = future.result()
+                except Exception as e:
+                    results[name] = {"status": "failed", "seconds": None, "error": repr(e)}
+                    print(f"[fail] {name}: {e}")
+                    continue
+                #a stage around the run (e.g. a benchmark) sees the workers' I/O
+                instrument.merge(counts)
+                #builders report their own errors and return; no outputs means the stage failed
+                if not _outputs_exist(selected[name]):
+                    results[name] = {"status": "failed", "seconds": round(seconds, 3), "error": "outputs missing"}
+                    print(f"[fail] {name}: finished without writing {selected[name]['outputs']}")
+                    continue
+                results[name] = {"status": "ran", "seconds": round(seconds, 3), "key": key}
+                state[name] = key
+                _save_state(state)
+                print(f"[ok] {name}: {seconds:.1f}s")
+
+    manifest = {
+        "started": started.isoformat(),
+        "seconds": round(time.perf_counter() - t0, 3),
+        "workers": workers or os.cpu_count(),
+        "zones": zones,
+        "stages": {n: {"group": selected[n]["group"], "deps": sorted(deps[n]), **results[n]} for n in selected},
+    }
+    LOG_DIR.mkdir(parents=True, exist_ok=True)
+    out = LOG_DIR / f"run_{started.strftime('%Y%m%d_%H%M%S')}.json"
+    out.write_text(json.dumps(manifest, indent=2))
+
+    counts = pd.Series([r["status"] for r in results.values()]).value_counts().to_dict()
+    print(f"[ok] Run manifest -> {out} ({manifest['seconds']:.1f}s, {counts})")
+    return manifest
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the data pipeline, skipping stages whose inputs, code and params are unchanged")
+    parser.add_argument("stages", nargs="*", help=f"stage names (default: all features + qa stages); one of "
+                        f"{', '.join(n for n in STAGES if ':' not in n)}, or per zone {', '.join(ZONE_STAGES)}[:<zone>]")
+    parser.add_argument("--fetch", action="store_true", help="also run the fetch stages")
+    parser.add_argument("--force", action="store_true", help="rerun stages even if their hash is unchanged")
+    parser.add_argument("--workers", type=int, default=None, help="process pool size (default: CPU count)")
+    parser.add_argument("--zones", nargs="+", default=None,
+                        help=f"target zones (default: TARGET_ZONES or CH); any of {', '.join(topology.ZONES)}")
+    args = parser.parse_args()
+
+    unknown = [n for n in args.stages if n not in STAGES and n not in ZONE_STAGES]
+    if unknown:
+        parser.error(f"unknown stages: {unknown}")
+    groups = ("fetch", "features", "qa") if args.fetch else ("features", "qa")
+    run_pipeline(args.stages or None, groups=groups, force=args.force, workers=args.workers, zones=args.zones)
@@ -0,0 +1,147 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+#Local stand-in for the ENTSO-E Transparency API, used to run the fetch engine offline.
+#Canned documents are looked up as <canned_dir>/<documentType>_<domain>.xml, then
+#<canned_dir>/<documentType>.xml; if neither exists an hourly series is synthesised
+#for the requested period (prices, flows, NTC, load and generation all parse it).
+#Fetch scripts can be pointed at a running stub with ENTSOE_ENDPOINT_URL=<stub.url>.
+
+DOC = """<?xml version="1.0" encoding="UTF-8"?>
+<Publication_MarketDocument xmlns="urn:iec62325.351:tc57wg16:451-3:publicationdocument:7:0">
+  <mRID>stub</mRID>
+  <type>{doc_type}</type>
+  <period.timeInterval><start>{start}</start><end>{end}</end></period.timeInterval>
+  <TimeSeries>
+    <mRID>1</mRID>
+    <businessType>A62</businessType>
+    <curveType>A01</curveType>
+    {psr}
+    <Period>
+      <timeInterval><start>{start}</start><end>{end}</end></timeInterval>
+      <resolution>PT60M</resolution>
+{points}
+    </Period>
+  </TimeSeries>
+</Publication_MarketDocument>
+"""
+
+NO_DATA = """<?xml version="1.0" encoding="UTF-8"?>
+<Acknowledgement_MarketDocument xmlns="urn:iec62325.351:tc57wg16:451-1:acknowledgementdocument:7:0">
+  <mRID>stub</mRID>
+  <Reason><code>999</code><text>No matching data found</text></Reason>
+</Acknowledgement_MarketDocument>
+"""
+
+
+def _period(params):
+    fmt = "%Y%m%d%H%M"
+    start = pd.to_datetime(params["periodStart"], format=fmt, utc=True)
+    end = pd.to_datetime(params["periodEnd"], format=fmt, utc=True)
+    return start, end
+
+
+def synth_document(params, seed=0):
+    """Hourly series over [periodStart, periodEnd); values are a deterministic function of time"""
+    start, end = _period(params)
+    hours = pd.date_range(start, end, freq="h", inclusive="left")
+    #everything fits in the first page, so paginated queries stop at offset 100
+    if len(hours) == 0 or int(params.get("offset", 0)) > 0:
+        return NO_DATA
+
+    #value depends only on the timestamp, so overlapping windows return identical rows
+    h = (hours.asi8 // 3_600_000_000_000).astype(np.int64)
+    values = 50 + 10 * np.sin(2 * np.pi * (h % 24) / 24) + (h + seed) % 7
+    points = "\n".join(
+        f"      <Point><position>{i+1}</position><price.amount>{v:.2f}</price.amount>"
+        f"<quantity>{v:.2f}</quantity></Point>"
+        for i, v in enumerate(values)
+    )
+    psr = params.get("psrType")
+    psr = f"<MktPSRType><psrType>{psr}</psrType></MktPSRType>" if psr else ""
+    fmt = "%Y-%m-%dT%H:%MZ"
+    return DOC.format(doc_type=params.get("documentType", "A44"), start=start.strftime(fmt),
+                      end=end.strftime(fmt), psr=psr, points=points)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        params = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+        self.server.requests.append(params)
+
+        #failure injection: the first n requests answer 503
+        if self.server.fail_first > 0:
+            self.server.fail_first -= 1
+            self.send_response(503)
+            self.end_headers()
+            return
+
+        body = self._canned(params) or synth_document(params)
+        payload = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/xml")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _canned(self, params):
+        if self.server.canned_dir is None:
+            return None
+        doc = params.get("documentType", "")
+        domain = params.get("in_Domain") or params.get("outBiddingZone_Domain") or ""
+        for name in (f"{doc}_{domain}.xml", f"{doc}.xml"):
+            path = self.server.canned_dir / name
+            if path.exists():
+                return path.read_text()
+        return None
+
+    def log_message(self, *args):
+        pass
+
+
+class EntsoeStub:
+    """Context manager running the stub on a free local port; .url is the API endpoint"""
+
+    def __init__(self, canned_dir=None, fail_first=0):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.server.canned_dir = Path(canned_dir) if canned_dir else None
+        self.server.fail_first = fail_first
+        self.server.requests = []
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/api"
+
+    @property
+    def requests(self):
+        return self.server.requests
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    #offline smoke run of the fetch engine against the stub
+    import sys
+    sys.path.append(str(Path(__file__).resolve().parents[2]))
+    from scripts.utils.fetch_engine import fetch_many, make_client
+
+    with EntsoeStub(fail_first=2) as stub:
+        client = make_client(endpoint=stub.url)
+        start = pd.Timestamp("2024-01-01", tz="Europe/Zurich")
+        end = pd.Timestamp("2024-06-01", tz="Europe/Zurich")
+        frames, failed = fetch_many(
+            {"CH": lambda s, e: client.query_day_ahead_prices("CH", start=s, end=e)},
+            start, end, backoff=0.1
+        )
+        df = frames["CH"]
+        expected = len(pd.date_range(start, end, freq="h", inclusive="left"))
+        print(f"[ok] {len(stub.requests)} requests, {len(df)} rows (expected {expected}), "
+              f"duplicates: {df.index.duplicated().sum()}, failed windows: {sum(map(len, failed.values()))}")
@@ -1,6 +1,10 @@
 import pandas as pd
+import sys
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from scripts.utils import storage
+
 # Load Excel file
 xls = pd.ExcelFile("data/raw/Commodities_2025-05-19.xlsx")  # adjust path if needed
 
@@ -20,7 +24,7 @@ gas = gas[["date", "price"]].dropna()
 outdir = Path("data/raw/fuels")
 outdir.mkdir(parents=True, exist_ok=True)
 
-carbon.to_csv(outdir / "eua_co2_daily.csv", index=False)
-gas.to_csv(outdir / "ttf_gas_daily.csv", index=False)
+storage.write_table(carbon, outdir / "eua_co2_daily", time_col="date")
+storage.write_table(gas, outdir / "ttf_gas_daily", time_col="date")
 
-print("[ok] Saved:", list(outdir.glob("*.csv")))
+print("[ok] Saved:", [p for p in outdir.iterdir() if p.is_dir()])
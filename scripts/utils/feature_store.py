@@ -0,0 +1,290 @@
+import json
+import os
+import re
+import shutil
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from scripts.utils import time_axis
+from scripts.utils import topology
+
+TZ = "Europe/Zurich"
+
+#Point-in-time feature store. Every value is kept with its delivery time and the time it became
+#available (available_at), so a query "as known at T" only ever sees values with available_at <= T.
+#A source (one processed table) is stored under <root>/<zone>/<source>/ as memory-mapped arrays
+#sorted by delivery time:
+#   delivery.npy   int64 UTC ns per row          local_day.npy  int64 local midnight (wall ns) per row
+#   values.npy     float64 [rows, columns]       available.npy  int64 UTC ns [rows, groups]
+#   meta.json      columns, the availability group of each column, the rule behind each group
+#Columns whose availability is the same function of delivery time share one group. A delivery
+#time can hold several versions (e.g. a forecast rebuilt after a revision), ordered by
+#availability; a query takes the latest version known at its as-of time, per value.
+#local_day is the index: the rows of a delivery day are one searchsorted away, so a snapshot
+#touches a day's rows only, whatever the length of the history.
+ALWAYS = np.iinfo(np.int64).min
+NEVER = np.iinfo(np.int64).max
+#day-ahead results are out about an hour after gate closure; realised data (flows, generation,
+#outages ex post) about an hour after the end of the MTU
+RESULTS_DELAY = pd.Timedelta("1h")
+PUBLICATION_DELAY = pd.Timedelta("1h")
+
+
+# === availability rules: (delivery times, table, zone) -> available_at as int64 UTC ns ===
+
+def _rule(fn, spec):
+    #spec is what meta.json records for the column, e.g. "gate(24h)"
+    fn.spec = spec
+    return fn
+
+
+def _wall(times, day_offset, hour):
+    #local day of each time + day_offset days, at `hour` on the wall clock
+    days = pd.DatetimeIndex(times).tz_convert(TZ).tz_localize(None).normalize()
+    wall = days + pd.Timedelta(days=day_offset) + pd.to_timedelta(hour, unit="h")
+    return wall.tz_localize(TZ, ambiguous=True, nonexistent="shift_forward").asi8
+
+
+def known():
+    """Known in advance: a function of the delivery time alone (calendar)"""
+    return _rule(lambda times, df, zone: np.full(len(times), ALWAYS), "known")
+
+
+def column(name="asof_local"):
+    """As-of stamps written by the builder (load/RES forecasts at gate closure, outage snapshots)"""
+    def rule(times, df, zone):
+        ns = pd.DatetimeIndex(pd.to_datetime(df[name], utc=True)).asi8.copy()
+        ns[ns == ALWAYS] = NEVER
+        return ns
+    return _rule(rule, f"column({name})")
+
+
+def day_ahead(lag="0h"):
+    """Day-ahead auction result for delivery t - lag: D-1, shortly after the zone's gate closure"""
+    def rule(times, df, zone):
+        hour = topology.gate_closure_hour(zone) + RESULTS_DELAY / pd.Timedelta("1h")
+        return _wall(times - pd.Timedelta(lag), -1, hour)
+    return _rule(rule, f"day_ahead({lag})")
+
+
+def gate(lag="0h"):
+    """Known at the zone's gate closure for delivery t - lag (ex-ante inputs without their own stamps)"""
+    def rule(times, df, zone):
+        return time_axis.gate_closure(times - pd.Timedelta(lag), topology.gate_closure_hour(zone)).asi8
+    return _rule(rule, f"gate({lag})")
+
+
+def measured(lag="0h", delay=PUBLICATION_DELAY):
+    """Realised value for delivery t - lag, published `delay` after the end of its MTU"""
+    def rule(times, df, zone):
+        return (times - pd.Timedelta(lag) + time_axis.MTU + pd.Timedelta(delay)).asi8
+    return _rule(rule, f"measured({lag}, {delay})")
+
+
+def rules_for(columns, spec):
+    """
+    Rule per column from spec = [(pattern, rule factory), ...]; the first full match wins.
+    A pattern group captures a lag in hours that is passed on, e.g. (r".*_lag(\\d+)", gate).
+    """
+    out = {}
+    for col in columns:
+        for pattern, factory in spec:
+            m = re.fullmatch(pattern, col)
+            if m:
+                out[col] = factory(f"{m.group(1)}h") if m.groups() else factory()
+                break
+        else:
+            raise ValueError(f"no availability rule for column {col!r}")
+    return out
+
+
+# === the store ===
+
+@lru_cache(maxsize=64)
+def _open(path, stamp):
+    #memory-mapped arrays of one source; stamp (meta.json mtime) invalidates the cache on rewrite
+    path = Path(path)
+    meta = json.loads((path / "meta.json").read_text())
+    arrays = {k: np.load(path / f"{k}.npy", mmap_mode="r") for k in ["delivery", "local_day", "values", "available"]}
+    return {**arrays, "columns": meta["columns"], "groups": np.asarray(meta["groups"], dtype=np.int64)}
+
+
+def _latest(delivery, values, known):
+    #rows sorted by delivery (versions by availability) -> per delivery time and column, the
+    #value of the last row known, NaN if none is
+    n = len(delivery)
+    if n == 0:
+        return delivery[:0], values[:0]
+    starts = np.flatnonzero(np.r_[True, delivery[1:] != delivery[:-1]])
+    idx = np.where(known, np.arange(n)[:, None], -1)
+    last = np.maximum.reduceat(idx, starts, axis=0)
+    out = np.take_along_axis(values, np.maximum(last, 0), axis=0)
+    out[last < 0] = np.nan
+    return delivery[starts], out
+
+
+def _days(days):
+    #local delivery days as naive midnights
+    days = pd.DatetimeIndex(pd.to_datetime(pd.Index(np.atleast_1d(days))))
+    if days.tz is not None:
+        days = days.tz_convert(TZ).tz_localize(None)
+    return days.normalize()
+
+
+class FeatureStore:
+    """Point-in-time features of one zone, stored under root/<zone>"""
+
+    def __init__(self, root="data/store", zone="CH"):
+        self.zone = topology.check(zone)
+        self.root = Path(root) / topology.slug(zone)
+
+    def sources(self):
+        if not self.root.is_dir():
+            return []
+        return sorted(p.name for p in self.root.iterdir() if (p / "meta.json").exists())
+
+    def _source(self, name):
+        path = self.root / name
+        return _open(str(path), (path / "meta.json").stat().st_mtime_ns)
+
+    def write(self, source, df, rules, time_col="delivery_start_local", replace=False):
+        """
+        Store the numeric columns of df (one row per delivery time) with their availability.
+        rules: {column: rule}, see rules_for. Rows already stored with the same delivery and
+        availability are replaced (a rebuild), other versions are kept unless replace=True.
+        """
+        times = pd.DatetimeIndex(pd.to_datetime(df[time_col], utc=True))
+        cols = [c for c in df.columns
+                if c != time_col and not c.startswith("asof_local")
+                and (pd.api.types.is_numeric_dtype(df[c]) or pd.api.types.is_bool_dtype(df[c]))]
+
+        #one availability group per distinct array
+        groups, available = [], []
+        for c in cols:
+            a = np.asarray(rules[c](times, df, self.zone), dtype=np.int64)
+            g = next((i for i, b in enumerate(available) if np.array_equal(a, b)), None)
+            if g is None:
+                g = len(available)
+                available.append(a)
+            groups.append(g)
+
+        new = {
+            "delivery": times.asi8,
+            "values": df[cols].to_numpy(dtype=float, na_value=np.nan),
+            "available": np.column_stack(available) if available else np.zeros((len(df), 0), dtype=np.int64),
+        }
+        meta = {"columns": cols, "groups": groups, "zone": self.zone, "mtu": str(time_axis.MTU),
+                "rules": {c: getattr(rules[c], "spec", "") for c in cols}}
+
+        path = self.root / source
+        if not replace and (path / "meta.json").exists():
+            old = self._source(source)
+            if old["columns"] == cols and list(old["groups"]) == groups:
+                new = self._merge(old, new)
+            else:
+                print(f"[info] {source}: columns or availability changed, replacing the stored versions")
+
+        order = np.lexsort([*new["available"].T[::-1], new["delivery"]])
+        new = {k: v[order] for k, v in new.items()}
+        new["local_day"] = pd.DatetimeIndex(pd.to_datetime(new["delivery"], utc=True)).tz_convert(TZ) \
+            .tz_localize(None).normalize().asi8
+        self._save(path, new, meta)
+        return path
+
+    @staticmethod
+    def _merge(old, new):
+        #keep stored versions that the new rows do not restate
+        key = lambda d: pd.MultiIndex.from_arrays([d["delivery"], *np.asarray(d["available"]).T])
+        keep = ~key(old).isin(key(new))
+        return {k: np.concatenate([np.asarray(old[k])[keep], new[k]]) for k in new}
+
+    @staticmethod
+    def _save(path, arrays, meta):
+        #write next to the old version, then swap, so readers never see half a source
+        tmp = path.with_name(path.name + ".tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        for k, v in arrays.items():
+            np.save(tmp / f"{k}.npy", np.ascontiguousarray(v))
+        (tmp / "meta.json").write_text(json.dumps(meta, indent=1))
+        old = path.with_name(path.name + ".old")
+        if path.exists():
+            os.replace(path, old)
+        os.replace(tmp, path)
+        shutil.rmtree(old, ignore_errors=True)
+
+    def _asof(self, days, asof):
+        #as-of time per local day: None = the zone's gate closure for that delivery day, a
+        #Timedelta/str = offset from the day's local midnight on the wall clock ("-13h" = D-1 11:00),
+        #otherwise timestamps (one, or one per day)
+        if asof is None:
+            return time_axis.gate_closure(days.tz_localize(TZ), topology.gate_closure_hour(self.zone)).asi8
+        if isinstance(asof, (str, pd.Timedelta)):
+            try:
+                offset = pd.Timedelta(asof)
+            except ValueError:
+                offset = None
+            if offset is not None:
+                return (days + offset).tz_localize(TZ, ambiguous=True, nonexistent="shift_forward").asi8
+        ts = pd.DatetimeIndex(pd.to_datetime(pd.Index(np.atleast_1d(asof))))
+        ts = ts.tz_localize(TZ) if ts.tz is None else ts
+        return np.broadcast_to(ts.asi8, (len(days),)) if len(ts) == 1 else ts.asi8
+
+    def _query(self, days, asof, columns, sources):
+        days = _days(days)
+        cutoff = self._asof(days, asof)
+        if len(cutoff) != len(days):
+            raise ValueError(f"{len(cutoff)} as-of times for {len(days)} days")
+        order = np.argsort(days.asi8, kind="stable")
+        day_ns, cutoff = days.asi8[order], cutoff[order]
+
+        frames = {}
+        for name in sources or self.sources():
+            src = self._source(name)
+            cols = [i for i, c in enumerate(src["columns"]) if columns is None or c in columns]
+            if not cols:
+                continue
+            #rows between the first and the last requested day, through the index; each row is
+            #then matched to its delivery day (all of them for a single-day snapshot)
+            lo = np.searchsorted(src["local_day"], day_ns[0], side="left")
+            hi = np.searchsorted(src["local_day"], day_ns[-1], side="right")
+            local_day = np.asarray(src["local_day"][lo:hi])
+            pos = np.minimum(np.searchsorted(day_ns, local_day), len(day_ns) - 1)
+            hit = day_ns[pos] == local_day
+            rows = lo + np.flatnonzero(hit)
+            row_cutoff = cutoff[pos[hit]]
+
+            values = np.asarray(src["values"][rows][:, cols])
+            available = np.asarray(src["available"][rows])[:, src["groups"][cols]]
+            delivery, out = _latest(np.asarray(src["delivery"][rows]), values, available <= row_cutoff[:, None])
+            frames[name] = pd.DataFrame(out, index=delivery, columns=[src["columns"][i] for i in cols])
+
+        if not frames:
+            return pd.DataFrame(columns=["delivery_start_local"])
+        #a column name taken by an earlier source is suffixed with _<source>, as in time_axis.join
+        seen = set()
+        for name, f in frames.items():
+            f.columns = [c if c not in seen else f"{c}_{name}" for c in f.columns]
+            seen.update(f.columns)
+        out = pd.concat(frames.values(), axis=1).sort_index()
+        out.insert(0, "delivery_start_local", pd.to_datetime(out.index, utc=True).tz_convert(TZ))
+        return out.reset_index(drop=True)
+
+    def snapshot(self, day, asof=None, columns=None, sources=None):
+        """
+        Every feature of one local delivery day as known at `asof` (default: the zone's gate
+        closure on D-1); values not yet available at that time are NaN. One row per delivery time.
+        """
+        return self._query([day], asof, columns, sources)
+
+    def training_matrix(self, days, asof=None, columns=None, sources=None):
+        """
+        snapshot() for many delivery days in one vectorised pass: each day's rows see only what
+        was available at that day's own as-of time, so the matrix is free of look-ahead.
+        asof: None (gate closure per day), an offset from local midnight such as "-13h", one
+        timestamp, or one timestamp per day.
+        """
+        return self._query(days, asof, columns, sources)
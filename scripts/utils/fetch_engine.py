@@ -0,0 +1,180 @@
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+import requests
+from dotenv import load_dotenv
+from entsoe import EntsoePandasClient
+from entsoe.entsoe import URL as ENTSOE_URL
+from entsoe.exceptions import NoMatchingDataError
+
+from scripts.utils import instrument
+from scripts.utils.http_cache import SECRET_PARAMS, CacheMiss, CachedSession
+
+TZ = "Europe/Zurich"
+
+#ENTSO-E allows 400 requests/minute per token; keep the pool well below that
+MAX_WORKERS = 4
+RETRIES = 4
+BACKOFF_S = 2.0
+#requests puts the full URL, API key included, into its error messages
+SECRET_RE = re.compile(rf"\b({'|'.join(map(re.escape, sorted(SECRET_PARAMS)))})=[^&\s'\"]+")
+
+
+def make_client(session=None, endpoint=None, max_workers=MAX_WORKERS):
+    """One shared ENTSO-E client; endpoint points it at a local stub for offline runs.
+    Responses go through the on-disk cache (HTTP_CACHE_MODE=replay runs fully offline)."""
+    load_dotenv()
+    if session is None:
+        session = CachedSession()
+    if endpoint is not None:
+        #entsoe-py always requests its module-level URL; the session redirects it, so clients
+        #with different endpoints (stub and production) can live side by side
+        if not isinstance(session, CachedSession):
+            raise TypeError("endpoint= needs a CachedSession (it rewrites the request URL)")
+        session.rebase[ENTSOE_URL] = endpoint
+    #one keep-alive connection per worker
+    mount_pool(session, max_workers)
+
+    #retries are handled per window by the engine, not by entsoe-py's 10 s sleep loop
+    return EntsoePandasClient(api_key=os.getenv("ENTSOE_API_KEY"), session=session,
+                              retry_count=1, retry_delay=0)
+
+
+def mount_pool(session, max_workers=MAX_WORKERS):
+    """Size the keep-alive connection pool to the worker pool"""
+    adapter = requests.adapters.HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class RateLimiter:
+    """
+    Thread-safe sliding-window limiter. limits = {window_s: max_weight}, e.g.
+    {60: 600, 3600: 5000}; acquire(w) blocks until w more units fit in every window.
+    """
+
+    def __init__(self, limits):
+        self.limits = dict(limits)
+        self.horizon = max(self.limits)
+        self.log = deque()
+        self.lock = threading.Lock()
+
+    def acquire(self, weight=1.0):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                while self.log and self.log[0][0] <= now - self.horizon:
+                    self.log.popleft()
+
+                wait = 0.0
+                for window, cap in self.limits.items():
+                    w = min(weight, cap)
+                    used = sum(x for t, x in self.log if t > now - window)
+                    if used + w <= cap:
+                        continue
+                    #wait until enough of the oldest calls in this window have expired
+                    excess = used + w - cap
+                    for t, x in self.log:
+                        if t <= now - window:
+                            continue
+                        excess -= x
+                        if excess <= 0:
+                            wait = max(wait, t + window - now)
+                            break
+
+                if wait <= 0:
+                    self.log.append((now, weight))
+                    return
+            time.sleep(wait)
+
+
+def month_windows(start, end):
+    """Split [start, end) into calendar-month windows (local time)"""
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    if start.tzinfo is None:
+        start = start.tz_localize(TZ)
+    if end.tzinfo is None:
+        end = end.tz_localize(TZ)
+
+    edges = pd.date_range(start.normalize(), end, freq="MS")
+    edges = [start] + [e for e in edges if start < e < end] + [end]
+    return [(s, e) for s, e in zip(edges[:-1], edges[1:]) if s < e]
+
+
+def redact(e):
+    """Error message with the values of secret query parameters masked, safe to print"""
+    return SECRET_RE.sub(r"\1=***", str(e))
+
+
+def call_with_retry(fn, *args, retries=RETRIES, backoff=BACKOFF_S, label="", **kwargs):
+    """Call fn with exponential backoff + jitter; None means "no data for this window" """
+    for attempt in range(retries + 1):
+        try:
+            return fn(*args, **kwargs)
+        except NoMatchingDataError:
+            return None
+        except CacheMiss:
+            #replay mode: retrying cannot help
+            raise
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = backoff * (2 ** attempt) * (0.5 + random.random())
+            instrument.record_retry()
+            print(f"  [retry {attempt+1}] {label}: {redact(e)} (sleep {delay:.1f}s)")
+            time.sleep(delay)
+
+
+def stitch(parts):
+    """Concatenate window results, cut each to [start, end) and drop edge duplicates"""
+    pieces = []
+    for (s, e), part in sorted(parts, key=lambda p: p[0][0]):
+        if part is None or len(part) == 0:
+            continue
+        #entsoe-py truncates with an inclusive end, so the first stamp of the next window repeats
+        part = part[(part.index >= s) & (part.index < e)]
+        pieces.append(part)
+
+    if not pieces:
+        return None
+
+    out = pd.concat(pieces).sort_index()
+    return out[~out.index.duplicated(keep="last")]
+
+
+def fetch_many(jobs, start, end, starts=None, max_workers=MAX_WORKERS, retries=RETRIES, backoff=BACKOFF_S):
+    """
+    Run several ENTSO-E queries over monthly windows on one bounded worker pool.
+
+    jobs: {name: query} where query(start, end) returns a Series/DataFrame.
+    starts: optional {name: start} overriding start per job (incremental tails).
+    Returns ({name: stitched Series/DataFrame or None}, {name: [failed (start, end) windows]}).
+    """
+    starts = starts or {}
+    parts = {name: [] for name in jobs}
+    failed = {name: [] for name in jobs}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {}
+        for name, query in jobs.items():
+            for s, e in month_windows(starts.get(name, start), end):
+                label = f"{name} {s.date()}..{e.date()}"
+                fut = pool.submit(call_with_retry, query, s, e, retries=retries, backoff=backoff, label=label)
+                futures[fut] = (name, s, e)
+
+        for fut in as_completed(futures):
+            name, s, e = futures[fut]
+            try:
+                parts[name].append(((s, e), fut.result()))
+            except Exception as exc:
+                print(f"[fail] {name} {s.date()}..{e.date()}: {redact(exc)}")
+                failed[name].append((s, e))
+
+    return {name: stitch(p) for name, p in parts.items()}, failed
@@ -0,0 +1,214 @@
+import calendar
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+
+from scripts.utils import instrument
+
+#content-addressed store: data/external/http_cache/<2 hex>/<sha256>.json.gz
+CACHE_DIR = Path(os.getenv("HTTP_CACHE_DIR", "data/external/http_cache"))
+
+#on      : serve fresh hits from disk, fetch + store misses
+#replay  : strictly offline, every request must be a hit (stale entries are fine)
+#refresh : always fetch, overwrite the cache (the default under FETCH_FULL=1, so a full
+#          re-download really goes to the source and picks up revisions)
+#off     : plain requests.Session
+MODE = os.getenv("HTTP_CACHE_MODE") or ("refresh" if os.getenv("FETCH_FULL", "0") == "1" else "on")
+TTL_S = float(os.getenv("HTTP_CACHE_TTL_DAYS", "7")) * 86400
+
+#Answers that can still change are kept only for VOLATILE_TTL_S (in "on" mode; replay serves them
+#anyway): "no data" and error bodies, and any query whose time window ends less than SETTLE_DAYS
+#ago (day-ahead results not yet published, actuals still being revised) or that has no window at all
+VOLATILE_TTL_S = float(os.getenv("HTTP_CACHE_VOLATILE_MIN", "10")) * 60
+SETTLE_S = float(os.getenv("HTTP_CACHE_SETTLE_DAYS", "3")) * 86400
+#ENTSO-E answers an empty query with an acknowledgement document (status 200 or 400)
+NO_DATA = b"No matching data found"
+MAX_BYTES = int(float(os.getenv("HTTP_CACHE_MAX_MB", "2048")) * 1024 * 1024)
+
+#never part of the key and never written to disk
+SECRET_PARAMS = {"securityToken", "apikey", "api_key", "token"}
+
+#deterministic answers only; 429/5xx are retried by the caller instead
+CACHEABLE_STATUS = {200, 400}
+
+
+class CacheMiss(requests.ConnectionError):
+    """Raised in replay mode when a request has no cached response"""
+
+
+def _normalise(method, url, params):
+    #merge query-string and params, drop secrets, sort, so equivalent requests share a key
+    parts = urlsplit(url)
+    items = parse_qsl(parts.query, keep_blank_values=True)
+    if params:
+        items += list(params.items()) if isinstance(params, dict) else list(params)
+    items = sorted((str(k), str(v)) for k, v in items if k not in SECRET_PARAMS)
+    base = f"{parts.scheme}://{parts.netloc}{parts.path}"
+    return method.upper(), base, items
+
+
+def _window_end(items):
+    #end of the requested time window (UTC epoch s), from ENTSO-E or Open-Meteo parameters
+    values = dict(items)
+    if "periodEnd" in values:
+        return calendar.timegm(time.strptime(values["periodEnd"], "%Y%m%d%H%M"))
+    if "end_date" in values:
+        return calendar.timegm(time.strptime(values["end_date"], "%Y-%m-%d")) + 86400
+    return None
+
+
+def volatile(resp, method, url, params, now=None):
+    """True when the cached answer may still change (short TTL, see VOLATILE_TTL_S)"""
+    if resp.status_code != 200 or NO_DATA in resp.content[:4096]:
+        return True
+    end = _window_end(_normalise(method, url, params)[2])
+    return end is None or end > (time.time() if now is None else now) - SETTLE_S
+
+
+def cache_key(method, url, params=None):
+    method, base, items = _normalise(method, url, params)
+    raw = json.dumps([method, base, items], separators=(",", ":"))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class CachedSession(requests.Session):
+    """requests.Session with an on-disk, gzip-compressed response cache for GET requests"""
+
+    def __init__(self, cache_dir=CACHE_DIR, mode=MODE, ttl=TTL_S, max_bytes=MAX_BYTES, before_send=None, rebase=None):
+        super().__init__()
+        self.cache_dir = Path(cache_dir)
+        #{url prefix: replacement}, applied before keying and sending (e.g. a library's fixed API
+        #URL -> a local stub), so the redirect belongs to this session only
+        self.rebase = dict(rebase or {})
+        #before_send(method, url, params) runs only for requests that really go out (rate limiting)
+        self.before_send = before_send
+        self.mode = mode
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _path(self, key):
+        return self.cache_dir / key[:2] / f"{key}.json.gz"
+
+    def _load(self, path):
+        #one JSON header line, then the raw body (ENTSO-E answers some queries with zip files)
+        with gzip.open(path, "rb") as f:
+            header, _, body = f.read().partition(b"\n")
+        entry = json.loads(header)
+        resp = requests.Response()
+        resp.status_code = entry["status"]
+        resp._content = body
+        resp.encoding = entry["encoding"]
+        resp.headers.update(entry["headers"])
+        resp.url = entry["url"]
+        resp.reason = "cached"
+        resp.from_cache = True
+        return resp, entry
+
+    def _store(self, path, resp, method, url, params):
+        _, base, items = _normalise(method, url, params)
+        entry = {
+            "url": base + ("?" + urlencode(items) if items else ""),
+            "status": resp.status_code,
+            "headers": {k: v for k, v in resp.headers.items() if k.lower() == "content-type"},
+            "encoding": resp.encoding,
+            "created": time.time(),
+            "volatile": volatile(resp, method, url, params),
+        }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        #write-then-rename so concurrent readers never see half a file
+        tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+        with gzip.open(tmp, "wb", compresslevel=6) as f:
+            f.write(json.dumps(entry).encode() + b"\n")
+            f.write(resp.content)
+        tmp.replace(path)
+
+    def request(self, method, url, params=None, **kwargs):
+        for prefix, target in self.rebase.items():
+            if url.startswith(prefix):
+                url = target + url[len(prefix):]
+                break
+        if self.mode == "off" or method.upper() != "GET":
+            if self.before_send is not None:
+                self.before_send(method, url, params)
+            t0 = time.perf_counter()
+            resp = super().request(method, url, params=params, **kwargs)
+            instrument.record_http(time.perf_counter() - t0, len(resp.content), ok=resp.ok)
+            return resp
+
+        path = self._path(cache_key(method, url, params))
+        if self.mode != "refresh" and path.exists():
+            try:
+                resp, entry = self._load(path)
+            except (OSError, ValueError, EOFError):
+                #evicted under our feet or truncated: treat as a miss
+                resp, entry = None, {}
+            #entries written before the volatile flag count as volatile
+            ttl = VOLATILE_TTL_S if entry.get("volatile", True) else self.ttl
+            if resp is not None and (self.mode == "replay" or time.time() - entry["created"] < ttl):
+                self.hits += 1
+                os.utime(path)  #mtime doubles as last-access time for eviction
+                instrument.record_http(0.0, len(resp.content), cached=True)
+                return resp
+
+        if self.mode == "replay":
+            raise CacheMiss(f"replay mode: no cached response for {_normalise(method, url, params)[1:]}")
+
+        self.misses += 1
+        if self.before_send is not None:
+            self.before_send(method, url, params)
+        t0 = time.perf_counter()
+        resp = super().request(method, url, params=params, **kwargs)
+        instrument.record_http(time.perf_counter() - t0, len(resp.content), ok=resp.ok)
+        if resp.status_code in CACHEABLE_STATUS:
+            self._store(path, resp, method, url, params)
+            self._maybe_evict()
+        return resp
+
+    def _maybe_evict(self):
+        #scanning the tree is cheap next to a network round-trip, but not every write needs it
+        with self._lock:
+            self._writes += 1
+            if self._writes % 50:
+                return
+        evict(self.cache_dir, self.max_bytes)
+
+
+def evict(cache_dir=CACHE_DIR, max_bytes=MAX_BYTES, max_age=None):
+    """Drop entries unused for max_age seconds (if given), then least-recently-used ones until under max_bytes"""
+    files = []
+    now = time.time()
+    for p in Path(cache_dir).glob("*/*.json.gz"):
+        try:
+            st = p.stat()
+        except FileNotFoundError:
+            continue
+        files.append((st.st_mtime, st.st_size, p))
+
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    #oldest access first
+    for mtime, size, p in sorted(files):
+        unused = max_age is not None and now - mtime > max_age
+        if not unused and total <= max_bytes:
+            break
+        p.unlink(missing_ok=True)
+        total -= size
+        removed += 1
+    return removed
+
+
+if __name__ == "__main__":
+    #manual cleanup: also drop anything not used for 10x the TTL
+    n = evict(max_age=10 * TTL_S)
+    print(f"[ok] evicted {n} entries from {CACHE_DIR}")
@@ -0,0 +1,262 @@
+import argparse
+import atexit
+import functools
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+TZ = "Europe/Zurich"
+
+#One JSON line per stage run: wall/CPU time, peak RSS, rows and bytes read/written through
+#scripts.utils.storage, and for fetches the HTTP requests made through CachedSession.
+#Stages nest (a pipeline stage around a build_* function); I/O and HTTP counts go to every
+#open stage of the process. Work done in a process pool is counted in the worker: submit it
+#through run_collected() and hand the counts it returns to merge() in the parent, so the stage
+#around the pool sees them too. METRICS=0 turns recording off.
+LOG_FILE = Path(os.getenv("METRICS_LOG", "results/logs/metrics.jsonl"))
+ENABLED = os.getenv("METRICS", "1") == "1"
+SAMPLE_S = 0.02
+
+_PAGE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+_lock = threading.Lock()
+_open = []
+
+COUNTS = ["rows_in", "bytes_in", "rows_out", "bytes_out", "http_requests", "http_cache_hits", "http_bytes",
+          "http_retries", "http_errors"]
+
+
+def _rss_bytes():
+    #current RSS from /proc (Linux); elsewhere the lifetime peak is the best we have
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class _Stage:
+    def __init__(self, name, tags):
+        self.name = name
+        self.tags = tags
+        self.counts = dict.fromkeys(COUNTS, 0)
+        self.latencies = []
+        self.peak = _rss_bytes()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(SAMPLE_S):
+            self.peak = max(self.peak, _rss_bytes())
+
+    def start(self):
+        self.t0 = time.perf_counter()
+        self.cpu0 = time.process_time()
+        self.children0 = resource.getrusage(resource.RUSAGE_CHILDREN)
+        self._sampler.start()
+
+    def finish(self, error=None):
+        self._stop.set()
+        self._sampler.join()
+        self.peak = max(self.peak, _rss_bytes())
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        lat = np.array(self.latencies) if self.latencies else np.array([np.nan])
+        return {
+            "ts": pd.Timestamp.now(tz=TZ).isoformat(),
+            "stage": self.name,
+            **self.tags,
+            "pid": os.getpid(),
+            "status": "ok" if error is None else "error",
+            "wall_s": round(time.perf_counter() - self.t0, 4),
+            "cpu_s": round(time.process_time() - self.cpu0, 4),
+            "cpu_children_s": round(children.ru_utime + children.ru_stime
+                                    - self.children0.ru_utime - self.children0.ru_stime, 4),
+            "peak_rss_mb": round(self.peak / 2**20, 1),
+            #ru_maxrss of waited-for children (e.g. a nested process pool), lifetime peak
+            "peak_rss_children_mb": round(children.ru_maxrss / 1024, 1),
+            **self.counts,
+            "http_latency_s": round(float(np.nansum(lat)), 4),
+            "http_latency_p50_s": None if np.isnan(lat).all() else round(float(np.nanpercentile(lat, 50)), 4),
+            "http_latency_p95_s": None if np.isnan(lat).all() else round(float(np.nanpercentile(lat, 95)), 4),
+            **({"error": repr(error)} if error is not None else {}),
+        }
+
+
+def _write(record):
+    LOG_FILE.parent.mkdir(parents=True, exist_ok=True)
+    #one short append per record; O_APPEND keeps lines from parallel workers intact
+    with open(LOG_FILE, "a") as f:
+        f.write(json.dumps(record, default=str) + "\n")
+
+
+@contextmanager
+def stage(name, **tags):
+    """Record one run of a pipeline stage (tags, e.g. month="2024-03", are copied into the record)"""
+    if not ENABLED:
+        yield
+        return
+    s = _Stage(name, tags)
+    with _lock:
+        _open.append(s)
+    s.start()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        with _lock:
+            _open.remove(s)
+        _write(s.finish(error))
+
+
+def instrumented(fn=None, name=None):
+    """Decorator form of stage(): @instrumented or @instrumented(name="...")"""
+    if fn is None:
+        return functools.partial(instrumented, name=name)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with stage(name or fn.__name__):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+class _Collector:
+    #an open "stage" that only counts, for handing the counts to another process
+    def __init__(self):
+        self.counts = dict.fromkeys(COUNTS, 0)
+        self.latencies = []
+
+
+def run_collected(fn, *args, **kwargs):
+    """Run fn (in a pool worker) and return (its result, the I/O and HTTP counts it recorded)"""
+    c = _Collector()
+    with _lock:
+        _open.append(c)
+    try:
+        result = fn(*args, **kwargs)
+    finally:
+        with _lock:
+            _open.remove(c)
+    return result, {**c.counts, "latencies": c.latencies}
+
+
+def merge(counts):
+    """Add counts returned by run_collected() in another process to the stages open here"""
+    _add(**{k: counts[k] for k in COUNTS if counts.get(k)})
+    if counts.get("latencies") and _open:
+        with _lock:
+            for s in _open:
+                s.latencies.extend(counts["latencies"])
+
+
+def script(name):
+    """
+    Record a module-level script (no entry function to decorate) as one stage, from this call to
+    interpreter exit. A no-op under the runner, which already records a stage around it.
+    """
+    if not ENABLED or _open:
+        return
+    s = _Stage(name, {})
+    with _lock:
+        _open.append(s)
+    s.start()
+
+    failed = []
+    hook = sys.excepthook
+    def _excepthook(*exc):
+        failed.append(exc[1])
+        hook(*exc)
+    sys.excepthook = _excepthook
+
+    def _close():
+        with _lock:
+            if s in _open:
+                _open.remove(s)
+        _write(s.finish(failed[0] if failed else None))
+    atexit.register(_close)
+
+
+def _add(**counts):
+    if not _open:
+        return
+    with _lock:
+        for s in _open:
+            for k, v in counts.items():
+                s.counts[k] += v
+
+
+def record_io(direction, rows, nbytes):
+    """Called by storage for every table read ("in") or written ("out")"""
+    _add(**{f"rows_{direction}": int(rows), f"bytes_{direction}": int(nbytes)})
+
+
+def record_http(latency_s, nbytes, cached=False, ok=True):
+    """Called by CachedSession for every GET (cache hits have no latency worth counting)"""
+    if not _open:
+        return
+    _add(http_requests=1, http_cache_hits=int(cached), http_bytes=int(nbytes), http_errors=int(not ok))
+    if not cached:
+        with _lock:
+            for s in _open:
+                s.latencies.append(latency_s)
+
+
+def record_retry():
+    _add(http_retries=1)
+
+
+# === summary ===
+
+def load(path=LOG_FILE):
+    path = Path(path)
+    if not path.exists():
+        return pd.DataFrame()
+    return pd.read_json(path, lines=True)
+
+
+def summary(path=LOG_FILE, by="wall_s", top=10, history=False):
+    """Top stages by one metric; by default the latest record of each stage"""
+    df = load(path)
+    if df.empty:
+        print(f"[warn] no metrics in {path}")
+        return df
+    if not history:
+        key = ["stage"] + [c for c in ("month", "zone") if c in df.columns]
+        df = df.sort_values("ts").drop_duplicates(key, keep="last")
+
+    cols = ["stage"] + [c for c in ("month", "zone") if c in df.columns] + [
+        "wall_s", "cpu_s", "cpu_children_s", "peak_rss_mb", "peak_rss_children_mb",
+        "rows_in", "rows_out", "bytes_in", "bytes_out", "status"
+    ]
+    hot = df.sort_values(by, ascending=False).head(top)[cols]
+    hot = hot.fillna({c: "" for c in ("month", "zone") if c in hot.columns})
+    print(f"[info] top {len(hot)} by {by} ({'all runs' if history else 'latest run per stage'})")
+    print(hot.to_string(index=False))
+
+    http = df[df["http_requests"] > 0]
+    if not http.empty:
+        print("\n[info] HTTP")
+        print(http[["stage", "http_requests", "http_cache_hits", "http_bytes", "http_latency_s",
+                    "http_latency_p50_s", "http_latency_p95_s", "http_retries", "http_errors"]]
+              .sort_values("http_latency_s", ascending=False).to_string(index=False))
+    return hot
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show the pipeline's hot spots from the metrics log")
+    parser.add_argument("--by", default="wall_s", help="metric to rank by (wall_s, cpu_s, peak_rss_mb, rows_out, ...)")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--history", action="store_true", help="rank every recorded run, not just the latest per stage")
+    parser.add_argument("--log", default=str(LOG_FILE))
+    args = parser.parse_args()
+    sys.exit(0 if not summary(args.log, args.by, args.top, args.history).empty else 1)
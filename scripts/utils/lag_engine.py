@@ -0,0 +1,109 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from scripts.utils import time_axis
+
+#Declarative lag / rolling-window features. A spec maps a column to what should be derived from it:
+#
+#    {"price": {"lags": ["1h", "24h"], "windows": ["24h", "168h"], "stats": ["mean", "std"],
+#               "window_shift": "1h", "lag_name": "lag_{lag}h", "window_name": "rolling_{stat}_{window}h"}}
+#
+#Lags and windows are durations on the consecutive MTU grid (time_axis.MTU), converted to rows
+#per run: "24h" is 24 rows back at hourly MTU, 96 at 15 minutes. Bare numbers are hours. Names
+#format {lag}/{window} in hours, so column names do not depend on the MTU.
+#Windows follow pandas' rolling(window).<stat>() on the column shifted by window_shift: a window with any NaN, or
+#shorter than its length, is NaN; std/var use ddof=1. All windows of a column come from
+#the same prefix sums, so one extra window costs two subtractions per row.
+LAG_NAME = "{col}_lag{lag}"
+WINDOW_NAME = "{col}_rolling_{stat}_{window}h"
+STATS = ("sum", "mean", "var", "std")
+
+
+def lag(x, k):
+    """x shifted k rows forward (NaN-filled), like Series.shift(k)"""
+    out = np.full(len(x), np.nan)
+    if k == 0:
+        out[:] = x
+    elif k < len(x):
+        out[k:] = x[:len(x) - k]
+    return out
+
+
+def _prefix_sums(x):
+    #centred on the mean so the sum of squares does not cancel catastrophically
+    missing = np.isnan(x)
+    mu = x[~missing].mean() if (~missing).any() else 0.0
+    c = np.where(missing, 0.0, x - mu)
+    zero = np.zeros(1)
+    return (
+        np.concatenate([zero, np.cumsum(c)]),
+        np.concatenate([zero, np.cumsum(c * c)]),
+        np.concatenate([[0], np.cumsum(missing)]),
+        mu
+    )
+
+
+def window_stats(x, windows, stats):
+    """{(stat, window): array} for trailing windows ending at each row"""
+    n = len(x)
+    s1, s2, n_missing, mu = _prefix_sums(x)
+    end = np.arange(1, n + 1)
+    out = {}
+    for w in windows:
+        start = end - w
+        full = start >= 0
+        start = np.maximum(start, 0)
+        ok = full & (n_missing[end] - n_missing[start] == 0)
+        a = s1[end] - s1[start]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            b = np.maximum(s2[end] - s2[start] - a * a / w, 0.0)
+            values = {
+                "sum": a + mu * w,
+                "mean": a / w + mu,
+                "var": b / (w - 1) if w > 1 else np.full(n, np.nan),
+            }
+        values["std"] = np.sqrt(values["var"])
+        for stat in stats:
+            if stat not in STATS:
+                raise ValueError(f"unknown window statistic {stat!r} (expected one of {STATS})")
+            out[(stat, w)] = np.where(ok, values[stat], np.nan)
+    return out
+
+
+def _duration(d):
+    return pd.Timedelta(d, unit="h") if isinstance(d, (int, float, np.number)) else pd.Timedelta(d)
+
+
+def _hours(d):
+    return f"{_duration(d) / time_axis.HOUR:g}"
+
+
+def apply_spec(df, spec, step=None):
+    """
+    Return df with every lag/window column in spec appended (one NumPy pass per source column).
+    df must be one row per slot of `step` (default time_axis.MTU), e.g. from time_axis.resample.
+    """
+    new = {}
+    for col, opts in spec.items():
+        x = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float)
+        lag_name = opts.get("lag_name", LAG_NAME)
+        for k in opts.get("lags", []):
+            new[lag_name.format(col=col, lag=_hours(k))] = lag(x, time_axis.slots(_duration(k), step))
+
+        windows = opts.get("windows", [])
+        if windows:
+            stats = opts.get("stats", ["mean"])
+            shifted = lag(x, time_axis.slots(_duration(opts.get("window_shift", 0)), step))
+            window_name = opts.get("window_name", WINDOW_NAME)
+            rows = {time_axis.slots(_duration(w), step): _hours(w) for w in windows}
+            for (stat, w), values in window_stats(shifted, list(rows), stats).items():
+                new[window_name.format(col=col, stat=stat, window=rows[w])] = values
+
+    if not new:
+        return df
+    extra = pd.DataFrame(new, index=df.index)
+    return pd.concat([df.drop(columns=[c for c in extra.columns if c in df.columns]), extra], axis=1)
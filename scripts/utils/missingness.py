@@ -0,0 +1,64 @@
+import math
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+#Missing values as a raster: rows are binned into time buckets (days, weeks or months) and every
+#pixel is the share of missing values of one column in one bucket. The image has (buckets x
+#columns) pixels whatever the number of rows, so years of 15-minute data render as fast as a
+#month; a seaborn heatmap draws one patch per row and column instead.
+#Counts come per local day (StreamStats keeps them), so no row has to be held for the plot.
+MAX_BUCKETS = 1000
+FREQ_NAMES = {"D": "day", "W": "week", "M": "month"}
+
+
+def day_counts(df, time_col="delivery_start_local", tz="Europe/Zurich"):
+    """(missing values per local day and column, rows per local day) of an in-memory frame"""
+    day = pd.Index(pd.DatetimeIndex(df[time_col]).tz_convert(tz).tz_localize(None).normalize(), name="day")
+    cols = [c for c in df.columns if c != time_col]
+    return df[cols].isna().groupby(day).sum().astype(float), pd.Series(1.0, index=day).groupby(level=0).sum()
+
+
+def bucket_for(n_days, max_buckets=MAX_BUCKETS):
+    """Finest of day / week / month that keeps the raster under max_buckets columns of pixels"""
+    for freq, days in [("D", 1), ("W", 7)]:
+        if n_days / days <= max_buckets:
+            return freq
+    return "M"
+
+
+def share(counts, rows, freq="D"):
+    """Missing share per bucket (index: bucket start) and column, from per-day counts"""
+    if counts.empty:
+        return counts
+    period = pd.PeriodIndex(pd.DatetimeIndex(counts.index), freq=freq)
+    missing = counts.groupby(period).sum()
+    n = rows.reindex(counts.index).fillna(0).groupby(period).sum()
+    frac = missing.div(n.where(n > 0), axis=0)
+    frac.index = frac.index.start_time.rename("bucket")
+    return frac
+
+
+def render(frac, path, title="Missing values"):
+    """Draw a share matrix (buckets x columns) as one raster image with a colour bar"""
+    n_buckets, n_cols = frac.shape
+    height = min(max(4.0, 0.12 * n_cols + 1.5), 40.0)
+    fig, ax = plt.subplots(figsize=(14, height))
+    image = ax.imshow(frac.to_numpy(dtype=float).T, aspect="auto", interpolation="nearest",
+                      cmap="viridis", vmin=0.0, vmax=1.0)
+    fig.colorbar(image, ax=ax, fraction=0.02, pad=0.01, label="missing share")
+
+    #at most ~100 column labels and ~12 date labels
+    step = max(1, math.ceil(n_cols / 100))
+    ax.set_yticks(np.arange(0, n_cols, step))
+    ax.set_yticklabels(frac.columns[::step], fontsize=6)
+    if n_buckets:
+        xt = np.unique(np.linspace(0, n_buckets - 1, min(n_buckets, 12)).round().astype(int))
+        ax.set_xticks(xt)
+        ax.set_xticklabels([f"{t:%Y-%m-%d}" for t in frac.index[xt]], rotation=45, ha="right", fontsize=7)
+    ax.set_title(title)
+    fig.tight_layout()
+    fig.savefig(path, dpi=100)
+    plt.close(fig)
+    return path
@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+
+HOUR_NS = 3_600_000_000_000
+
+#Bitemporal view of ENTSO-E unavailability records. Every row has a validity interval
+#[start, end] (when the capacity is offline) and a knowledge interval [published, superseded):
+#a revision of an outage (same mrid) is known from its created_doc_time until the next
+#revision of that mrid is published. Cancelled/withdrawn revisions count as 0 MW but still
+#supersede the earlier ones. Rows without revision metadata are known from the beginning.
+NEVER = np.iinfo(np.int64).max
+ALWAYS = np.iinfo(np.int64).min
+VOID_STATUS = {"Cancelled", "Withdrawn", "A09", "A13"}
+
+
+def _ns(s):
+    #int64 UTC nanoseconds; NaT -> int64 min
+    s = pd.to_datetime(s, errors="coerce", utc=True)
+    s = s.tz_convert(None) if isinstance(s, pd.DatetimeIndex) else s.dt.tz_convert(None)
+    return np.asarray(s, dtype="datetime64[ns]").view("int64")
+
+
+def hour_span(starts, ends, grid_start, n_hours, step=HOUR_NS):
+    """First/last grid slot (of `step` ns) covered by each interval: ceil(start)..floor(end), inclusive"""
+    first = -(-(starts - grid_start) // step)
+    last = (ends - grid_start) // step
+    return np.clip(first, 0, n_hours), np.clip(last, -1, n_hours - 1)
+
+
+def sweep(first, last, values, n_hours, keys=None, n_keys=1):
+    """Sum of values over index ranges [first, last] per hour: difference array + one cumsum -> array[n_hours, n_keys]"""
+    ok = (first <= last) & ~np.isnan(values)
+    keys = np.zeros(len(values), dtype=np.int64) if keys is None else keys
+    diff = np.zeros((n_hours + 1, n_keys))
+    np.add.at(diff, (first[ok], keys[ok]), values[ok])
+    np.add.at(diff, (last[ok] + 1, keys[ok]), -values[ok])
+    return np.cumsum(diff[:-1], axis=0)
+
+
+class OutageIndex:
+    """Outage records indexed by validity and knowledge time, for as-of capacity queries"""
+
+    def __init__(self, df):
+        df = df.reset_index(drop=True)
+        self.starts = _ns(df["start"])
+        self.ends = _ns(df["end"])
+        offline = pd.to_numeric(df["nominal_power"], errors="coerce") - pd.to_numeric(df["avail_qty"], errors="coerce")
+        self.values = offline.to_numpy(dtype=float)
+        self.known_from, self.known_to = self._knowledge(df)
+
+        status = df["docstatus"].astype(str) if "docstatus" in df.columns else pd.Series("", index=df.index)
+        self.values[status.isin(VOID_STATUS).to_numpy()] = 0.0
+
+    @staticmethod
+    def _knowledge(df):
+        n = len(df)
+        if "created_doc_time" not in df.columns or "mrid" not in df.columns:
+            return np.full(n, ALWAYS), np.full(n, NEVER)
+
+        #NaT comes out as int64 min, i.e. known from the beginning
+        published = pd.Series(_ns(df["created_doc_time"]))
+        rev = pd.to_numeric(df["revision"], errors="coerce").fillna(0) if "revision" in df.columns else pd.Series(0, index=df.index)
+
+        #one knowledge interval per (mrid, revision); every row of a revision shares it
+        versions = pd.DataFrame({"mrid": df["mrid"], "revision": rev, "published": published})
+        versions = versions.groupby(["mrid", "revision"], as_index=False)["published"].min()
+        versions = versions.sort_values(["mrid", "revision"])
+        versions["superseded"] = versions.groupby("mrid")["published"].shift(-1, fill_value=NEVER)
+
+        key = pd.MultiIndex.from_arrays([df["mrid"], rev])
+        superseded = versions.set_index(["mrid", "revision"])["superseded"].reindex(key).to_numpy()
+        return published.to_numpy(), superseded
+
+    def offline(self, hours, asof=None, keys=None, n_keys=1):
+        """
+        MW offline per delivery hour, summed per key -> array[len(hours), n_keys].
+        hours is a regular grid at any MTU (the step is read from its first two stamps).
+        asof: knowledge time per hour (non-decreasing, e.g. gate_closure(hours)); None = latest known.
+        Because asof is monotonic, the hours at which a revision is the known one form one
+        contiguous range, so the query stays a single sweep over the records.
+        """
+        hours = pd.DatetimeIndex(hours)
+        n = len(hours)
+        grid_start = hours[0].tz_convert("UTC").value
+        step = hours[1].value - hours[0].value if n > 1 else HOUR_NS
+        first, last = hour_span(self.starts, self.ends, grid_start, n, step)
+
+        if asof is not None:
+            t = _ns(pd.DatetimeIndex(asof))
+            if np.any(np.diff(t) < 0):
+                raise ValueError("asof times must be non-decreasing along the hour grid")
+            #hours whose knowledge time falls inside [known_from, known_to)
+            first = np.maximum(first, np.searchsorted(t, self.known_from, side="left"))
+            last = np.minimum(last, np.searchsorted(t, self.known_to, side="left") - 1)
+        else:
+            #latest view: only revisions nobody has superseded
+            last = np.where(self.known_to == NEVER, last, -1)
+
+        return sweep(first, last, self.values, n, keys=keys, n_keys=n_keys)
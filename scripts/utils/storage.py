@@ -0,0 +1,235 @@
+import os
+import shutil
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from scripts.utils import instrument
+
+TZ = "Europe/Zurich"
+
+#Every table is a hive-partitioned Parquet dataset <name>/utc_year=YYYY/utc_month=M/part-0.parquet.
+#The time column is stored as int64 UTC (timestamp[ns, UTC]) and partitioned on its UTC
+#year/month, so time-range reads only open the months they need. Readers get it back as
+#tz-aware Europe/Zurich. EXPORT_CSV=1 (or csv=True) also writes <name>.csv next to it.
+EXPORT_CSV = os.getenv("EXPORT_CSV", "0") == "1"
+
+#prefixed so they never collide with feature columns such as the calendar's "month"
+PARTITIONS = ["utc_year", "utc_month"]
+
+#rows per block when a table still held as CSV is streamed (iter_partitions)
+CSV_CHUNK_ROWS = 200_000
+
+
+def dataset_path(path):
+    """data/processed/foo.csv and data/processed/foo both map to the dataset dir data/processed/foo"""
+    path = Path(path)
+    return path.with_suffix("") if path.suffix in (".csv", ".parquet") else path
+
+
+def csv_path(path):
+    return dataset_path(path).with_suffix(".csv")
+
+
+def exists(path):
+    root = dataset_path(path)
+    return root.is_dir() or csv_path(path).exists()
+
+
+def _to_utc(s):
+    return pd.to_datetime(s, errors="coerce", utc=True)
+
+
+def _local(ts):
+    ts = pd.Timestamp(ts)
+    return ts.tz_localize(TZ) if ts.tzinfo is None else ts.tz_convert(TZ)
+
+
+def _with_partitions(df, time_col):
+    df = df.copy()
+    df[time_col] = _to_utc(df[time_col])
+    df = df.dropna(subset=[time_col])
+    df["utc_year"] = df[time_col].dt.year.astype("int16")
+    df["utc_month"] = df[time_col].dt.month.astype("int8")
+    return df
+
+
+def write_table(df, path, time_col="delivery_start_local", mode="overwrite", csv=None):
+    """
+    Write df as a year/month-partitioned Parquet dataset.
+    mode="overwrite" replaces the whole dataset, mode="partitions" only the months present in df.
+    """
+    root = dataset_path(path)
+    out = _with_partitions(df, time_col).sort_values(time_col, kind="stable")
+
+    if mode == "overwrite" and root.exists():
+        shutil.rmtree(root)
+    root.mkdir(parents=True, exist_ok=True)
+
+    table = pa.Table.from_pandas(out, preserve_index=False)
+    instrument.record_io("out", table.num_rows, table.nbytes)
+    pq.write_to_dataset(
+        table, root,
+        partition_cols=PARTITIONS,
+        basename_template="part-{i}.parquet",
+        existing_data_behavior="delete_matching",
+    )
+
+    if csv if csv is not None else EXPORT_CSV:
+        full = read_table(root, time_col=time_col) if mode == "partitions" else df
+        full.to_csv(csv_path(path), index=False)
+    return root
+
+
+def _partition_dirs(root, start=None, end=None):
+    #prune on the directory names before pyarrow opens anything
+    lo = None if start is None else _month_key(start)
+    hi = None if end is None else _month_key(end)
+    dirs = []
+    for d in root.glob("utc_year=*/utc_month=*"):
+        key = int(d.parent.name.split("=")[1]) * 12 + int(d.name.split("=")[1]) - 1
+        if (lo is None or key >= lo) and (hi is None or key <= hi):
+            dirs.append((key, d))
+    return [d for _, d in sorted(dirs)]
+
+
+def _month_key(ts):
+    ts = _local(ts).tz_convert("UTC")
+    return ts.year * 12 + ts.month - 1
+
+
+def _bounds(time_col, start, end):
+    expr = None
+    if start is not None:
+        expr = ds.field(time_col) >= pa.scalar(_local(start).tz_convert("UTC"), type=pa.timestamp("ns", "UTC"))
+    if end is not None:
+        cond = ds.field(time_col) < pa.scalar(_local(end).tz_convert("UTC"), type=pa.timestamp("ns", "UTC"))
+        expr = cond if expr is None else expr & cond
+    return expr
+
+
+def _open(dirs):
+    #months appended at different times can disagree on types (e.g. an all-NaN month)
+    files = [str(f) for d in dirs for f in sorted(d.glob("*.parquet"))]
+    unified = pa.unify_schemas([pq.read_schema(f) for f in files], promote_options="permissive")
+    return ds.dataset(files, schema=unified, format="parquet")
+
+
+def _finish(df, time_col):
+    df = df.drop(columns=[c for c in PARTITIONS if c in df.columns])
+    if time_col in df.columns:
+        df[time_col] = df[time_col].dt.tz_convert(TZ)
+        df = df.sort_values(time_col, kind="stable").reset_index(drop=True)
+    return df
+
+
+def _csv_chunks(path, time_col, columns, start, end, chunksize=None):
+    #one frame (chunksize=None) or blocks of chunksize rows, parsing only the requested columns
+    header = list(pd.read_csv(csv_path(path), nrows=0).columns)
+    #raw ENTSO-E exports keep the timestamps in an unnamed first column
+    source = time_col if time_col in header else header[0]
+    cols = None if columns is None else [c for c in columns if c != time_col]
+    usecols = None if cols is None else [source, *cols]
+    reader = pd.read_csv(csv_path(path), usecols=usecols, low_memory=False, chunksize=chunksize)
+    for df in [reader] if chunksize is None else reader:
+        df = df.rename(columns={source: time_col})
+        df[time_col] = _to_utc(df[time_col]).dt.tz_convert(TZ)
+        if start is not None:
+            df = df[df[time_col] >= _local(start)]
+        if end is not None:
+            df = df[df[time_col] < _local(end)]
+        if cols is not None:
+            df = df[[time_col, *cols]]
+        instrument.record_io("in", len(df), df.memory_usage(index=False).sum())
+        yield df.sort_values(time_col, kind="stable").reset_index(drop=True)
+
+
+def _read_csv(path, time_col, columns, start, end):
+    return next(_csv_chunks(path, time_col, columns, start, end))
+
+
+def read_table(path, columns=None, start=None, end=None, time_col="delivery_start_local"):
+    """
+    Read a table written by write_table, with column projection and [start, end) pushdown.
+    Falls back to <name>.csv when no Parquet dataset exists (e.g. raw files from before the switch).
+    """
+    root = dataset_path(path)
+    if not root.is_dir():
+        if csv_path(path).exists():
+            return _read_csv(path, time_col, columns, start, end)
+        raise FileNotFoundError(f"no dataset or CSV for {path}")
+
+    dirs = _partition_dirs(root, start, end)
+    if not dirs:
+        return pd.DataFrame(columns=[time_col] + list(columns or []))
+
+    dataset = _open(dirs)
+    cols = None if columns is None else [time_col] + [c for c in columns if c != time_col]
+    table = dataset.to_table(columns=cols, filter=_bounds(time_col, start, end))
+    instrument.record_io("in", table.num_rows, table.nbytes)
+    return _finish(table.to_pandas(), time_col)
+
+
+def iter_partitions(path, columns=None, start=None, end=None, time_col="delivery_start_local"):
+    """
+    Yield one month at a time (time-ordered), for stages that should not hold the whole table.
+    A table still held as CSV is streamed in blocks of CSV_CHUNK_ROWS rows instead (in file order).
+    """
+    root = dataset_path(path)
+    if not root.is_dir():
+        if not csv_path(path).exists():
+            raise FileNotFoundError(f"no dataset or CSV for {path}")
+        for df in _csv_chunks(path, time_col, columns, start, end, CSV_CHUNK_ROWS):
+            if len(df):
+                yield df
+        return
+    cols = None if columns is None else [time_col] + [c for c in columns if c != time_col]
+    for d in _partition_dirs(root, start, end):
+        table = _open([d]).to_table(columns=cols, filter=_bounds(time_col, start, end))
+        instrument.record_io("in", table.num_rows, table.nbytes)
+        if table.num_rows:
+            yield _finish(table.to_pandas(), time_col)
+
+
+def months(path, time_col="delivery_start_local"):
+    """UTC (year, month) pairs the table holds, in order; from the partition names when possible"""
+    root = dataset_path(path)
+    if root.is_dir():
+        return [(int(d.parent.name.split("=")[1]), int(d.name.split("=")[1])) for d in _partition_dirs(root)]
+    t = read_table(path, columns=[], time_col=time_col)[time_col].dt.tz_convert("UTC")
+    return sorted(set(zip(t.dt.year, t.dt.month)))
+
+
+def month_bounds(year, month):
+    """[start, end) of a UTC month as tz-aware timestamps, for read_table(start=, end=)"""
+    start = pd.Timestamp(year=year, month=month, day=1, tz="UTC")
+    return start, start + pd.DateOffset(months=1)
+
+
+def schema(path):
+    """Column names -> Arrow types, without reading any data"""
+    root = dataset_path(path)
+    if root.is_dir():
+        files = sorted(root.glob("utc_year=*/utc_month=*/*.parquet"))
+        if files:
+            return {f.name: f.type for f in pq.read_schema(files[0]) if f.name not in PARTITIONS}
+        return {}
+    return {c: None for c in pd.read_csv(csv_path(path), nrows=0).columns}
+
+
+def last_timestamp(path, time_col="delivery_start_local"):
+    """Latest time stamp held, reading only the newest partition"""
+    root = dataset_path(path)
+    if root.is_dir():
+        dirs = _partition_dirs(root)
+        if not dirs:
+            return None
+        t = _open(dirs[-1:]).to_table(columns=[time_col])[time_col]
+        if len(t) == 0:
+            return None
+        return pd.Timestamp(pc.max(t).as_py()).tz_convert(TZ)
+    return None
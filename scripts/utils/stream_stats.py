@@ -0,0 +1,233 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from scripts.utils import instrument
+from scripts.utils import missingness
+from scripts.utils import storage
+
+TZ = "Europe/Zurich"
+
+#One-pass, mergeable statistics of a table for the QA reports. Every partition (UTC month) is
+#reduced to a StreamStats on its own, possibly in another process, and the results are merged in
+#time order, so memory is one month plus a few (columns x columns) matrices however long the table.
+#   count/mean/variance  per column, merged with Chan's parallel update (Welford for two batches)
+#   min/max              exact
+#   quantiles            from a bottom-k sample: every value gets a random priority and the k
+#                        smallest are kept, a uniform sample of the column whatever the partitioning;
+#                        exact while a column has at most k values
+#   missingness          per column and local day (all columns, any type), binned further for the
+#                        monthly table and the raster plot (missingness.py)
+#   correlation          pairwise-complete, as DataFrame.corr(): for each pair the count, sums and
+#                        co-moments over rows where both are present, as products of the presence
+#                        mask M and the shifted values X (MᵀM, XᵀM, (X²)ᵀM, XᵀX)
+#Numeric statistics cover the numeric, non-boolean columns (DataFrame.describe()/corr() defaults).
+SAMPLE_SIZE = 10_000
+QUANTILES = [0.25, 0.5, 0.75]
+
+
+class StreamStats:
+    """Mergeable statistics of one or more chunks with the same columns"""
+
+    def __init__(self, columns, numeric, sample_size=SAMPLE_SIZE):
+        self.columns = list(columns)
+        self.numeric = list(numeric)
+        self.sample_size = sample_size
+        p = len(self.numeric)
+        self.rows = 0
+        self.n = np.zeros(p)
+        self.mean = np.zeros(p)
+        self.m2 = np.zeros(p)
+        self.min = np.full(p, np.inf)
+        self.max = np.full(p, -np.inf)
+        self.sample = np.empty((0, p))
+        self.priority = np.empty((0, p))
+        #pairwise sums on values shifted by `shift`, see the module comment
+        self.shift = np.zeros(p)
+        self.pair_n = np.zeros((p, p))
+        self.pair_s = np.zeros((p, p))
+        self.pair_ss = np.zeros((p, p))
+        self.pair_xy = np.zeros((p, p))
+        self.missing = pd.DataFrame(columns=self.columns, dtype=float)
+        self.day_rows = pd.Series(dtype=float)
+        #time order, checked within chunks here and across them in merge
+        self.first = self.last = None
+        self.monotonic = True
+        self.duplicates = 0
+
+    @classmethod
+    def of(cls, df, time_col="delivery_start_local", sample_size=SAMPLE_SIZE, seed=0):
+        """Statistics of one chunk"""
+        numeric = [c for c in df.columns if c != time_col and pd.api.types.is_numeric_dtype(df[c])
+                   and not pd.api.types.is_bool_dtype(df[c])]
+        stats = cls([c for c in df.columns if c != time_col], numeric, sample_size)
+        stats.rows = len(df)
+        if not len(df):
+            return stats
+
+        X = df[numeric].to_numpy(dtype=float, na_value=np.nan)
+        present = ~np.isnan(X)
+        n = present.sum(axis=0).astype(float)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(n > 0, np.where(present, X, 0).sum(axis=0) / n, 0.0)
+        centred = np.where(present, X - mean, 0.0)
+        stats.n, stats.mean = n, mean
+        stats.m2 = (centred ** 2).sum(axis=0)
+        stats.min = np.where(present, X, np.inf).min(axis=0)
+        stats.max = np.where(present, X, -np.inf).max(axis=0)
+
+        #bottom-k sample: missing values never get in
+        priority = np.random.default_rng(seed).random(X.shape)
+        priority[~present] = np.inf
+        stats.sample, stats.priority = _bottom_k(X, priority, sample_size)
+
+        m = present.astype(float)
+        stats.shift = mean
+        stats.pair_n = m.T @ m
+        stats.pair_s = centred.T @ m
+        stats.pair_ss = (centred ** 2).T @ m
+        stats.pair_xy = centred.T @ centred
+
+        #missing values per local day, every column
+        stats.missing, stats.day_rows = missingness.day_counts(df, time_col, TZ)
+
+        ns = pd.DatetimeIndex(df[time_col]).asi8
+        stats.first, stats.last = ns[0], ns[-1]
+        stats.monotonic = bool((np.diff(ns) >= 0).all())
+        stats.duplicates = int(pd.Index(ns).duplicated().sum())
+        return stats
+
+    def merge(self, other):
+        """Add the statistics of a later chunk (in time order) to this one"""
+        if other.numeric != self.numeric:
+            raise ValueError("cannot merge statistics of different columns")
+        if not other.rows:
+            return self
+        if not self.rows:
+            self.__dict__.update(other.__dict__)
+            return self
+
+        #Chan et al.: combine two (n, mean, M2) batches
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        with np.errstate(invalid="ignore", divide="ignore"):
+            share = np.where(n > 0, other.n / n, 0.0)
+            self.m2 = self.m2 + other.m2 + np.where(n > 0, delta ** 2 * self.n * share, 0.0)
+        self.mean = self.mean + delta * share
+        self.n = n
+        self.min = np.minimum(self.min, other.min)
+        self.max = np.maximum(self.max, other.max)
+        self.sample, self.priority = _bottom_k(np.vstack([self.sample, other.sample]),
+                                               np.vstack([self.priority, other.priority]), self.sample_size)
+
+        #move the other chunk's pairwise sums onto this shift: x - a = (x - b) + d
+        d = other.shift - self.shift
+        di, dj = d[:, None], d[None, :]
+        s, N = other.pair_s, other.pair_n
+        self.pair_xy += other.pair_xy + s * dj + s.T * di + N * di * dj
+        self.pair_ss += other.pair_ss + 2 * s * di + N * di ** 2
+        self.pair_s += s + N * di
+        self.pair_n += N
+
+        self.missing = pd.concat([self.missing, other.missing]).groupby(level=0).sum()
+        self.day_rows = pd.concat([self.day_rows, other.day_rows]).groupby(level=0).sum()
+        self.monotonic = self.monotonic and other.monotonic and other.first >= self.last
+        self.duplicates += other.duplicates + int(other.first == self.last)
+        self.last = other.last
+        self.rows += other.rows
+        return self
+
+    # === results ===
+
+    def describe(self):
+        """DataFrame.describe().T of the numeric columns"""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            std = np.sqrt(np.where(self.n > 1, self.m2 / (self.n - 1), np.nan))
+        has = self.n > 0
+        out = pd.DataFrame({
+            "count": self.n,
+            "mean": np.where(has, self.mean, np.nan),
+            "std": std,
+            "min": np.where(has, self.min, np.nan),
+        }, index=self.numeric)
+        sample = np.where(np.isinf(self.priority), np.nan, self.sample)
+        for q in QUANTILES:
+            out[f"{q:.0%}"] = _nanquantile(sample, q) if len(sample) else np.nan
+        out["max"] = np.where(has, self.max, np.nan)
+        return out
+
+    def corr(self):
+        """Pairwise-complete Pearson correlation of the numeric columns, as DataFrame.corr()"""
+        n, s = self.pair_n, self.pair_s
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cov = self.pair_xy - s * s.T / n
+            var_i = self.pair_ss - s ** 2 / n
+            r = cov / np.sqrt(var_i * var_i.T)
+        r = np.where(n > 1, np.clip(r, -1, 1), np.nan)
+        return pd.DataFrame(r, index=self.numeric, columns=self.numeric)
+
+    def isna(self):
+        """Missing values per column (all columns)"""
+        return self.missing.sum().reindex(self.columns).fillna(0).astype(int)
+
+    def missing_by(self, freq="D"):
+        """Share of missing values per local day / week / month ("D", "W", "M") and column"""
+        return missingness.share(self.missing, self.day_rows, freq)
+
+    def missing_by_month(self):
+        """Share of missing values per local month (rows, "YYYY-MM") and column"""
+        frac = self.missing_by("M")
+        frac.index = frac.index.strftime("%Y-%m")
+        return frac.rename_axis("month")
+
+
+def _bottom_k(values, priority, k):
+    #per column, the k entries with the smallest priority
+    if len(values) <= k:
+        return values, priority
+    idx = np.argpartition(priority, k - 1, axis=0)[:k]
+    return np.take_along_axis(values, idx, axis=0), np.take_along_axis(priority, idx, axis=0)
+
+
+def _nanquantile(sample, q):
+    #np.nanquantile warns on all-NaN columns; those come out NaN here
+    out = np.full(sample.shape[1], np.nan)
+    ok = (~np.isnan(sample)).any(axis=0)
+    if ok.any():
+        out[ok] = np.nanquantile(sample[:, ok], q, axis=0)
+    return out
+
+
+def _scan_month(path, year, month, columns, sample_size, seed):
+    with instrument.stage("qa_stats_month", month=f"{year}-{month:02d}"):
+        start, end = storage.month_bounds(year, month)
+        df = storage.read_table(path, columns=columns, start=start, end=end)
+        return StreamStats.of(df, sample_size=sample_size, seed=seed * 1_000_003 + year * 100 + month)
+
+
+def scan(path, columns=None, workers=None, sample_size=SAMPLE_SIZE, seed=42):
+    """
+    StreamStats of a whole table in one pass over its months (in parallel on `workers` processes).
+    A table still held as CSV is read once, in blocks, in this process.
+    """
+    stats = None
+    if storage.dataset_path(path).is_dir():
+        months = storage.months(path)
+        workers = workers or min(len(months), os.cpu_count() or 1) or 1
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(instrument.run_collected, _scan_month, path, y, m, columns, sample_size, seed)
+                       for y, m in months]
+            for future in futures:
+                s, io = future.result()
+                instrument.merge(io)
+                stats = s if stats is None else stats.merge(s)
+    else:
+        for i, chunk in enumerate(storage.iter_partitions(path, columns=columns)):
+            s = StreamStats.of(chunk, sample_size=sample_size, seed=seed * 1_000_003 + i)
+            stats = s if stats is None else stats.merge(s)
+    if stats is None:
+        cols = [c for c in storage.schema(path) if c != "delivery_start_local"]
+        stats = StreamStats.of(pd.DataFrame(columns=["delivery_start_local", *cols]))
+    return stats
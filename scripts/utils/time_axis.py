@@ -0,0 +1,296 @@
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+TZ = "Europe/Zurich"
+
+#Canonical time axis: int64 slots of one market time unit (MTU) since a fixed UTC epoch.
+#A feature block is a set of arrays positioned on that axis, so aligning two blocks is offset
+#arithmetic (s - s0) rather than a hash merge on tz-aware timestamps. Local-time attributes
+#(DST, 23/25-hour days, local calendar) are derived once per slot range, here.
+#MTU is pipeline-wide: MTU=15min builds every feature at the 15-minute day-ahead resolution.
+EPOCH = pd.Timestamp("2020-01-01", tz="UTC")
+HOUR = pd.Timedelta(hours=1)
+HOUR_NS = HOUR.value
+#frequency string as pandas spells it: "60min", "h", "15min"
+MTU = pd.Timedelta(pd.tseries.frequencies.to_offset(os.getenv("MTU", "60min")))
+_EPOCH_NS = EPOCH.value
+_NAT = np.iinfo(np.int64).min
+
+if MTU <= pd.Timedelta(0) or HOUR_NS % MTU.value:
+    raise ValueError(f"MTU must divide one hour, got {MTU}")
+
+
+def step_ns(step=None):
+    """Slot length in ns (default: the pipeline MTU)"""
+    return pd.Timedelta(MTU if step is None else step).value
+
+
+def slots(duration, step=None):
+    """Duration (e.g. "24h") as a whole number of slots; lags and windows are written as durations"""
+    n, rest = divmod(pd.Timedelta(duration).value, step_ns(step))
+    if rest:
+        raise ValueError(f"{duration} is not a whole number of {pd.Timedelta(step_ns(step))} slots")
+    return int(n)
+
+
+def _ns(times):
+    if not pd.api.types.is_datetime64_any_dtype(getattr(times, "dtype", None)):
+        times = pd.to_datetime(times, utc=True)
+    idx = pd.DatetimeIndex(times)
+    if idx.tz is None:
+        idx = idx.tz_localize("UTC")
+    #asi8 of a tz-aware index is already UTC
+    return idx.as_unit("ns").asi8
+
+
+def to_slots(times, step=None):
+    """Timestamps (tz-aware, naive = UTC, or strings) -> int64 slots since EPOCH, floored"""
+    return (_ns(times) - _EPOCH_NS) // step_ns(step)
+
+
+def to_times(s, tz=TZ, step=None):
+    """int64 slots since EPOCH -> tz-aware DatetimeIndex"""
+    ns = np.asarray(s, dtype=np.int64) * step_ns(step) + _EPOCH_NS
+    return pd.DatetimeIndex(pd.to_datetime(ns, unit="ns", utc=True)).tz_convert(tz)
+
+
+@lru_cache(maxsize=32)
+def _local_attributes(s0, s1, step):
+    s = np.arange(s0, s1, dtype=np.int64)
+    times = to_times(s, step=step)
+    wall = times.tz_localize(None)
+    offset_h = (wall.asi8 - times.asi8) // HOUR_NS
+    local_day = wall.normalize()
+    #hours per local day: 23 in spring, 25 in autumn (midnight is never ambiguous in CH)
+    day_hours = ((local_day + pd.Timedelta(days=1)).tz_localize(TZ).asi8 - local_day.tz_localize(TZ).asi8) // HOUR_NS
+    return pd.DataFrame({
+        "delivery_start_local": times,
+        "local_day": local_day,
+        "hour": wall.hour,
+        "minute": wall.minute,
+        "dayofweek": wall.dayofweek,
+        "month": wall.month,
+        "utc_offset_h": offset_h,
+        "is_dst": (offset_h == 2).astype(int),
+        "day_hours": day_hours,
+    }, index=pd.Index(s, name="slot"))
+
+
+def local_attributes(s0, s1, step=None):
+    """Local calendar attributes for slots [s0, s1); cached, so every builder shares one DST pass"""
+    return _local_attributes(int(s0), int(s1), step_ns(step)).copy()
+
+
+def gate_closure(times, cutoff_hour=11):
+    """D-1 cutoff on the local wall clock for each delivery time (cutoff_hour: scalar or per row)"""
+    days = pd.DatetimeIndex(times).tz_convert(TZ).tz_localize(None).normalize()
+    cutoff = pd.to_timedelta(np.asarray(cutoff_hour, dtype=float), unit="h")
+    return (days - pd.Timedelta(days=1) + cutoff).tz_localize(TZ)
+
+
+def _place(values, pos, n):
+    #scatter one column onto n axis slots; gaps are NaN / NaT / None depending on dtype
+    if isinstance(values.dtype, pd.DatetimeTZDtype):
+        out = np.full(n, _NAT, dtype=np.int64)
+        out[pos] = pd.DatetimeIndex(values).as_unit("ns").asi8
+        return pd.DatetimeIndex(pd.to_datetime(out, unit="ns", utc=True)).tz_convert(values.dtype.tz)
+    if pd.api.types.is_bool_dtype(values.dtype) or pd.api.types.is_numeric_dtype(values.dtype):
+        out = np.full(n, np.nan)
+        out[pos] = pd.to_numeric(values, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+        return out
+    out = np.full(n, None, dtype=object)
+    out[pos] = values.to_numpy(dtype=object)
+    return out
+
+
+def place(df, time_col, s0, s1, s=None, step=None):
+    """Columns of df (one row per slot) as arrays on the axis slots [s0, s1); later duplicates win"""
+    s = to_slots(df[time_col], step) if s is None else s
+    keep = (s >= s0) & (s < s1)
+    pos = (s - s0)[keep]
+    cols = [c for c in df.columns if c != time_col]
+    return {c: _place(df[c][keep], pos, s1 - s0) for c in cols}
+
+
+def span(frames, time_col="delivery_start_local", ss=None, step=None):
+    """Smallest [s0, s1) covering every frame"""
+    ss = [to_slots(df[time_col], step) for df in frames] if ss is None else ss
+    ss = [s for s in ss if len(s)]
+    if not ss:
+        return 0, 0
+    return int(min(s.min() for s in ss)), int(max(s.max() for s in ss)) + 1
+
+
+def _coverage(t, gap, step):
+    #each row holds until the next stamp, but no longer than the spacing on either side of it (so a
+    #missing quarter-hour stays a gap while an hourly row still covers its hour) and at most `gap`;
+    #expand rows to the slots they overlap -> (row, slot, overlap ns)
+    d = np.diff(t)
+    if len(d):
+        hold = np.minimum(np.append(d, d[-1]), np.insert(d, 0, d[0]))
+    else:
+        hold = np.full(1, step)
+    end = t + np.minimum(hold, gap)
+    first = (t - _EPOCH_NS) // step
+    last = -(-(end - _EPOCH_NS) // step) - 1
+    k = np.maximum(last - first + 1, 0)
+    rows = np.repeat(np.arange(len(t)), k)
+    slot = first[rows] + np.arange(len(rows)) - np.repeat(np.cumsum(k) - k, k)
+    slot_start = _EPOCH_NS + slot * step
+    overlap = np.minimum(end[rows], slot_start + step) - np.maximum(t[rows], slot_start)
+    ok = overlap > 0
+    return rows[ok], slot[ok], overlap[ok].astype(float)
+
+
+def resample(df, time_col=None, step=None, how="mean", max_gap="1h"):
+    """
+    df on the full consecutive grid of `step` (default MTU) from its first to its last covered slot.
+    Each row is taken to hold until the next stamp (bounded by its local spacing and max_gap; beyond
+    that is a gap -> NaN), so the same call reindexes series already at the MTU, spreads hourly
+    sources over 15-minute slots, and averages 15-minute sources to hours (also when a series
+    switches resolution mid-way, as the day-ahead auction did).
+    how: "mean" (time-weighted mean of the overlapping rows, i.e. hold when upsampling) or
+    "linear" (interpolate between stamps, for instantaneous values such as wind speed);
+    a dict {col: how} mixes both. Non-numeric columns take the value of the row covering the slot.
+    time_col=None means df is indexed by time; the result is then indexed the same way.
+    """
+    indexed = time_col is None
+    name = (df.index.name or "time") if indexed else time_col
+    frame = df.rename_axis(name).reset_index() if indexed else df
+    step = step_ns(step)
+    gap = max(pd.Timedelta(max_gap).value, step)
+
+    t_all = _ns(frame[name])
+    keep = ~np.isnat(t_all.view("datetime64[ns]"))
+    frame, t_all = frame[keep], t_all[keep]
+    #sorted, one row per stamp (later duplicates win)
+    order = np.argsort(t_all, kind="stable")
+    t_sorted = t_all[order]
+    last_of_stamp = np.append(t_sorted[1:] != t_sorted[:-1], True)
+    order, t = order[last_of_stamp], t_sorted[last_of_stamp]
+
+    cols = [c for c in frame.columns if c != name]
+    if len(t) == 0:
+        out = frame.iloc[:0]
+        return out.set_index(name) if indexed else out
+
+    rows, slot, overlap = _coverage(t, gap, step)
+    s0, s1 = int(slot.min()), int(slot.max()) + 1
+    pos = slot - s0
+    n = s1 - s0
+    covered = np.bincount(pos, weights=overlap, minlength=n) > 0
+    slot_t = _EPOCH_NS + np.arange(s0, s1) * step
+
+    columns = {name: to_times(np.arange(s0, s1), step=step)}
+    for c in cols:
+        values = frame[c].to_numpy()[order]
+        if not (pd.api.types.is_bool_dtype(frame[c].dtype) or pd.api.types.is_numeric_dtype(frame[c].dtype)):
+            #row that covers the most of each slot
+            by_slot = np.lexsort((-overlap, pos))
+            head = np.append(True, pos[by_slot][1:] != pos[by_slot][:-1])
+            out = np.full(n, None, dtype=object)
+            out[pos[by_slot][head]] = values[rows[by_slot][head]]
+            columns[c] = out
+            continue
+
+        x = pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+        method = how.get(c, "mean") if isinstance(how, dict) else how
+        if method == "linear":
+            ok = ~np.isnan(x)
+            tv, xv = t[ok], x[ok]
+            out = np.full(n, np.nan)
+            if len(tv):
+                out = np.interp(slot_t, tv, xv)
+                i = np.clip(np.searchsorted(tv, slot_t, side="right") - 1, 0, len(tv) - 1)
+                exact = tv[i] == slot_t
+                nxt = np.minimum(i + 1, len(tv) - 1)
+                bridged = (slot_t >= tv[i]) & (tv[nxt] > tv[i]) & (tv[nxt] - tv[i] <= gap)
+                out[~(exact | bridged) | ~covered] = np.nan
+            columns[c] = out
+        elif method == "mean":
+            w = np.where(np.isnan(x[rows]), 0.0, overlap)
+            num = np.bincount(pos, weights=np.nan_to_num(x[rows]) * w, minlength=n)
+            den = np.bincount(pos, weights=w, minlength=n)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                columns[c] = np.where(den > 0, num / den, np.nan)
+        else:
+            raise ValueError(f"unknown resampling {method!r} (expected 'mean' or 'linear')")
+
+    out = pd.DataFrame(columns)
+    return out.set_index(name) if indexed else out
+
+
+def asof(df, time_col, lag="0h", cutoff_hour=None, max_age=None, step=None):
+    """
+    Low-frequency observations (daily settlements, weekly readings) on the grid of `step`
+    (default MTU) as they were known: every slot takes the latest observation published at or
+    before its cutoff. Each slot looks its observation up by position (searchsorted over the
+    publication times), so no observation is copied per hour before it reaches the grid.
+    df: one row per observation; time_col is its stamp (naive = local wall clock).
+    lag: publication delay on the local wall clock after the stamp, e.g. "1D8h" for a daily
+    settlement visible the next morning at 08:00.
+    cutoff_hour: the slot's decision time is D-1 at that hour (gate_closure); None = the slot itself.
+    max_age: older observations (stamp vs cutoff) are no longer used -> NaN.
+    Returns delivery_start_local, asof_local (the cutoff) and df's numeric columns, from the
+    first to the last slot with a value.
+    """
+    step = step_ns(step)
+    stamps = pd.DatetimeIndex(pd.to_datetime(df[time_col]))
+    wall = stamps.tz_convert(TZ).tz_localize(None) if stamps.tz is not None else stamps
+    localize = lambda t: t.tz_localize(TZ, ambiguous=True, nonexistent="shift_forward")
+    stamp_ns = localize(wall).asi8
+    published = localize(wall + pd.Timedelta(lag)).asi8
+    cols = [c for c in df.columns if c != time_col and pd.api.types.is_numeric_dtype(df[c])]
+
+    empty = pd.DataFrame({"delivery_start_local": to_times([], step=step), "asof_local": to_times([], step=step)})
+    ok_rows = ~np.isnat(wall.to_numpy())
+    if not ok_rows.any():
+        return empty.assign(**{c: [] for c in cols})
+
+    #candidate slots: from the first stamp's day to the day after the last one can still be used
+    age = pd.Timedelta(max_age) if max_age is not None else pd.Timedelta(0)
+    first = wall[ok_rows].min().normalize()
+    last = (wall[ok_rows] + pd.Timedelta(lag)).max().normalize() + age + pd.Timedelta(days=2)
+    s0, s1 = to_slots(localize(pd.DatetimeIndex([first, last])), step)
+    times = to_times(np.arange(s0, s1), step=step)
+    cut = times if cutoff_hour is None else gate_closure(times, cutoff_hour)
+    cut_ns = cut.asi8
+
+    columns, known = {}, np.zeros(len(times), dtype=bool)
+    for c in cols:
+        x = pd.to_numeric(df[c], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+        keep = ok_rows & ~np.isnan(x)
+        #by publication time; later stamps win a tie
+        order = np.lexsort((stamp_ns[keep], published[keep]))
+        p, s, v = published[keep][order], stamp_ns[keep][order], x[keep][order]
+        i = np.searchsorted(p, cut_ns, side="right") - 1
+        ok = i >= 0
+        if max_age is not None:
+            ok &= cut_ns - s[np.maximum(i, 0)] <= age.value
+        columns[c] = np.where(ok, v[np.maximum(i, 0)], np.nan)
+        known |= ok
+
+    if not known.any():
+        return empty.assign(**{c: [] for c in cols})
+    a, b = np.flatnonzero(known)[[0, -1]]
+    out = pd.DataFrame({"delivery_start_local": times[a:b + 1], "asof_local": cut[a:b + 1].tz_convert(TZ)})
+    for c, values in columns.items():
+        out[c] = values[a:b + 1]
+    return out
+
+
+def join(blocks, time_col="delivery_start_local", step=None):
+    """
+    Outer join of one-row-per-slot tables by axis position.
+    blocks: {name: df}; a column already taken by an earlier block is suffixed with _<name>.
+    """
+    ss = {name: to_slots(df[time_col], step) for name, df in blocks.items()}
+    s0, s1 = span(blocks.values(), time_col, ss=list(ss.values()))
+    columns = {time_col: to_times(np.arange(s0, s1), step=step)}
+    for name, df in blocks.items():
+        for col, values in place(df, time_col, s0, s1, s=ss[name]).items():
+            columns[col if col not in columns else f"{col}_{name}"] = values
+    return pd.DataFrame(columns)
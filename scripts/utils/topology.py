@@ -0,0 +1,73 @@
+import os
+
+import holidays
+
+#Bidding zones and the borders between them. Every builder, the master dataset and the
+#pipeline runner take their zones from here, so adding a zone is one entry in ZONES (plus its
+#borders) and its raw data under data/raw/<zone>_*. Zone-specific tables are <zone>_<table>
+#(lower case, as data/raw/ch_day_ahead_prices); tables built from inputs shared by several
+#zones (prices, weather, flows, NTC, fuels) are built once for all of them.
+#gct: local day-ahead gate closure hour (SDAC 12:00; CH runs its auction before, at 11:00)
+ZONES = {
+    "CH": {"name": "Switzerland", "holidays": "CH", "gct": 11},
+    "DE_LU": {"name": "Germany-Luxembourg", "holidays": "DE", "gct": 12},
+    "FR": {"name": "France", "holidays": "FR", "gct": 12},
+    "IT_NORD": {"name": "Italy North", "holidays": "IT", "gct": 12},
+}
+
+#interconnected zone pairs; flows and NTC are fetched and built for both directions
+BORDERS = [
+    ("CH", "DE_LU"),
+    ("CH", "FR"),
+    ("CH", "IT_NORD"),
+    ("DE_LU", "FR"),
+    ("FR", "IT_NORD"),
+]
+
+#zones whose master dataset is built (TARGET_ZONES=CH,FR or run_pipeline.py --zones CH FR)
+TARGET_ZONES = [z.strip().upper() for z in os.getenv("TARGET_ZONES", "CH").split(",") if z.strip()]
+
+
+def check(zone):
+    """Upper-case zone code, or ValueError for a zone that is not in ZONES"""
+    zone = str(zone).upper()
+    if zone not in ZONES:
+        raise ValueError(f"unknown zone {zone!r} (expected one of {', '.join(ZONES)})")
+    return zone
+
+
+def slug(zone):
+    return check(zone).lower()
+
+
+def table(name, zone):
+    """Name of a zone-specific table, e.g. table("master_dataset", "CH") -> "ch_master_dataset" """
+    return f"{slug(zone)}_{name}"
+
+
+def borders(zone=None):
+    """Borders touching zone (all borders if None)"""
+    return [b for b in BORDERS if zone is None or check(zone) in b]
+
+
+def directions(zone=None):
+    """(src, dst) for both directions of every border touching zone"""
+    return [d for a, b in borders(zone) for d in [(a, b), (b, a)]]
+
+
+def direction_name(src, dst):
+    return f"{slug(src)}_{slug(dst)}"
+
+
+def border_columns(columns, zone):
+    """Columns of a shared border table that belong to zone, e.g. flow_ch_fr_mw_lag24 or congestion_ratio_fr_ch for CH"""
+    names = [direction_name(src, dst) for src, dst in directions(zone)]
+    return [c for c in columns if any(f"_{n}_" in f"_{c}_" for n in names)]
+
+
+def gate_closure_hour(zone):
+    return ZONES[check(zone)]["gct"]
+
+
+def holiday_calendar(zone, years):
+    return holidays.country_holidays(ZONES[check(zone)]["holidays"], years=years)
@@ -0,0 +1,137 @@
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+
+from scripts.utils import storage
+
+TZ = "Europe/Zurich"
+
+#one entry per raw series: {"path": raw dataset, "last": last timestamp held (ISO, local tz)}
+MANIFEST = Path("data/raw/fetch_manifest.json")
+
+#re-request this much history before the watermark to pick up ENTSO-E revisions
+LOOKBACK = pd.Timedelta(days=int(os.getenv("FETCH_LOOKBACK_DAYS", "0")))
+
+#FETCH_FULL=1 ignores the manifest and re-downloads from the default start
+FULL_REFRESH = os.getenv("FETCH_FULL", "0") == "1"
+
+
+def default_end():
+    """Day-ahead results for tomorrow are published today, so fetch through D+1"""
+    return pd.Timestamp.now(tz=TZ).normalize() + pd.Timedelta(days=2)
+
+
+def load_manifest(path=MANIFEST):
+    path = Path(path)
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())
+
+
+def save_manifest(manifest, path=MANIFEST):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    tmp.replace(path)
+
+
+def _last_stamp_on_disk(path, time_col="time"):
+    if storage.dataset_path(path).is_dir():
+        return storage.last_timestamp(path, time_col)
+
+    #pre-Parquet CSV: only the last line is needed; avoid parsing years of history
+    path = storage.csv_path(path)
+    if not path.exists() or path.stat().st_size == 0:
+        return None
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = max(f.tell() - 4096, 0)
+        f.seek(pos)
+        lines = f.read().decode(errors="ignore").strip().splitlines()
+    if len(lines) < 2 and pos == 0:
+        return None  #header only
+    header = pd.read_csv(path, nrows=0).columns
+    col = list(header).index(time_col) if time_col in header else 0
+    value = lines[-1].split(",")[col]
+    ts = pd.to_datetime(value, errors="coerce", utc=True)
+    return None if pd.isna(ts) else ts.tz_convert(TZ)
+
+
+def watermark(manifest, key, path, time_col="time"):
+    """Last timestamp held for a series; bootstrapped from the data on disk if the manifest has no entry"""
+    entry = manifest.get(key)
+    if entry and Path(entry["path"]) == Path(path) and storage.exists(path):
+        return pd.Timestamp(entry["last"]).tz_convert(TZ)
+    return _last_stamp_on_disk(path, time_col)
+
+
+def tail_start(manifest, key, path, default_start, step=pd.Timedelta(hours=1), lookback=None, time_col="time"):
+    """Start of the missing tail for one series (default_start on first fetch or FETCH_FULL=1)"""
+    default_start = pd.Timestamp(default_start)
+    if default_start.tzinfo is None:
+        default_start = default_start.tz_localize(TZ)
+    if FULL_REFRESH:
+        return default_start
+
+    last = watermark(manifest, key, path, time_col)
+    if last is None:
+        return default_start
+    lookback = LOOKBACK if lookback is None else lookback
+    return max(default_start, last + step - lookback)
+
+
+def append_tail(path, new, time_col="time"):
+    """
+    Merge a freshly fetched tail into the raw dataset on disk.
+    Rows already stored are overwritten where the tail covers them (revisions), everything
+    older is kept; only the months the tail touches are rewritten. A raw series still held
+    as CSV is migrated to Parquet in full on its first append.
+    """
+    if isinstance(new, pd.Series):
+        new = new.to_frame()
+    if time_col in new.columns:
+        new = new.set_index(time_col)
+    new.index = pd.DatetimeIndex(new.index).tz_convert(TZ)
+    new.index.name = time_col
+    new.columns = [str(c) for c in new.columns]
+    new = new.sort_index()
+
+    migrate = not storage.dataset_path(path).is_dir()
+    if storage.exists(path) and not FULL_REFRESH:
+        #partitions are UTC months: re-read only the ones the tail lands in
+        since = None if migrate else new.index.min().tz_convert("UTC").normalize().replace(day=1)
+        old = storage.read_table(path, start=since, time_col=time_col).set_index(time_col)
+        #single-value files: keep the header already on disk
+        if len(old.columns) == 1 and len(new.columns) == 1:
+            new.columns = old.columns
+        out = old.reindex(old.index.union(new.index))
+        #column by column, so a series with a shorter tail does not blank out its neighbours
+        for c in new.columns:
+            col = new[c].dropna()
+            if c not in out.columns:
+                out[c] = pd.NA
+            out.loc[col.index, c] = col.values
+    else:
+        out = new
+
+    out = out[~out.index.duplicated(keep="last")].sort_index()
+    mode = "overwrite" if migrate or FULL_REFRESH else "partitions"
+    storage.write_table(out.reset_index(), path, time_col=time_col, mode=mode)
+    return out
+
+
+def record(manifest, key, path, df, failed=None, step=pd.Timedelta(hours=1)):
+    """Store the new watermark for a series; failed windows hold it back so the gap is refetched"""
+    if len(df.index) == 0:
+        return
+    last = pd.Timestamp(df.index.max())
+    if failed:
+        last = min(last, min(s for s, _ in failed) - step)
+    manifest[key] = {
+        "path": str(path),
+        "last": last.tz_convert(TZ).isoformat(),
+        "updated": pd.Timestamp.now(tz=TZ).isoformat(timespec="seconds"),
+    }